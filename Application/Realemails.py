@@ -1,6 +1,4 @@
-import imaplib
 import email
-import yaml
 import os
 from bs4 import BeautifulSoup
 from email.header import decode_header
@@ -8,15 +6,21 @@ from datetime import datetime
 import re
 import json
 
+import bank_rules
+from imap_utils import imap_workers, load_credentials
+from keyword_classifier import classifier_for
+from message_sources import open_source
+from sender_plan import claiming_banks, downloads_saved, group_banks_by_sender
+
 # ✅ Configuration for date range extraction
 START_DATE = "09-feb-2025"  # Format: DD-Mon-YYYY
 END_DATE = "31-Dec-2025"    # Format: DD-Mon-YYYY
+# ✅ mbox file, Maildir or .eml directory to read instead of the IMAP server
+MESSAGE_SOURCE = os.getenv("MESSAGE_SOURCE")
 
 def load_config():
     """Load the configuration file to get all bank configurations."""
-    config_file = os.path.join(os.path.dirname(__file__), "config.yml")
-    with open(config_file, "r", encoding='utf-8') as f:
-        return yaml.safe_load(f)
+    return bank_rules.load_config()
 
 def sanitize_filename(filename):
     """Sanitize filename to be safe for all operating systems."""
@@ -114,20 +118,7 @@ def classify_email(sender, subject, content, config):
     those phrases in the subject or body marks the email as a non-transaction.
     """
     try:
-        for bank_name, bank_config in config["banks"].items():
-            if bank_config["sender"].lower() == sender.lower():
-                for ex_kw in bank_config.get("exclude_keywords", []):
-                    if ex_kw.lower() in subject.lower() or ex_kw.lower() in content.lower():
-                        return False, None, None
-
-                keywords = bank_config["keywords"]
-                for keyword in keywords:
-                    if (keyword.lower() in subject.lower() or
-                        keyword.lower() in content.lower()):
-                        return True, bank_name, keyword
-                return False, None, None
-
-        return False, None, None
+        return classifier_for(config).classify(sender, subject, content)
     except Exception:
         return False, None, None
 
@@ -560,63 +551,56 @@ def create_master_index(output_dir, all_emails, config):
         print(f"❌ Error creating master index: {e}")
         return None
 
-def process_single_email(mail, email_id, sender, bank_name, config):
-    """Process a single email safely."""
+def process_single_email(raw_email, email_id, sender, bank_names, config):
+    """Parse a downloaded email and return one entry per bank it belongs to.
+
+    ``bank_names`` lists every profile sharing ``sender``. The email is
+    attributed to each profile whose keywords match it; when none does it
+    is returned once, as a non-transaction of the first profile.
+    """
     try:
-        # Fetch the email
-        _, msg_data = mail.fetch(email_id, '(RFC822)')
-        
-        for response_part in msg_data:
-            if isinstance(response_part, tuple):
-                # Parse the email message
-                msg = email.message_from_bytes(response_part[1])
-                
-                # Extract basic info safely
-                subject = decode_email_subject(msg)
-                datetime_str = msg.get("Date", "Unknown Date")
-                email_text, email_html = extract_email_content(msg)
-                
-                # Classify the email
-                is_transaction, matched_bank, matched_keyword = classify_email(
-                    sender, subject, email_text, config
-                )
-                
-                # Create email info dictionary
-                email_info = {
-                    'content': email_text,
-                    'html_content': email_html,
-                    'datetime': datetime_str,
-                    'subject': subject,
-                    'sender': sender,
-                    'email_id': str(email_id),
-                    'is_transaction': is_transaction,
-                    'bank_name': bank_name,
-                    'matched_keyword': matched_keyword
-                }
-                
-                return email_info
-                
+        # Parse the email message
+        msg = email.message_from_bytes(raw_email)
+
+        # Extract basic info safely
+        subject = decode_email_subject(msg)
+        datetime_str = msg.get("Date", "Unknown Date")
+        email_text, email_html = extract_email_content(msg)
+
+        # Classify the email against every bank sharing this sender
+        claims = claiming_banks(bank_names, subject, email_text, config)
+        is_transaction = bool(claims)
+        if not claims:
+            claims = [(bank_names[0], None)]
+
+        # Create one email info dictionary per bank
+        return [
+            {
+                'content': email_text,
+                'html_content': email_html,
+                'datetime': datetime_str,
+                'subject': subject,
+                'sender': sender,
+                'email_id': str(email_id),
+                'is_transaction': is_transaction,
+                'bank_name': bank_name,
+                'matched_keyword': matched_keyword
+            }
+            for bank_name, matched_keyword in claims
+        ]
+
     except Exception as e:
         print(f"   ❌ Error processing email {email_id}: {e}")
-        return None
+        return []
 
 def fetch_all_bank_emails():
     """Fetch emails from ALL banks configured in the YAML file."""
     try:
-        # Get credentials
-        base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-        credentials_path = os.path.join(base_dir, "credentials.yml")
-
-        if not os.path.exists(credentials_path):
-            raise ValueError(f"credentials.yml not found at {credentials_path}")
-
-        with open(credentials_path, 'r', encoding='utf-8') as f:
-            my_credentials = yaml.safe_load(f)
-            user = my_credentials.get("user")
-            password = my_credentials.get("password")
-
-        if not user or not password:
-            raise ValueError("Email credentials not found in credentials.yml")
+        # Get credentials (only needed when reading from the IMAP server)
+        user = password = None
+        if MESSAGE_SOURCE is None:
+            # EMAIL_USER/EMAIL_PASS take precedence over credentials.yml
+            user, password = load_credentials()
 
         # Load configuration
         config = load_config()
@@ -628,55 +612,49 @@ def fetch_all_bank_emails():
         
         print(f"📁 Output directory: {os.path.abspath(output_dir)}")
 
-        # Connect to email
-        mail = imaplib.IMAP4_SSL('imap.gmail.com')
-        mail.login(user, password)
-        mail.select('Inbox')
+        # Read from IMAP through a pool of sessions (IMAP_WORKERS), or from local files
+        if MESSAGE_SOURCE is None:
+            source = open_source(user=user, password=password, workers=imap_workers())
+        else:
+            source = open_source(MESSAGE_SOURCE)
+            print(f"📂 Reading emails from {MESSAGE_SOURCE}")
 
         print(f"🔍 Processing emails from {len(config['banks'])} banks:")
         for bank_name, bank_config in config['banks'].items():
             print(f"   • {bank_name}: {bank_config['sender']}")
         print()
 
-        all_emails = []
-        global_index = 1
+        # Closing the source also closes its IMAP sessions, even on errors
+        with source:
+            all_emails = []
+            global_index = 1
+            sender_groups = group_banks_by_sender(config)
+            message_counts = {}
         
-        # Process each bank
-        for bank_name, bank_config in config['banks'].items():
-            sender = bank_config['sender']
-            
-            print(f"🏦 Processing {bank_name} ({sender})...")
-            
-            # Search for emails from this sender
-            search_criteria = f'(FROM "{sender}" SINCE "{START_DATE}" BEFORE "{END_DATE}")'
-            _, data = mail.search(None, search_criteria)
-            mail_id_list = data[0].split()
-            
-            if not mail_id_list:
-                print(f"   ⚠️ No emails found from {sender}")
-                continue
-                
-            print(f"   📧 Found {len(mail_id_list)} emails")
-            
-            # Process each email from this bank
-            for email_id in mail_id_list:
-                email_info = process_single_email(mail, email_id, sender, bank_name, config)
-                
-                if email_info:
+            # Each distinct sender is read once, even when banks share it
+            messages = source.iter_messages(sender_groups, START_DATE, END_DATE)
+            for sender, email_id, raw_email in messages:
+                bank_names = sender_groups[sender]
+                if sender not in message_counts:
+                    print(f"🏦 Processing {', '.join(bank_names)} ({sender})...")
+                message_counts[sender] = message_counts.get(sender, 0) + 1
+
+                # Download each email once and route it to the matching banks
+                for email_info in process_single_email(raw_email, email_id, sender, bank_names, config):
                     # Create HTML file
                     filename = create_html_file(email_info, output_dir, global_index)
                     email_info['filename'] = filename
-                    
+
                     all_emails.append(email_info)
-                    
+
                     status = "✅ TRANSACTION" if email_info['is_transaction'] else "📋 NON-TRANSACTION"
                     print(f"   {status}: {email_info['subject'][:40]}... → {filename}")
-                    
+
                     global_index += 1
-        
-        # Close connection
-        mail.close()
-        mail.logout()
+
+            for sender in sender_groups:
+                if sender not in message_counts:
+                    print(f"   ⚠️ No emails found from {sender}")
         
         # Create master index
         if all_emails:
@@ -689,6 +667,7 @@ def fetch_all_bank_emails():
             print(f"📈 Total emails extracted: {len(all_emails)}")
             print(f"💳 Transaction emails: {len([e for e in all_emails if e['is_transaction']])}")
             print(f"📋 Non-transaction emails: {len([e for e in all_emails if not e['is_transaction']])}")
+            print(f"♻️ Duplicate downloads avoided: {downloads_saved(sender_groups, message_counts)}")
             if index_path:
                 print(f"🌐 Master index: {index_path}")
             print(f"{'='*80}")
@@ -1,22 +1,45 @@
-import imaplib
 import email
-import yaml
 import os
-from bs4 import BeautifulSoup
+import sys
 from email.header import decode_header
 from datetime import datetime
 import re
 import json
 
+# Add the root folder to Python's module search path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import bank_rules
+from Database.Backfill import BackfillCheckpoint
+from html_text import html_to_text
+from imap_utils import (
+    TRANSIENT_ERRORS,
+    IMAPSessionPool,
+    fetch_headers_parallel,
+    fetch_messages_parallel,
+    get_uidvalidity,
+    imap_workers,
+    load_credentials,
+    open_session,
+    search_uids,
+)
+from keyword_classifier import classifier_for
+from message_sources import open_source
+from sender_plan import claiming_banks, downloads_saved, group_banks_by_sender, is_body_candidate
+
 # ✅ Configuration for date range extraction
 START_DATE = "09-Feb-2025"  # Format: DD-Mon-YYYY
 END_DATE = "31-Dec-2025"    # Format: DD-Mon-YYYY
+HEADER_FIRST = True         # Screen subjects before downloading full emails
+# ✅ mbox file, Maildir or .eml directory to read instead of the IMAP server
+MESSAGE_SOURCE = os.getenv("MESSAGE_SOURCE")
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TestEmails")
+# ✅ Backfill progress of the exports, kept next to them rather than in transactions.db
+CHECKPOINT_DB = os.path.join(OUTPUT_DIR, "backfill.db")
 
 def load_config():
     """Load the configuration file to get all bank configurations."""
-    config_file = os.path.join(os.path.dirname(__file__), "config.yml")
-    with open(config_file, "r", encoding='utf-8') as f:
-        return yaml.safe_load(f)
+    return bank_rules.load_config()
 
 def sanitize_filename(filename):
     """Sanitize filename to be safe for all operating systems."""
@@ -70,8 +93,7 @@ def extract_email_content(msg):
         # If we have HTML but no text, extract text from HTML
         if body_html and not body_text:
             try:
-                soup = BeautifulSoup(body_html, "html.parser")
-                body_text = soup.get_text(separator="\n")
+                body_text = html_to_text(body_html)
             except Exception:
                 body_text = "Could not extract text from HTML"
 
@@ -115,21 +137,7 @@ def is_transaction_email(sender, subject, content, config):
     the email is immediately marked as a non-transaction.
     """
     try:
-        for bank_name, bank_config in config["banks"].items():
-            if bank_config["sender"].lower() == sender.lower():
-                # Check for exclusion keywords
-                for ex_kw in bank_config.get("exclude_keywords", []):
-                    if ex_kw.lower() in subject.lower() or ex_kw.lower() in content.lower():
-                        return False, None, None
-
-                keywords = bank_config["keywords"]
-                for keyword in keywords:
-                    if (keyword.lower() in subject.lower() or
-                        keyword.lower() in content.lower()):
-                        return True, bank_name, keyword
-                return False, None, None
-
-        return False, None, None
+        return classifier_for(config).classify(sender, subject, content)
     except Exception:
         return False, None, None
 
@@ -572,82 +580,66 @@ def create_transaction_index(output_dir, transaction_emails, config):
         print(f"❌ Error creating transaction index: {e}")
         return None
 
-def process_single_email(mail, email_id, sender, bank_name, config):
-    """Process a single email and check if it's a transaction."""
-    try:
-        # Fetch the email
-        _, msg_data = mail.fetch(email_id, '(RFC822)')
-        
-        for response_part in msg_data:
-            if isinstance(response_part, tuple):
-                # Parse the email message
-                msg = email.message_from_bytes(response_part[1])
-                
-                # Extract basic info safely
-                subject = decode_email_subject(msg)
-                datetime_str = msg.get("Date", "Unknown Date")
-                email_text, email_html = extract_email_content(msg)
-                
-                # Check if this is a transaction email
-                is_transaction, matched_bank, matched_keyword = is_transaction_email(
-                    sender, subject, email_text, config
-                )
-                
-                # Only return data if it's a transaction
-                if is_transaction:
-                    email_info = {
-                        'content': email_text,
-                        'html_content': email_html,
-                        'datetime': datetime_str,
-                        'subject': subject,
-                        'sender': sender,
-                        'email_id': str(email_id),
-                        'is_transaction': True,
-                        'bank_name': bank_name,
-                        'matched_keyword': matched_keyword
-                    }
-                    return email_info
-                
-                # Return None for non-transaction emails (they'll be ignored)
-                return None
-                
-    except Exception as e:
-        print(f"   ❌ Error processing email {email_id}: {e}")
-        return None
+def process_single_email(raw_email, email_id, sender, bank_names, config):
+    """Parse a downloaded email and return one entry per bank claiming it.
 
-def fetch_transaction_emails_only():
-    """Fetch ONLY transaction emails from ALL banks configured in the YAML file."""
+    ``bank_names`` lists every profile sharing ``sender``; the email is
+    attributed to each profile whose keywords match it.
+    """
     try:
-        # Get credentials
-        base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-        credentials_path = os.path.join(base_dir, "credentials.yml")
+        # Parse the email message
+        msg = email.message_from_bytes(raw_email)
 
-        if not os.path.exists(credentials_path):
-            raise ValueError(f"credentials.yml not found at {credentials_path}")
+        # Extract basic info safely
+        subject = decode_email_subject(msg)
+        datetime_str = msg.get("Date", "Unknown Date")
+        email_text, email_html = extract_email_content(msg)
 
-        with open(credentials_path, 'r', encoding='utf-8') as f:
-            my_credentials = yaml.safe_load(f)
-            user = my_credentials.get("user")
-            password = my_credentials.get("password")
+        # Only return data for the banks treating it as a transaction
+        transactions = []
+        for bank_name, matched_keyword in claiming_banks(bank_names, subject, email_text, config):
+            transactions.append({
+                'content': email_text,
+                'html_content': email_html,
+                'datetime': datetime_str,
+                'subject': subject,
+                'sender': sender,
+                'email_id': str(email_id),
+                'is_transaction': True,
+                'bank_name': bank_name,
+                'matched_keyword': matched_keyword
+            })
+        return transactions
 
-        if not user or not password:
-            raise ValueError("Email credentials not found in credentials.yml")
+    except Exception as e:
+        print(f"   ❌ Error processing email {email_id}: {e}")
+        return []
+
+def fetch_transaction_emails_only(checkpoint=None):
+    """Fetch ONLY transaction emails from ALL banks configured in the YAML file.
+
+    Emails are read from ``MESSAGE_SOURCE`` when it is set, otherwise from
+    the IMAP server. With a ``BackfillCheckpoint``, each email read over IMAP
+    is recorded once its files are written, and a run interrupted by a lost
+    connection resumes after the last email processed, numbering its files
+    after those already written.
+    """
+    try:
+        # Get credentials (only needed when reading from the IMAP server)
+        user = password = None
+        if MESSAGE_SOURCE is None:
+            # EMAIL_USER/EMAIL_PASS take precedence over credentials.yml
+            user, password = load_credentials()
 
         # Load configuration
         config = load_config()
 
         # Create output directory
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        output_dir = os.path.join(script_dir, "..", "TestEmails")
+        output_dir = OUTPUT_DIR
         os.makedirs(output_dir, exist_ok=True)
         
         print(f"📁 Output directory: {os.path.abspath(output_dir)}")
 
-        # Connect to email
-        mail = imaplib.IMAP4_SSL('imap.gmail.com')
-        mail.login(user, password)
-        mail.select('Inbox')
-
         print(f"🔍 Searching for TRANSACTION emails only from {len(config['banks'])} banks:")
         for bank_name, bank_config in config['banks'].items():
             print(f"   • {bank_name}: {bank_config['sender']}")
@@ -656,49 +648,117 @@ def fetch_transaction_emails_only():
 
         transaction_emails = []
         global_index = 1
-        
-        # Process each bank
-        for bank_name, bank_config in config['banks'].items():
-            sender = bank_config['sender']
-            
-            print(f"🏦 Processing {bank_name} ({sender})...")
-            
-            # Search for emails from this sender
-            search_criteria = f'(FROM "{sender}" SINCE "{START_DATE}" BEFORE "{END_DATE}")'
-            _, data = mail.search(None, search_criteria)
-            mail_id_list = data[0].split()
-            
-            if not mail_id_list:
-                print(f"   ⚠️ No emails found from {sender}")
-                continue
-                
-            print(f"   📧 Found {len(mail_id_list)} emails, checking for transactions...")
-            
-            bank_transactions = 0
-            
-            # Process each email from this bank
-            for email_id in mail_id_list:
-                email_info = process_single_email(mail, email_id, sender, bank_name, config)
-                
-                if email_info:  # Only process if it's a transaction
-                    # Create HTML file
-                    filename = create_html_file(email_info, output_dir, global_index)
-                    email_info['filename'] = filename
-                    
-                    transaction_emails.append(email_info)
-                    bank_transactions += 1
-                    
-                    print(f"   ✅ TRANSACTION {bank_transactions}: {email_info['subject'][:50]}... → {filename}")
-                    print(f"      Keyword: '{email_info['matched_keyword']}'")
-                    
-                    global_index += 1
-            
-            print(f"   💳 Found {bank_transactions} transaction emails from {bank_name}")
-            print()
-        
-        # Close connection
-        mail.close()
-        mail.logout()
+        sender_groups = group_banks_by_sender(config)
+        message_counts = {}
+        header_stats = {}
+
+        def export(raw_email, email_id, sender, bank_names):
+            """Write the HTML file of every transaction found in one email."""
+            nonlocal global_index
+            found = 0
+            for email_info in process_single_email(raw_email, email_id, sender, bank_names, config):
+                # Create HTML file
+                filename = create_html_file(email_info, output_dir, global_index)
+                email_info['filename'] = filename
+
+                transaction_emails.append(email_info)
+                found += 1
+
+                print(f"   ✅ TRANSACTION: {email_info['subject'][:50]}... → {filename}")
+                print(f"      Keyword: '{email_info['matched_keyword']}'")
+
+                if checkpoint is not None:
+                    checkpoint.add_inserted(global_index)
+                global_index += 1
+            return found
+
+        if MESSAGE_SOURCE is not None:
+            # Local files are read in one pass at disk speed: no header
+            # screening, and nothing to resume
+            print(f"📂 Reading emails from {MESSAGE_SOURCE}")
+            with open_source(MESSAGE_SOURCE) as source:
+                messages = source.iter_messages(sender_groups, START_DATE, END_DATE)
+                for sender, email_id, raw_email in messages:
+                    if sender not in message_counts:
+                        print(f"🏦 Processing {', '.join(sender_groups[sender])} ({sender})...")
+                    message_counts[sender] = message_counts.get(sender, 0) + 1
+                    export(raw_email, email_id, sender, sender_groups[sender])
+            for sender in sender_groups:
+                if sender not in message_counts:
+                    print(f"   ⚠️ No emails found from {sender}")
+        else:
+            # The IMAP server is searched by UID, so subjects can be screened
+            # from headers first and an interrupted run resumed
+            pool = IMAPSessionPool(lambda: open_session(user, password), size=imap_workers())
+
+            # A connection that stays down after the pool's retries ends the run,
+            # but the transaction emails already found are still indexed
+            try:
+                uidvalidity = None
+                if checkpoint is not None:
+                    uidvalidity = pool.run(get_uidvalidity)
+                    checkpoint.begin(user, "Inbox", START_DATE, END_DATE)
+                    if checkpoint.resumed:
+                        # The files written so far are the records of the interrupted run
+                        global_index = len(checkpoint.inserted_ids()) + 1
+                        print(f"♻️ Resuming an interrupted run after {global_index - 1} transaction emails")
+
+                # Process each distinct sender once, even when banks share it
+                for sender, bank_names in sender_groups.items():
+                    print(f"🏦 Processing {', '.join(bank_names)} ({sender})...")
+
+                    # Search for emails from this sender, after the last one processed when resuming
+                    resume_uid = checkpoint.resume_uid(sender, uidvalidity) if checkpoint is not None else None
+                    search_criteria = f'FROM "{sender}" SINCE "{START_DATE}" BEFORE "{END_DATE}"'
+                    if resume_uid:
+                        search_criteria = f"UID {resume_uid}:* {search_criteria}"
+                    mail_id_list = pool.run(search_uids, f"({search_criteria})")
+                    if resume_uid:
+                        # "n:*" always matches the newest message, even below n
+                        mail_id_list = [uid for uid in mail_id_list if int(uid) >= resume_uid]
+
+                    if not mail_id_list:
+                        print(f"   ⚠️ No emails found from {sender}")
+                        continue
+
+                    print(f"   📧 Found {len(mail_id_list)} emails, checking for transactions...")
+                    message_counts[sender] = len(mail_id_list)
+
+                    bank_transactions = 0
+
+                    # Phase 1: screen subjects from headers only, so bodies of emails
+                    # that no bank could claim are never downloaded
+                    candidates = mail_id_list
+                    if HEADER_FIRST:
+                        candidates = []
+                        for email_id, size, header in fetch_headers_parallel(pool, mail_id_list, stats=header_stats):
+                            subject = decode_email_subject(email.message_from_bytes(header))
+                            if is_body_candidate(bank_names, subject, config):
+                                candidates.append(email_id)
+                            else:
+                                header_stats["bodies_skipped"] = header_stats.get("bodies_skipped", 0) + 1
+                                header_stats["bytes_avoided"] = header_stats.get("bytes_avoided", 0) + size
+                        print(f"   📨 {len(candidates)} candidates after header screening")
+
+                    # Phase 2: download each candidate once and route it to the banks claiming it
+                    for email_id, raw_email in fetch_messages_parallel(pool, candidates):
+                        bank_transactions += export(raw_email, email_id, sender, bank_names)
+                        if checkpoint is not None:
+                            checkpoint.message_done(sender, uidvalidity, email_id)
+
+                    print(f"   💳 Found {bank_transactions} transaction emails from {', '.join(bank_names)}")
+                    print()
+
+                if checkpoint is not None:
+                    checkpoint.finish()
+
+            except TRANSIENT_ERRORS as e:
+                print(f"\n❌ IMAP connection lost, keeping the {len(transaction_emails)} transaction emails found so far: {e}")
+                if checkpoint is not None:
+                    print("💾 Progress was saved; run the script again to resume.")
+            finally:
+                # Close connections
+                pool.close()
         
         # Create transaction-only index
         if transaction_emails:
@@ -710,6 +770,13 @@ def fetch_transaction_emails_only():
             print(f"📁 Output directory: {os.path.abspath(output_dir)}")
             print(f"💳 Total transaction emails: {len(transaction_emails)}")
             print(f"📋 Non-transaction emails: IGNORED")
+            print(f"♻️ Duplicate downloads avoided: {downloads_saved(sender_groups, message_counts)}")
+            if HEADER_FIRST:
+                print(
+                    f"📉 Bodies skipped after header screening: {header_stats.get('bodies_skipped', 0)} "
+                    f"({header_stats.get('bytes_avoided', 0) / 1024:.1f} KB avoided, "
+                    f"{header_stats.get('header_bytes', 0) / 1024:.1f} KB of headers fetched)"
+                )
             if index_path:
                 print(f"🌐 Transaction index: {index_path}")
             print(f"{'='*80}")
@@ -742,7 +809,9 @@ if __name__ == "__main__":
     print(f"🎯 Mode: TRANSACTION EMAILS ONLY")
     print(f"=" * 50)
     
-    transaction_emails = fetch_transaction_emails_only()
+    # ✅ IMAP runs are checkpointed, so an interrupted run resumes where it stopped
+    checkpoint = BackfillCheckpoint(CHECKPOINT_DB) if MESSAGE_SOURCE is None else None
+    transaction_emails = fetch_transaction_emails_only(checkpoint)
     if transaction_emails:
         print(f"\n🎉 Transaction extraction completed successfully!")
         print(f"📄 Open TestEmails/index.html to browse {len(transaction_emails)} transaction emails")
@@ -6,39 +6,85 @@ import logging
 # Ensure modules in the parent directory (Application) are importable
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from extracteur import fetch_emails
-from traitement import extract_transaction_data
+from extracteur import iter_emails
+from extraction_pool import iter_extracted
+from imap_utils import imap_workers, keyword_search_enabled
+from message_cache import MessageCache
+import pattern_stats
 
 # Configure logging if not already done
 if not logging.getLogger().handlers:
     logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Let the server skip emails that no bank keyword matches (opt-in, see main.py)
+KEYWORD_SEARCH = keyword_search_enabled()
+
 
 def main():
-    if len(sys.argv) < 3:
+    # --offline replays the local message cache instead of querying IMAP
+    offline = '--offline' in sys.argv[1:]
+    # --keyword-search narrows the IMAP SEARCH with each bank's keywords
+    keyword_search = KEYWORD_SEARCH or '--keyword-search' in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg not in ('--offline', '--keyword-search')]
+    # --workers N extracts transactions in N processes (0: one per core)
+    workers = 1
+    if '--workers' in args:
+        i = args.index('--workers')
+        try:
+            workers = int(args[i + 1])
+        except (IndexError, ValueError):
+            print(json.dumps({'error': '--workers requires a number'}))
+            return
+        del args[i:i + 2]
+    # --imap-workers N downloads over N IMAP sessions (default: IMAP_WORKERS or 4)
+    sessions = imap_workers()
+    if '--imap-workers' in args:
+        i = args.index('--imap-workers')
+        try:
+            sessions = int(args[i + 1])
+        except (IndexError, ValueError):
+            print(json.dumps({'error': '--imap-workers requires a number'}))
+            return
+        del args[i:i + 2]
+    if len(args) < 2:
         print(json.dumps({'error': 'start_date and end_date required'}))
         return
-    start_date = sys.argv[1]
-    end_date = sys.argv[2]
-
-    emails = fetch_emails(start_date, end_date)
-    results = []
-    for email in emails:
-        trans = extract_transaction_data(
-            email,
-            email.get('sender'),
-            email.get('subject'),
-            email.get('email_datetime')
-        )
-        if trans.get('amount'):
-            results.append({'email': email, 'transaction': trans})
-        else:
-            logger.info(
-                "Skipped email without transaction amount: %s",
-                email.get('subject')
+    start_date = args[0]
+    end_date = args[1]
+
+    # Stream the JSON array so only one email is held in memory at a time
+    count = 0
+    sys.stdout.write('[')
+    # Close the array even when the run fails, so stdout stays valid JSON
+    try:
+        with MessageCache() as cache:
+            emails = iter_emails(
+                start_date,
+                end_date,
+                workers=sessions,
+                cache=cache,
+                offline=offline,
+                keyword_search=keyword_search,
             )
-    print(json.dumps(results))
+            # Try each bank's regex variants in the order learned by previous runs
+            pattern_stats.prime()
+            try:
+                for email, trans in iter_extracted(emails, workers=workers):
+                    if trans.get('amount'):
+                        if count:
+                            sys.stdout.write(', ')
+                        sys.stdout.write(json.dumps({'email': email, 'transaction': trans}))
+                        count += 1
+                    else:
+                        logger.info(
+                            "Skipped email without transaction amount: %s",
+                            email.get('subject')
+                        )
+            finally:
+                pattern_stats.save()
+    finally:
+        print(']')
 
 
 if __name__ == '__main__':
@@ -1,6 +1,7 @@
 import sys
 import os
 import json
+from datetime import datetime
 
 # Ensure Application and project root modules are importable
 current_dir = os.path.dirname(__file__)
@@ -8,7 +9,23 @@ sys.path.append(os.path.abspath(os.path.join(current_dir, '..')))
 sys.path.append(os.path.abspath(os.path.join(current_dir, '..', '..')))
 
 from traitement import extract_transaction_data
-from Database.Insert import insert_transaction
+from Database.TransactionStore import TransactionStore
+
+
+def _matches_earlier(trans, earlier):
+    """Same check as ``TransactionStore.is_duplicate``, against ``earlier`` transactions."""
+    try:
+        amount = float(trans['amount'])
+        day = datetime.strptime(trans['date'], "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return False
+    for other in earlier:
+        try:
+            if float(other['amount']) == amount and abs((datetime.strptime(other['date'], "%Y-%m-%d") - day).days) <= 1:
+                return True
+        except (TypeError, ValueError):
+            continue
+    return False
 
 
 def main():
@@ -23,16 +40,27 @@ def main():
         return
 
     results = []
-    for email in emails:
-        trans = extract_transaction_data(
-            email, email.get('sender'), email.get('subject'), email.get('email_datetime')
-        )
-        insert_result = insert_transaction(trans)
-        if isinstance(insert_result, dict):
-            trans['category'] = insert_result.get('category', trans.get('category'))
-            trans['tags'] = insert_result.get('tags', trans.get('tags', []))
-            trans['applied_rules'] = insert_result.get('applied_rules', [])
-        results.append(trans)
+    with TransactionStore() as store:
+        for email in emails:
+            trans = extract_transaction_data(
+                email, email.get('sender'), email.get('subject'), email.get('email_datetime'),
+                check_duplicate=False,
+            )
+            # Earlier emails of the batch are not stored yet, so compare them in memory
+            trans['duplicate'] = bool(
+                trans['amount'] and trans['date'] and (
+                    store.is_duplicate(trans['amount'], trans['date'])
+                    or _matches_earlier(trans, results)
+                )
+            )
+            results.append(trans)
+
+        # ✅ Stored with one database transaction (and one commit) per INSERT_BATCH_SIZE emails
+        for trans, insert_result in zip(results, store.insert_many(results)):
+            if isinstance(insert_result, dict):
+                trans['category'] = insert_result.get('category', trans.get('category'))
+                trans['tags'] = insert_result.get('tags', trans.get('tags', []))
+                trans['applied_rules'] = insert_result.get('applied_rules', [])
     print(json.dumps(results))
 
 
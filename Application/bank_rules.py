@@ -0,0 +1,301 @@
+"""Bank rules from ``config.yml``, parsed and compiled once per process.
+
+``load_rules`` returns a shared ``BankRuleSet``: every amount/description
+regex compiled, and the bank profiles indexed by sender. The file is
+stat-ed at most once per ``CHECK_INTERVAL`` seconds and only reloaded when
+its modification time changes and its content hash differs, so a
+long-running process such as the IDLE daemon picks up edits without
+re-reading the YAML for every email.
+
+Profiles with several regex variants (one per email template) try them in
+order of recent hits rather than in file order, so the usual template is
+matched with a single pair of searches. ``pattern_stats`` persists the
+hit counts between runs; set ``ADAPTIVE_PATTERNS=0`` to always follow the
+order of ``config.yml``.
+
+A profile may also list ``anchors``, phrases found next to the transaction
+details. The regexes then first run on the lines around the earliest
+anchor (``anchor_window`` characters on each side) instead of on the whole
+email and its legal footer; the whole text is searched when the anchor is
+missing or the window holds no complete match. Anchors are ignored unless
+every regex of the profile starts with a fixed phrase: a regex such as
+``([0-9]+[,.][0-9]{2})`` returns the first amount anywhere in the text,
+and a window could only skip an earlier match the whole-text search returns.
+"""
+
+import copy
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = os.path.join(os.path.dirname(__file__), "config.yml")
+# ✅ Seconds between two checks of config.yml for changes
+CHECK_INTERVAL = 1.0
+# ✅ Characters kept on each side of an anchor phrase, unless the profile sets anchor_window
+ANCHOR_WINDOW = 400
+# ✅ Try regex variants by recent hits instead of file order
+ADAPTIVE_PATTERNS = os.environ.get("ADAPTIVE_PATTERNS", "1").lower() not in ("0", "false", "no", "off")
+
+
+def pattern_key(regex):
+    """Stable identifier of an ``{amount, description}`` regex variant."""
+    text = f"{regex.get('amount', '')}\0{regex.get('description', '')}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+class BankRule:
+    """One bank profile of ``config.yml`` with its regexes compiled.
+
+    ``patterns`` lists ``(amount, description)`` compiled pairs, or is
+    ``None`` when the profile has no usable ``regex``. ``regex`` may be a
+    single pair or a list of pairs. ``pattern_keys`` identifies each pair
+    (see :func:`pattern_key`) and ``order`` is the order they are tried in.
+    ``hits`` counts the matches of each pair since the last
+    :meth:`take_hits`. ``anchors`` lists the phrases bounding the text
+    searched first (see :meth:`window`).
+    """
+
+    def __init__(self, name, cfg):
+        self.name = name
+        self.cfg = cfg
+        self.sender = cfg.get("sender")
+        self.keywords = list(cfg.get("keywords", []))
+        self.exclude_keywords = list(cfg.get("exclude_keywords", []))
+        self.subject_keywords = bool(cfg.get("subject_keywords"))
+        self.card_type = "credit card" if "credit" in name else "debit card"
+        anchors = list(cfg.get("anchors", []))
+        window = cfg.get("anchor_window", ANCHOR_WINDOW)
+        if isinstance(window, (list, tuple)):
+            self.window_before, self.window_after = (int(size) for size in window)
+        else:
+            self.window_before = self.window_after = int(window)
+        self.single_pattern = isinstance(cfg.get("regex"), dict)
+        variants = self._variants(cfg.get("regex"))
+        self.patterns = None
+        if variants is not None:
+            self.patterns = [
+                (re.compile(pat.get("amount", "")), re.compile(pat.get("description", "")))
+                for pat in variants
+            ]
+            self.pattern_keys = [pattern_key(pat) for pat in variants]
+        else:
+            self.pattern_keys = []
+        self.order = list(range(len(self.pattern_keys)))
+        self.hits = [0] * len(self.pattern_keys)
+        self._weights = [0] * len(self.pattern_keys)
+        if anchors and not self._anchored_patterns(variants):
+            logger.warning("Ignoring the anchors of %s: its regexes do not start with a fixed phrase", name)
+            anchors = []
+        self.anchors = anchors
+
+    @staticmethod
+    def _variants(regex):
+        if isinstance(regex, list):
+            return [pat for pat in regex if isinstance(pat, dict)]
+        if isinstance(regex, dict) and "amount" in regex and "description" in regex:
+            return [regex]
+        return None
+
+    @staticmethod
+    def _anchored_patterns(variants):
+        # "Montant de l'achat\s*:..." only matches next to its phrase, while
+        # "\$?([0-9]+...)" matches any amount before the anchor as well
+        return all(
+            re.match(r"\w", pat.get(field, ""))
+            for pat in variants or ()
+            for field in ("amount", "description")
+        )
+
+    def apply_scores(self, scores):
+        """Try the variants by decreasing ``scores[key]``, file order on ties."""
+        self._weights = [scores.get(key, 0) + hits for key, hits in zip(self.pattern_keys, self.hits)]
+        if ADAPTIVE_PATTERNS:
+            self.order.sort(key=lambda i: (-self._weights[i], i))
+
+    def take_hits(self):
+        """Return ``{pattern_key: hits}`` counted so far and reset the counts."""
+        hits = {self.pattern_keys[i]: n for i, n in enumerate(self.hits) if n}
+        self.hits = [0] * len(self.pattern_keys)
+        return hits
+
+    def add_hits(self, hits):
+        """Count ``{pattern_key: hits}`` made elsewhere, e.g. in a worker process."""
+        for i, key in enumerate(self.pattern_keys):
+            n = hits.get(key)
+            if n:
+                self.hits[i] += n
+                self._weights[i] += n
+
+    def _hit(self, position):
+        index = self.order[position]
+        self.hits[index] += 1
+        self._weights[index] += 1
+        # Move a variant ahead of the one before it once it has more hits
+        if ADAPTIVE_PATTERNS and position:
+            previous = self.order[position - 1]
+            if self._weights[index] > self._weights[previous]:
+                self.order[position - 1], self.order[position] = index, previous
+
+    def window(self, text):
+        """Return the lines of ``text`` around its earliest anchor, or ``None``.
+
+        ``anchor_window`` is the number of characters kept on each side of
+        the anchor, or a ``[before, after]`` pair. The window is widened to
+        whole lines when a line break is close enough, so a match is not
+        cut in the middle of a word.
+        """
+        positions = [(pos, anchor) for anchor in self.anchors if (pos := text.find(anchor)) != -1]
+        if not positions:
+            return None
+        pos, anchor = min(positions)
+        start = max(0, pos - self.window_before)
+        end = min(len(text), pos + len(anchor) + self.window_after)
+        if start:
+            line_start = text.rfind("\n", max(0, start - self.window_before), start)
+            if line_start != -1:
+                start = line_start + 1
+        if end < len(text):
+            line_end = text.find("\n", end, end + self.window_after)
+            if line_end != -1:
+                end = line_end
+        return text[start:end]
+
+    def match(self, text):
+        """Return the ``(amount, description)`` matches found in ``text``.
+
+        From a list of pairs, the first pair (in ``order``) where both
+        patterns match wins. A single pair returns its matches even if only
+        one of them matched. With ``anchors``, the anchor window is
+        searched first and the whole text only when the window holds no
+        complete match.
+        """
+        if self.anchors:
+            window = self.window(text)
+            if window is not None:
+                amount_match, description_match = self._match(window)
+                if amount_match and description_match:
+                    return amount_match, description_match
+        return self._match(text)
+
+    def _match(self, text):
+        if self.single_pattern:
+            amount, description = self.patterns[0]
+            amount_match, description_match = amount.search(text), description.search(text)
+            if amount_match and description_match:
+                self._hit(0)
+            return amount_match, description_match
+        for position, index in enumerate(self.order):
+            amount, description = self.patterns[index]
+            amount_match = amount.search(text)
+            if amount_match:
+                description_match = description.search(text)
+                if description_match:
+                    self._hit(position)
+                    return amount_match, description_match
+        return None, None
+
+
+class BankRuleSet:
+    """Every bank profile of a configuration, compiled and indexed by sender."""
+
+    def __init__(self, config, path=None, digest=None):
+        self.config = config
+        self.path = path
+        self.digest = digest
+        self.banks = {
+            name: BankRule(name, cfg) for name, cfg in (config.get("banks") or {}).items()
+        }
+        self.by_sender = {}
+        for rule in self.banks.values():
+            if rule.sender:
+                self.by_sender.setdefault(rule.sender, []).append(rule)
+
+    @classmethod
+    def from_file(cls, path=CONFIG_FILE):
+        with open(path, "rb") as f:
+            data = f.read()
+        return cls(yaml.safe_load(data) or {}, path, hashlib.sha256(data).hexdigest())
+
+    def apply_scores(self, scores):
+        """Order every profile's variants by ``scores[(bank, pattern_key)]``."""
+        for name, rule in self.banks.items():
+            rule.apply_scores({key: n for (bank, key), n in scores.items() if bank == name})
+
+    def take_hits(self):
+        """Return ``{(bank, pattern_key): hits}`` and reset the counts."""
+        return {
+            (name, key): n for name, rule in self.banks.items() for key, n in rule.take_hits().items()
+        }
+
+    def add_hits(self, hits):
+        """Count ``{(bank, pattern_key): hits}`` made elsewhere."""
+        for (name, key), n in hits.items():
+            rule = self.banks.get(name)
+            if rule is not None:
+                rule.add_hits({key: n})
+
+    def identify_bank(self, sender, subject):
+        """Return the first profile of ``sender`` with a keyword in ``subject``, or ``"Unknown"``."""
+        for rule in self.by_sender.get(sender, ()):
+            if any(keyword in subject for keyword in rule.keywords):
+                logger.info("Identified Bank: %s", rule.name)
+                return rule.name
+        logger.warning("Could not identify bank for sender: %s", sender)
+        logger.debug("Subject was: %s", subject)
+        return "Unknown"
+
+
+class _Loaded:
+    def __init__(self, rules, mtime):
+        self.rules = rules
+        self.mtime = mtime
+        self.checked = time.monotonic()
+
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+def load_rules(path=None):
+    """Return the shared ``BankRuleSet`` of ``path`` (default ``config.yml``)."""
+    path = os.path.abspath(path or CONFIG_FILE)
+    entry = _loaded.get(path)
+    now = time.monotonic()
+    if entry is not None and now - entry.checked < CHECK_INTERVAL:
+        return entry.rules
+
+    with _lock:
+        entry = _loaded.get(path)
+        mtime = os.stat(path).st_mtime_ns
+        if entry is not None and entry.mtime == mtime:
+            entry.checked = now
+            return entry.rules
+        rules = BankRuleSet.from_file(path)
+        if entry is not None and entry.rules.digest == rules.digest:
+            # Touched but unchanged: keep the compiled rules
+            rules = entry.rules
+        elif entry is not None:
+            logger.info("Reloaded bank rules from %s", path)
+        _loaded[path] = _Loaded(rules, mtime)
+        return rules
+
+
+def load_config(path=None):
+    """Return a copy of the parsed ``config.yml``, safe to modify."""
+    return copy.deepcopy(load_rules(path).config)
+
+
+def rules_for(config=None):
+    """Return ``config`` as a ``BankRuleSet``; ``None`` means ``config.yml``."""
+    if config is None:
+        return load_rules()
+    if isinstance(config, BankRuleSet):
+        return config
+    return BankRuleSet(config)
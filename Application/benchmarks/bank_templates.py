@@ -0,0 +1,176 @@
+"""Synthetic transaction alerts shaped like the bank emails in ``config.yml``.
+
+The layout mimics what the banks actually send: a large ``<style>`` block,
+Outlook conditional comments, a hidden preheader and nested presentation
+tables around a few lines of transaction text, followed by a long legal
+footer. The text lines are the ones the ``config.yml`` regexes look for;
+``neo_credit`` alerts come in the English, cashback and French variants
+of its regex list.
+"""
+
+import html
+import random
+from email import policy
+from email.message import EmailMessage
+
+_HEAD = """<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml" lang="{lang}">
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=utf-8" />
+<meta name="viewport" content="width=device-width, initial-scale=1.0" />
+<title>{title}</title>
+<style type="text/css">
+body {{ margin: 0; padding: 0; -webkit-text-size-adjust: 100%; }}
+table, td {{ border-collapse: collapse; mso-table-lspace: 0pt; mso-table-rspace: 0pt; }}
+img {{ border: 0; height: auto; line-height: 100%; outline: none; text-decoration: none; }}
+.preheader {{ display: none !important; visibility: hidden; opacity: 0; height: 0; width: 0; }}
+@media only screen and (max-width: 620px) {{
+  .container {{ width: 100% !important; }}
+  .mobile-padding {{ padding-left: 16px !important; padding-right: 16px !important; }}
+}}
+</style>
+<!--[if mso]><style>.fallback-font {{ font-family: Arial, sans-serif; }}</style><![endif]-->
+</head>
+<body style="margin:0;padding:0;background-color:#f4f4f4;">
+<div class="preheader">{title}&nbsp;&zwnj;&nbsp;&zwnj;&nbsp;&zwnj;</div>
+<table role="presentation" width="100%" cellpadding="0" cellspacing="0" border="0" bgcolor="#f4f4f4">
+  <tr>
+    <td align="center" style="padding: 24px 0;">
+      <table role="presentation" class="container" width="600" cellpadding="0" cellspacing="0" border="0" bgcolor="#ffffff">
+        <tr>
+          <td style="padding: 20px 32px;" class="mobile-padding">
+            <img src="https://example.com/logo.png" width="120" alt="{bank}" style="display:block;" />
+          </td>
+        </tr>
+"""
+
+_ROW = """        <tr>
+          <td class="mobile-padding" style="padding: 6px 32px; font-family: Arial, sans-serif; font-size: 15px; line-height: 22px; color: #333333;">
+            {line}
+          </td>
+        </tr>
+"""
+
+_FOOT = """        <tr>
+          <td class="mobile-padding" style="padding: 24px 32px; font-family: Arial, sans-serif; font-size: 11px; line-height: 16px; color: #777777;">
+            {footer}
+          </td>
+        </tr>
+      </table>
+      <!--[if mso]></td></tr></table><![endif]-->
+    </td>
+  </tr>
+</table>
+</body>
+</html>
+"""
+
+_FOOTER_EN = [
+    "Please do not reply to this email. This mailbox is not monitored.",
+    "To change your alert preferences, sign in to online banking and select <b>Manage alerts</b>.",
+    "Email is not a secure means of communication; we will never ask for your password by email.",
+    "&copy; 2025 The Bank. All rights reserved. Trademarks are used under licence.",
+]
+_FOOTER_FR = [
+    "Veuillez ne pas r&eacute;pondre au pr&eacute;sent courriel.",
+    "Pour modifier vos alertes, ouvrez une session et s&eacute;lectionnez <b>G&eacute;rer mes alertes</b>.",
+    "Le courriel n&rsquo;est pas un mode de communication s&eacute;curis&eacute;.",
+    "&copy; 2025 La Banque. Tous droits r&eacute;serv&eacute;s.",
+]
+
+_MERCHANTS = ["MAXI #8634 LAVAL QC", "CANADIAN TIRE #231", "METRO PLUS", "SAQ 23077", "BOULANGERIE ST-ROCH"]
+
+# ✅ Number of templates sent by banks with several alert layouts
+VARIANTS = {"neo_credit": 3}
+
+
+def _lines(bank, amount, merchant, variant=0):
+    french_amount = amount.replace(".", ",")
+    if bank == "cibc_debit":
+        return "fr", "Achat en point de vente", [
+            "Bonjour,",
+            "Un achat en point de vente a &eacute;t&eacute; effectu&eacute; avec votre carte de d&eacute;bit.",
+            f"Montant de l'achat : {french_amount}$",
+            f"Lieu de l'achat : {merchant}",
+            "Date de l'achat : 10 f&eacute;vrier 2025",
+        ]
+    if bank == "cibc_credit":
+        return "fr", "Nouvel achat avec votre carte de cr&eacute;dit", [
+            "Bonjour,",
+            f"Vous avez r&eacute;cemment effectu&eacute; un achat de {french_amount}$ {merchant} "
+            "avec votre CIBC Dividend Visa Infinite Card dont le num&eacute;ro se termine par 0165.",
+            "Pour plus de d&eacute;tails sur cette op&eacute;ration, ouvrez une session bancaire CIBC.",
+        ]
+    if bank == "capital_one_credit":
+        return "en", "A transaction was charged to your account", [
+            "A transaction was charged to your account",
+            "Re: Account ending in 6234",
+            f"<span style=\"font-weight:bold\">{merchant}</span> <span>${amount}</span>",
+            "If you don't recognize this transaction, call us at the number on the back of your card.",
+        ]
+    if bank == "mbna_credit":
+        return "en", "MBNA - Transaction Alert", [
+            "Transaction Alert",
+            f"You made a purchase of ${amount} from {merchant}",
+            "on your card ending in 1234.",
+            "Thank you for using your MBNA credit card.",
+        ]
+    if variant == 1:
+        return "en", "You earned cashback", [
+            f"You earned $0.{int(float(amount)) % 90 + 10} cashback on your purchase of ${amount} at {merchant}",
+            "Keep using your Neo card to earn more.",
+        ]
+    if variant == 2:
+        return "fr", f"Votre achat chez {merchant}", [
+            f"Votre achat chez {merchant}",
+            f"a &eacute;t&eacute; approuv&eacute; pour {french_amount} $",
+        ]
+    return "en", "You made a purchase", [
+        f"You made a purchase of ${amount} at {merchant}",
+        "You earned <strong>1%</strong> cashback on this purchase.",
+    ]
+
+
+def bank_alert_html(bank, amount, merchant, variant=0):
+    """Return the HTML body of an alert for ``bank`` (a ``config.yml`` key)."""
+    lang, title, lines = _lines(bank, amount, merchant, variant)
+    footer = _FOOTER_FR if lang == "fr" else _FOOTER_EN
+    return (
+        _HEAD.format(lang=lang, title=title, bank=bank)
+        + "".join(_ROW.format(line=line) for line in lines)
+        + _FOOT.format(footer="<br />\n            ".join(footer * 3))
+    )
+
+
+def alert_subject(bank, merchant, variant=0):
+    """Return the subject line of an alert, as the bank sends it."""
+    return html.unescape(_lines(bank, "1.00", merchant, variant)[1])
+
+
+def raw_alert(sender, bank, amount, merchant, variant=0, date="Mon, 10 Feb 2025 10:00:00 -0500"):
+    """Return the bytes of a complete alert email from ``sender``."""
+    message = EmailMessage(policy=policy.SMTP)
+    message["From"] = sender
+    message["Subject"] = alert_subject(bank, merchant, variant)
+    message["Date"] = date
+    message.set_content(bank_alert_html(bank, amount, merchant, variant), subtype="html")
+    return message.as_bytes()
+
+
+def iter_alerts(banks, count, seed=0):
+    """Yield ``count`` ``(bank, variant, amount, merchant)`` alerts spread over ``banks``."""
+    rng = random.Random(seed)
+    banks = list(banks)
+    for i in range(count):
+        bank = banks[i % len(banks)]
+        amount = f"{rng.randint(1, 500)}.{rng.randint(0, 99):02d}"
+        variant = rng.randrange(VARIANTS.get(bank, 1))
+        yield bank, variant, amount, rng.choice(_MERCHANTS)
+
+
+def corpus(banks, count, seed=0):
+    """Return ``count`` ``(bank, html)`` alerts spread over ``banks``."""
+    return [
+        (bank, bank_alert_html(bank, amount, merchant, variant))
+        for bank, variant, amount, merchant in iter_alerts(banks, count, seed)
+    ]
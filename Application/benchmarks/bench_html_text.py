@@ -0,0 +1,83 @@
+"""Compare the ``html_text`` backends on bank transaction alerts.
+
+Usage: python benchmarks/bench_html_text.py [messages] [--cache DIR] [--repeat N]
+
+By default the corpus is built from ``bank_templates`` for every bank in
+``config.yml``. With ``--cache``, the emails stored in a ``MessageCache``
+(``Database/message_cache`` after a ``main.py`` run) are used instead, so
+the backends can be checked against the real templates. Every backend's
+output is compared with the ``bs4`` reference.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bank_templates import corpus
+from html_text import BACKENDS, available_backends
+from Realtransactions import load_config
+
+
+def cached_corpus(root, limit):
+    from extracteur import parse_email_message
+    from message_cache import MessageCache
+
+    documents = []
+    with MessageCache(root) as cache:
+        for _, sender, raw_email in cache.iter_messages():
+            html = parse_email_message(raw_email, sender, None)["full_email_html"]
+            if html:
+                documents.append(html)
+            if len(documents) >= limit:
+                break
+    return documents
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the HTML-to-text backends.")
+    parser.add_argument("messages", nargs="?", type=int, default=500)
+    parser.add_argument("--cache", help="MessageCache directory holding real emails")
+    parser.add_argument("--repeat", type=int, default=3, help="best of N timings")
+    args = parser.parse_args()
+
+    if args.cache:
+        documents = cached_corpus(args.cache, args.messages)
+        origin = f"cached emails from {args.cache}"
+    else:
+        documents = [html for _, html in corpus(load_config()["banks"], args.messages)]
+        origin = "synthetic bank alerts"
+    if not documents:
+        print("❌ No HTML email found.")
+        return
+
+    size = sum(len(html) for html in documents)
+    print(f"📄 {len(documents)} {origin}, {size / len(documents) / 1024:.1f} KB of HTML on average")
+
+    reference = [BACKENDS["bs4"](html) for html in documents]
+    baseline = None
+    for name in ["bs4"] + [n for n in BACKENDS if n != "bs4"]:
+        if name not in available_backends():
+            print(f"   {name:<10} not installed")
+            continue
+        convert = BACKENDS[name]
+        best = None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            texts = [convert(html) for html in documents]
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        baseline = baseline or best
+        mismatches = sum(text != expected for text, expected in zip(texts, reference))
+        print(
+            f"   {name:<10} {best * 1e6 / len(documents):8.0f} µs/email  x{baseline / best:4.1f}  "
+            f"{mismatches} outputs differing from bs4"
+        )
+
+
+if __name__ == "__main__":
+    main()
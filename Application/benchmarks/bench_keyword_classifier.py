@@ -0,0 +1,90 @@
+"""Micro-benchmark of transaction classification against per-keyword loops.
+
+Usage: python benchmarks/bench_keyword_classifier.py [emails]
+
+Times the original loop (``keyword.lower() in content.lower()`` for every
+keyword) and ``KeywordClassifier`` with each matching engine, first with
+the keywords of ``config.yml`` and then with extra synthetic banks, to
+show where an automaton starts to pay off.
+"""
+
+import os
+import random
+import sys
+import time
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bank_rules import load_config
+from bank_templates import corpus
+from html_text import html_to_text
+from keyword_classifier import ENGINES, KeywordClassifier, ahocorasick, classifier_for
+
+
+def keyword_loop(sender, subject, content, config):
+    for bank_name, bank_config in config["banks"].items():
+        if bank_config["sender"].lower() == sender.lower():
+            for ex_kw in bank_config.get("exclude_keywords", []):
+                if ex_kw.lower() in subject.lower() or ex_kw.lower() in content.lower():
+                    return False, None, None
+            for keyword in bank_config["keywords"]:
+                if keyword.lower() in subject.lower() or keyword.lower() in content.lower():
+                    return True, bank_name, keyword
+            return False, None, None
+    return False, None, None
+
+
+def with_extra_banks(config, count, rng):
+    """Copy of ``config`` with ``count`` extra banks of random keywords, placed first."""
+    words = ["alerte", "purchase", "carte", "account", "paiement", "virement", "retrait", "solde"]
+    banks = {}
+    for i in range(count):
+        banks[f"extra_{i}"] = {
+            "sender": config["banks"][rng.choice(list(config["banks"]))]["sender"],
+            "keywords": [f"{rng.choice(words)} {rng.choice(words)} {i}-{j}" for j in range(4)],
+            "exclude_keywords": [f"{rng.choice(words)} exclu {i}"],
+        }
+    banks.update(config["banks"])
+    return {"banks": banks}
+
+
+def timed(classify, emails):
+    started = time.perf_counter()
+    results = [classify(*email) for email in emails]
+    return (time.perf_counter() - started) * 1e6 / len(emails), results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    base = load_config()
+    emails = []
+    for bank, html in corpus(base["banks"], count):
+        emails.append((base["banks"][bank]["sender"], "Transaction Alert", html_to_text(html)))
+    size = sum(len(content) for _, _, content in emails) / len(emails)
+    print(f"✉️  {count} emails, {size:.0f} characters of text on average")
+
+    rng = random.Random(0)
+    for extra in (0, 25, 100):
+        config = with_extra_banks(base, extra, rng) if extra else base
+        phrases = sum(len(b["keywords"]) + len(b.get("exclude_keywords", [])) for b in config["banks"].values())
+        print(f"🔑 {phrases} keywords")
+        loop_time, expected = timed(lambda s, subj, c: keyword_loop(s, subj, c, config), emails)
+        print(f"   {'keyword loop':<22} {loop_time:8.1f} µs/email")
+        for engine in ENGINES:
+            if engine == "pyahocorasick" and ahocorasick is None:
+                print(f"   {engine:<22} not installed")
+                continue
+            classifier = KeywordClassifier(config, engine=engine)
+            elapsed, results = timed(classifier.classify, emails)
+            status = "same results" if results == expected else "DIFFERENT RESULTS"
+            print(f"   {engine:<22} {elapsed:8.1f} µs/email  x{loop_time / elapsed:4.1f}  {status}")
+        # What is_transaction_email pays: cache lookup by keyword fingerprint included
+        elapsed, results = timed(lambda s, subj, c: classifier_for(config).classify(s, subj, c), emails)
+        status = "same results" if results == expected else "DIFFERENT RESULTS"
+        print(f"   {'classifier_for':<22} {elapsed:8.1f} µs/email  x{loop_time / elapsed:4.1f}  {status}")
+
+
+if __name__ == "__main__":
+    main()
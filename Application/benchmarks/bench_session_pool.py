@@ -0,0 +1,55 @@
+"""Time ``fetch_emails`` with 1..N pooled IMAP sessions against ``fake_imap``.
+
+Usage: python benchmarks/bench_session_pool.py [messages] [latency_seconds]
+"""
+
+import os
+import sys
+import time
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from extracteur import fetch_emails
+from fake_imap import FakeIMAPServer
+from Realtransactions import load_config
+
+
+def build_mailbox(count):
+    senders = [bank["sender"] for bank in load_config()["banks"].values()]
+    return [
+        (
+            f"From: {senders[i % len(senders)]}\r\nSubject: Transaction Alert\r\n"
+            f"Date: Mon, 10 Feb 2025 10:00:00 -0500\r\n"
+            f"Content-Type: text/html; charset=utf-8\r\n\r\n"
+            f"<p>purchase of ${i % 90 + 10}.00 at STORE {i}</p>"
+        ).encode()
+        for i in range(count)
+    ]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.02
+
+    os.environ.setdefault("EMAIL_USER", "bench@example.com")
+    os.environ.setdefault("EMAIL_PASS", "bench")
+
+    with FakeIMAPServer(build_mailbox(count), latency=latency) as server:
+        os.environ.update(server.env())
+        print(f"📬 {count} messages, {latency * 1000:.0f} ms per command")
+        baseline = None
+        for workers in (1, 2, 4, 8):
+            stats = {}
+            started = time.perf_counter()
+            emails = fetch_emails("01-Jan-2025", "01-Mar-2025", chunk_size=50, stats=stats, workers=workers)
+            elapsed = time.perf_counter() - started
+            baseline = baseline or elapsed
+            print(
+                f"   workers={workers}: {elapsed:6.2f}s  {len(emails)} emails  "
+                f"{stats['fetch_round_trips']} FETCH  x{baseline / elapsed:.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Extraction throughput over a synthetic corpus, saved as a JSON report.
+
+Usage: python benchmarks/bench_suite.py [--sizes 1000 10000 100000]
+       [--pipeline-sizes 1000] [--workers N] [--output report.json]
+       [--compare previous.json]
+
+Alerts are generated with ``bank_templates`` for every bank profile of
+``config.yml`` (CIBC French templates, the three Neo variants, MBNA,
+Capital One). Each stage is timed on its own, on the same emails:
+
+- ``html_to_text``: HTML body to text, with the default backend;
+- ``is_transaction_email``: keyword classification of sender, subject and text;
+- ``extract_transaction_data``: regex extraction from already parsed text
+  (without the duplicate lookup, which reads the database);
+- ``pipeline``: what ``main.py`` does, from a ``fake_imap`` server to a
+  temporary copy of the ``transactions.db`` schema.
+
+The report records the commit and timings per stage and size. With
+``--compare``, the ratio to a previous report is printed for each entry so
+regressions between commits stand out.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Ensure Application modules and the project root can be imported
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from bank_rules import load_config
+from bank_templates import alert_subject, bank_alert_html, iter_alerts, raw_alert
+from email_record import EmailRecord
+from html_text import get_backend, html_to_text
+from Realtransactions import is_transaction_email
+from traitement import extract_transaction_data
+
+DATABASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "Database"))
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(__file__), "report.json")
+# ✅ Emails generated at once, so 100k emails never sit in memory together
+BATCH_SIZE = 1000
+DATE = "Mon, 10 Feb 2025 10:00:00 -0500"
+
+
+def batches(config, count):
+    """Yield lists of ``(bank, html, record)`` covering ``count`` alerts."""
+    batch = []
+    for bank, variant, amount, merchant in iter_alerts(config["banks"], count):
+        html = bank_alert_html(bank, amount, merchant, variant)
+        record = EmailRecord(
+            bank_config=bank,
+            sender=config["banks"][bank]["sender"],
+            subject=alert_subject(bank, merchant, variant),
+            email_datetime=DATE,
+            full_email_html=html,
+        )
+        batch.append((bank, html, record))
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def result(count, elapsed, **extra):
+    return dict(
+        emails=count,
+        seconds=round(elapsed, 4),
+        emails_per_second=round(count / elapsed, 1) if elapsed else None,
+        us_per_email=round(elapsed * 1e6 / count, 2),
+        **extra,
+    )
+
+
+def bench_stages(config, count):
+    """Time the three in-process stages on ``count`` emails."""
+    elapsed = {"html_to_text": 0.0, "is_transaction_email": 0.0, "extract_transaction_data": 0.0}
+    classified = extracted = 0
+    for batch in batches(config, count):
+        started = time.perf_counter()
+        texts = [html_to_text(html) for _, html, _ in batch]
+        elapsed["html_to_text"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        verdicts = [
+            is_transaction_email(record["sender"], record["subject"], text, config)
+            for (_, _, record), text in zip(batch, texts)
+        ]
+        elapsed["is_transaction_email"] += time.perf_counter() - started
+        classified += sum(1 for verdict in verdicts if verdict[0])
+
+        for (_, _, record), text in zip(batch, texts):
+            record["email_text"] = text
+        started = time.perf_counter()
+        results = [extract_transaction_data(record, check_duplicate=False) for _, _, record in batch]
+        elapsed["extract_transaction_data"] += time.perf_counter() - started
+        extracted += sum(1 for data in results if data["amount"] and data["description"])
+
+    return {
+        "html_to_text": result(count, elapsed["html_to_text"]),
+        "is_transaction_email": result(count, elapsed["is_transaction_email"], claimed=classified),
+        "extract_transaction_data": result(count, elapsed["extract_transaction_data"], extracted=extracted),
+    }
+
+
+def copy_schema(db_path):
+    """Create the tables (and keyword rules) of ``transactions.db`` in ``db_path``."""
+    source = os.path.join(DATABASE_DIR, "transactions.db")
+    target = sqlite3.connect(db_path)
+    try:
+        if os.path.exists(source):
+            original = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+            try:
+                for (sql,) in original.execute(
+                    "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'"
+                ):
+                    target.execute(sql)
+                if original.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'keyword_rules'"
+                ).fetchone():
+                    target.executemany(
+                        "INSERT INTO keyword_rules (keyword, category, tags) VALUES (?, ?, ?)",
+                        original.execute("SELECT keyword, category, tags FROM keyword_rules"),
+                    )
+            finally:
+                original.close()
+        target.commit()
+    finally:
+        target.close()
+
+
+def bench_pipeline(config, count, workers):
+    """Run the ``main.py`` loop against ``fake_imap`` and a scratch database."""
+    from Database.TransactionStore import TransactionStore
+    from extracteur import iter_emails
+    from extraction_pool import iter_extracted
+    from fake_imap import FakeIMAPServer
+    from message_cache import MessageCache
+
+    messages = [
+        raw_alert(config["banks"][bank]["sender"], bank, amount, merchant, variant, DATE)
+        for bank, variant, amount, merchant in iter_alerts(config["banks"], count)
+    ]
+    os.environ.setdefault("EMAIL_USER", "bench@example.com")
+    os.environ.setdefault("EMAIL_PASS", "bench")
+    with tempfile.TemporaryDirectory() as scratch, FakeIMAPServer(messages) as server:
+        os.environ.update(server.env())
+        db_path = os.path.join(scratch, "transactions.db")
+        copy_schema(db_path)
+        inserted = 0
+        started = time.perf_counter()
+        with MessageCache(os.path.join(scratch, "cache")) as cache, TransactionStore(db_path) as store:
+            emails = iter_emails("01-Jan-2025", "01-Mar-2025", workers=4, cache=cache, keyword_search=True)
+            for _, ordered_data in iter_extracted(emails, workers=workers, store=store):
+                if ordered_data.get("amount"):
+                    stored = store.insert(ordered_data)
+                    inserted += "transaction_id" in stored
+        elapsed = time.perf_counter() - started
+    return result(count, elapsed, inserted=inserted, workers=workers)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(__file__),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, previous):
+    print(f"🔁 Compared with {previous.get('commit') or 'previous report'} (>1 is faster now)")
+    for stage, sizes in report["benchmarks"].items():
+        for size, entry in sizes.items():
+            before = previous.get("benchmarks", {}).get(stage, {}).get(size)
+            if before and before.get("seconds") and entry["seconds"]:
+                speedup = before["seconds"] / entry["seconds"]
+                flag = "  ⚠️ slower" if speedup < 0.9 else ""
+                print(f"   {stage:<26} {size:>7}  x{speedup:5.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the extraction stages on synthetic bank alerts.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--pipeline-sizes", type=int, nargs="*", default=[1000])
+    parser.add_argument("--workers", type=int, default=1, help="extraction processes in the pipeline")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON report to write")
+    parser.add_argument("--compare", help="previous JSON report")
+    args = parser.parse_args()
+
+    # Per-email INFO logs would be timed along with the extraction
+    logging.getLogger().setLevel(logging.WARNING)
+    config = load_config()
+    report = {
+        "commit": git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "html_text_backend": get_backend().__name__,
+        "banks": sorted(config["banks"]),
+        "benchmarks": {},
+    }
+
+    for count in args.sizes:
+        print(f"✉️  {count} emails")
+        for stage, entry in bench_stages(config, count).items():
+            report["benchmarks"].setdefault(stage, {})[str(count)] = entry
+            print(f"   {stage:<26} {entry['us_per_email']:9.1f} µs/email  {entry['emails_per_second']:>10} emails/s")
+    for count in args.pipeline_sizes:
+        entry = bench_pipeline(config, count, args.workers)
+        report["benchmarks"].setdefault("pipeline", {})[str(count)] = entry
+        print(
+            f"📬 pipeline, {count} emails: {entry['seconds']:.2f}s, "
+            f"{entry['emails_per_second']} emails/s, {entry['inserted']} transactions"
+        )
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
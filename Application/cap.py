@@ -126,11 +126,10 @@ class CapitalOne6234DataReplacer:
             conn.close()
             return False
     
-    def insert_transaction(self, transaction):
-        """Insert a single transaction using the existing insert function"""
+    def insert_transaction(self, transaction, store):
+        """Insert a single transaction through the run's TransactionStore"""
         try:
-            from Database.Insert import insert_transaction
-            insert_transaction(transaction)
+            store.insert(transaction)
             return True
         except Exception as e:
             print(f"❌ Error inserting transaction: {e}")
@@ -140,29 +139,33 @@ class CapitalOne6234DataReplacer:
         """Insert all new transactions"""
         print(f"\n🔄 Inserting {len(self.purchase_transactions)} new transactions...")
         
-        for i, trans in enumerate(self.purchase_transactions, 1):
-            try:
-                transaction = {
-                    'amount': f"{trans['amount']:.2f}",
-                    'description': trans['description'],
-                    'card type': 'credit card',
-                    'date': trans['date'],
-                    'time': None,
-                    'bank': 'capital_one_credit',
-                    'full_email': '',
-                    'tags': ''  # Empty tags to avoid constraint issues
-                }
+        from Database.TransactionStore import TransactionStore
+
+        # One connection for every insert instead of one per transaction
+        with TransactionStore(self.db_path) as store:
+            for i, trans in enumerate(self.purchase_transactions, 1):
+                try:
+                    transaction = {
+                        'amount': f"{trans['amount']:.2f}",
+                        'description': trans['description'],
+                        'card type': 'credit card',
+                        'date': trans['date'],
+                        'time': None,
+                        'bank': 'capital_one_credit',
+                        'full_email': '',
+                        'tags': ''  # Empty tags to avoid constraint issues
+                    }
                 
-                if self.insert_transaction(transaction):
-                    self.inserted_count += 1
-                    print(f"✅ [{i}/{len(self.purchase_transactions)}] Inserted: ${transaction['amount']} - {transaction['description']} ({transaction['date']})")
-                else:
-                    self.error_count += 1
+                    if self.insert_transaction(transaction, store):
+                        self.inserted_count += 1
+                        print(f"✅ [{i}/{len(self.purchase_transactions)}] Inserted: ${transaction['amount']} - {transaction['description']} ({transaction['date']})")
+                    else:
+                        self.error_count += 1
                     
-            except Exception as e:
-                self.error_count += 1
-                print(f"❌ [{i}/{len(self.purchase_transactions)}] Error: {e}")
-                continue
+                except Exception as e:
+                    self.error_count += 1
+                    print(f"❌ [{i}/{len(self.purchase_transactions)}] Error: {e}")
+                    continue
     
     def get_date_range(self):
         """Get the date range of transactions"""
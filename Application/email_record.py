@@ -0,0 +1,31 @@
+"""Email records passed from the fetch layer to the extractors.
+
+``fetch_emails`` yields one dictionary per email and bank profile, holding
+the HTML body in ``full_email_html``. Routing an email between profiles,
+extracting its transaction and the API scripts all need the plain text of
+that HTML, so ``EmailRecord`` computes it once, on first use, and keeps it
+under the ``email_text`` key. Copies made with ``EmailRecord(record, ...)``
+and JSON round-trips (``extract_emails.py`` to ``process_queue.py``) carry
+the text along instead of parsing the HTML again.
+"""
+
+from html_text import html_to_text
+
+
+class EmailRecord(dict):
+    """``fetch_emails`` dictionary with a memoized plain-text view."""
+
+    @property
+    def text(self):
+        """Text of ``full_email_html``, parsed the first time it is needed."""
+        text = self.get("email_text")
+        if text is None:
+            text = self["email_text"] = html_to_text(self.get("full_email_html", ""))
+        return text
+
+
+def as_record(email_data):
+    """Return ``email_data`` as an ``EmailRecord``, without copying one."""
+    if isinstance(email_data, EmailRecord):
+        return email_data
+    return EmailRecord(email_data)
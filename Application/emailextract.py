@@ -1,21 +1,23 @@
-import imaplib
 import email
-import yaml
 import os
 from bs4 import BeautifulSoup
 from email.header import decode_header
 from datetime import datetime, date
 
+import bank_rules
+from imap_utils import load_credentials
+from message_sources import open_source
+
 # ✅ Configuration for date range extraction
 SENDER_EMAIL = "mailbox.noreply@cibc.com"
 START_DATE = "09-Feb-2025"  # Format: DD-Mon-YYYY
 END_DATE = "15-feb-2025"    # Format: DD-Mon-YYYY
+# ✅ mbox file, Maildir or .eml directory to read instead of the IMAP server
+MESSAGE_SOURCE = os.getenv("MESSAGE_SOURCE")
 
 def load_config():
     """Load the configuration file to get bank keywords."""
-    config_file = os.path.join(os.path.dirname(__file__), "config.yml")
-    with open(config_file, "r", encoding='utf-8') as f:
-        return yaml.safe_load(f)
+    return bank_rules.load_config()
 
 def extract_email_body(my_msg):
     """Extracts clean text from an email body (either plain text or HTML)."""
@@ -58,119 +60,97 @@ def is_transaction_email(sender, subject, config):
 
 def fetch_emails_by_date_range():
     """Fetches all emails from a sender within a specific date range and categorizes them."""
-    imap_url = 'imap.gmail.com'
-    my_mail = imaplib.IMAP4_SSL(imap_url)
-
-    # ✅ Get credentials
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    credentials_path = os.path.join(base_dir, "credentials.yml")
-
-    user = os.getenv("EMAIL_USER")
-    password = os.getenv("EMAIL_PASS")
-
-    if os.path.exists(credentials_path):
-        with open(credentials_path) as f:
-            my_credentials = yaml.safe_load(f)
-            user = user or my_credentials.get("user")
-            password = password or my_credentials.get("password")
-
-    if not user or not password:
-        raise ValueError("Email credentials not provided. Set EMAIL_USER and EMAIL_PASS environment variables or update credentials.yml")
+    # ✅ Get credentials (only needed when reading from the IMAP server)
+    user = password = None
+    if MESSAGE_SOURCE is None:
+        # EMAIL_USER/EMAIL_PASS take precedence over credentials.yml
+        user, password = load_credentials()
 
     # ✅ Load configuration for keyword matching
     config = load_config()
 
-    # ✅ Login & Select Inbox
-    my_mail.login(user, password)
-    my_mail.select('Inbox')
+    # ✅ Read the Inbox (IMAP_HOST/IMAP_PORT/IMAP_SSL select the server) or local files
+    if MESSAGE_SOURCE is None:
+        source = open_source(user=user, password=password)
+    else:
+        source = open_source(MESSAGE_SOURCE)
+        print(f"📂 Reading emails from {MESSAGE_SOURCE}")
 
     print(f"🔍 Searching for emails from {SENDER_EMAIL} between {START_DATE} and {END_DATE}")
     
-    # ✅ Build IMAP search query for date range and sender
-    search_criteria = f'(FROM "{SENDER_EMAIL}" SINCE "{START_DATE}" BEFORE "{END_DATE}")'
-    _, data = my_mail.search(None, search_criteria)
-    mail_id_list = data[0].split()
-
-    if not mail_id_list:
-        print(f"⚠️ No emails found from {SENDER_EMAIL} in the specified date range")
-        return [], []
-
-    print(f"📧 Found {len(mail_id_list)} emails in the date range")
-    
     transaction_emails = []
     non_transaction_emails = []
     
-    # ✅ Fetch all emails in the date range
-    for i, email_id in enumerate(mail_id_list):
-        try:
-            _, data = my_mail.fetch(email_id, '(RFC822)')
-            
-            for response_part in data:
-                if isinstance(response_part, tuple):
-                    my_msg = email.message_from_bytes(response_part[1])
-                    
-                    # Decode the subject with better error handling
-                    raw_subject = my_msg["Subject"]
-                    if raw_subject:
-                        try:
-                            decoded_subject, encoding = decode_header(raw_subject)[0]
-                            if isinstance(decoded_subject, bytes):
-                                # Handle case where encoding is None
-                                if encoding is None:
-                                    # Try common encodings
-                                    for enc in ['utf-8', 'iso-8859-1', 'windows-1252']:
-                                        try:
-                                            subject = decoded_subject.decode(enc)
-                                            break
-                                        except UnicodeDecodeError:
-                                            continue
-                                    else:
-                                        # If all fail, decode with errors='ignore'
-                                        subject = decoded_subject.decode('utf-8', errors='ignore')
+    # ✅ Fetch all emails in the date range (closing the source logs out of IMAP)
+    with source:
+        for _, email_id, raw_email in source.iter_messages([SENDER_EMAIL], START_DATE, END_DATE):
+            try:
+                my_msg = email.message_from_bytes(raw_email)
+                
+                # Decode the subject with better error handling
+                raw_subject = my_msg["Subject"]
+                if raw_subject:
+                    try:
+                        decoded_subject, encoding = decode_header(raw_subject)[0]
+                        if isinstance(decoded_subject, bytes):
+                            # Handle case where encoding is None
+                            if encoding is None:
+                                # Try common encodings
+                                for enc in ['utf-8', 'iso-8859-1', 'windows-1252']:
+                                    try:
+                                        subject = decoded_subject.decode(enc)
+                                        break
+                                    except UnicodeDecodeError:
+                                        continue
                                 else:
-                                    subject = decoded_subject.decode(encoding)
+                                    # If all fail, decode with errors='ignore'
+                                    subject = decoded_subject.decode('utf-8', errors='ignore')
                             else:
-                                subject = decoded_subject
-                        except Exception as e:
-                            print(f"⚠️ Subject decoding error for email {email_id}: {e}")
-                            subject = raw_subject  # Use raw subject as fallback
-                    else:
-                        subject = "No Subject"
+                                subject = decoded_subject.decode(encoding)
+                        else:
+                            subject = decoded_subject
+                    except Exception as e:
+                        print(f"⚠️ Subject decoding error for email {email_id}: {e}")
+                        subject = raw_subject  # Use raw subject as fallback
+                else:
+                    subject = "No Subject"
                     
-                    # Extract email content and metadata
-                    email_text = extract_email_body(my_msg)
-                    email_datetime = my_msg["Date"]
+                # Extract email content and metadata
+                email_text = extract_email_body(my_msg)
+                email_datetime = my_msg["Date"]
                     
-                    # Check if this is a transaction email
-                    is_transaction, bank_name, matched_keyword = is_transaction_email(SENDER_EMAIL, subject, config)
+                # Check if this is a transaction email
+                is_transaction, bank_name, matched_keyword = is_transaction_email(SENDER_EMAIL, subject, config)
                     
-                    # Store email data
-                    email_data = {
-                        'content': email_text,
-                        'datetime': email_datetime,
-                        'subject': subject,
-                        'sender': SENDER_EMAIL,
-                        'email_id': email_id.decode() if isinstance(email_id, bytes) else email_id,
-                        'is_transaction': is_transaction,
-                        'bank_name': bank_name,
-                        'matched_keyword': matched_keyword
-                    }
+                # Store email data
+                email_data = {
+                    'content': email_text,
+                    'datetime': email_datetime,
+                    'subject': subject,
+                    'sender': SENDER_EMAIL,
+                    'email_id': email_id.decode() if isinstance(email_id, bytes) else str(email_id),
+                    'is_transaction': is_transaction,
+                    'bank_name': bank_name,
+                    'matched_keyword': matched_keyword
+                }
                     
-                    # Categorize the email
-                    if is_transaction:
-                        transaction_emails.append(email_data)
-                        print(f"✅ TRANSACTION {len(transaction_emails)}: {subject[:60]}... (Keyword: '{matched_keyword}')")
-                    else:
-                        non_transaction_emails.append(email_data)
-                        print(f"📋 NON-TRANSACTION {len(non_transaction_emails)}: {subject[:60]}...")
+                # Categorize the email
+                if is_transaction:
+                    transaction_emails.append(email_data)
+                    print(f"✅ TRANSACTION {len(transaction_emails)}: {subject[:60]}... (Keyword: '{matched_keyword}')")
+                else:
+                    non_transaction_emails.append(email_data)
+                    print(f"📋 NON-TRANSACTION {len(non_transaction_emails)}: {subject[:60]}...")
                     
-        except Exception as e:
-            print(f"❌ Error extracting email {email_id}: {e}")
-            continue
-    
-    # ✅ Close connection
-    my_mail.close()
-    my_mail.logout()
+            except Exception as e:
+                print(f"❌ Error extracting email {email_id}: {e}")
+                continue
+
+    if not transaction_emails and not non_transaction_emails:
+        print(f"⚠️ No emails found from {SENDER_EMAIL} in the specified date range")
+        return [], []
+
+    print(f"📧 Found {len(transaction_emails) + len(non_transaction_emails)} emails in the date range")
     
     return transaction_emails, non_transaction_emails
 
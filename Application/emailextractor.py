@@ -1,6 +1,4 @@
-import imaplib
 import email
-import yaml
 import os
 from bs4 import BeautifulSoup
 from email.header import decode_header
@@ -8,15 +6,22 @@ from datetime import datetime
 import re
 import json
 
+import bank_rules
+from imap_utils import load_credentials
+from keyword_classifier import classifier_for
+from message_sources import open_source
+from sender_plan import group_banks_by_sender
+
 # ✅ Configuration for date range extraction
 START_DATE = "09-Feb-2025"  # Format: DD-Mon-YYYY
 END_DATE = "31-Dec-2025"    # Format: DD-Mon-YYYY
+# ✅ mbox file, Maildir or .eml directory to read instead of the IMAP server
+MESSAGE_SOURCE = os.getenv("MESSAGE_SOURCE")
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TestEmails")
 
 def load_config():
     """Load the configuration file to get all bank configurations."""
-    config_file = os.path.join(os.path.dirname(__file__), "config.yml")
-    with open(config_file, "r", encoding='utf-8') as f:
-        return yaml.safe_load(f)
+    return bank_rules.load_config()
 
 def sanitize_filename(filename):
     """Sanitize filename to be safe for all operating systems."""
@@ -114,20 +119,7 @@ def is_transaction_email(sender, subject, content, config):
     function to immediately return ``False`` when found in the subject or body.
     """
     try:
-        for bank_name, bank_config in config["banks"].items():
-            if bank_config["sender"].lower() == sender.lower():
-                for ex_kw in bank_config.get("exclude_keywords", []):
-                    if ex_kw.lower() in subject.lower() or ex_kw.lower() in content.lower():
-                        return False, None, None
-
-                keywords = bank_config["keywords"]
-                for keyword in keywords:
-                    if (keyword.lower() in subject.lower() or
-                        keyword.lower() in content.lower()):
-                        return True, bank_name, keyword
-                return False, None, None
-
-        return False, None, None
+        return classifier_for(config).classify(sender, subject, content)
     except Exception:
         return False, None, None
 
@@ -578,45 +570,40 @@ def create_transaction_index(output_dir, transaction_emails, config):
         print(f"❌ Error creating transaction index: {e}")
         return None
 
-def process_single_email(mail, email_id, sender, bank_name, config):
+def process_single_email(raw_email, email_id, sender, bank_name, config):
     """Process a single email and check if it's a transaction."""
     try:
-        # Fetch the email
-        _, msg_data = mail.fetch(email_id, '(RFC822)')
+        # Parse the email message
+        msg = email.message_from_bytes(raw_email)
+        
+        # Extract basic info safely
+        subject = decode_email_subject(msg)
+        datetime_str = msg.get("Date", "Unknown Date")
+        email_text, email_html = extract_email_content(msg)
+        
+        # Check if this is a transaction email
+        is_transaction, matched_bank, matched_keyword = is_transaction_email(
+            sender, subject, email_text, config
+        )
+        
+        # Only return data if it's a transaction
+        if is_transaction:
+            email_info = {
+                'content': email_text,
+                'html_content': email_html,
+                'datetime': datetime_str,
+                'subject': subject,
+                'sender': sender,
+                'email_id': str(email_id),
+                'is_transaction': True,
+                'bank_name': bank_name,
+                'matched_keyword': matched_keyword
+            }
+            return email_info
+        
+        # Return None for non-transaction emails (they'll be ignored)
+        return None
         
-        for response_part in msg_data:
-            if isinstance(response_part, tuple):
-                # Parse the email message
-                msg = email.message_from_bytes(response_part[1])
-                
-                # Extract basic info safely
-                subject = decode_email_subject(msg)
-                datetime_str = msg.get("Date", "Unknown Date")
-                email_text, email_html = extract_email_content(msg)
-                
-                # Check if this is a transaction email
-                is_transaction, matched_bank, matched_keyword = is_transaction_email(
-                    sender, subject, email_text, config
-                )
-                
-                # Only return data if it's a transaction
-                if is_transaction:
-                    email_info = {
-                        'content': email_text,
-                        'html_content': email_html,
-                        'datetime': datetime_str,
-                        'subject': subject,
-                        'sender': sender,
-                        'email_id': str(email_id),
-                        'is_transaction': True,
-                        'bank_name': bank_name,
-                        'matched_keyword': matched_keyword
-                    }
-                    return email_info
-                
-                # Return None for non-transaction emails (they'll be ignored)
-                return None
-                
     except Exception as e:
         print(f"   ❌ Error processing email {email_id}: {e}")
         return None
@@ -624,35 +611,27 @@ def process_single_email(mail, email_id, sender, bank_name, config):
 def fetch_transaction_emails_only():
     """Fetch ONLY transaction emails from ALL banks configured in the YAML file."""
     try:
-        # Get credentials
-        base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-        credentials_path = os.path.join(base_dir, "credentials.yml")
-
-        if not os.path.exists(credentials_path):
-            raise ValueError(f"credentials.yml not found at {credentials_path}")
-
-        with open(credentials_path, 'r', encoding='utf-8') as f:
-            my_credentials = yaml.safe_load(f)
-            user = my_credentials.get("user")
-            password = my_credentials.get("password")
-
-        if not user or not password:
-            raise ValueError("Email credentials not found in credentials.yml")
+        # Get credentials (only needed when reading from the IMAP server)
+        user = password = None
+        if MESSAGE_SOURCE is None:
+            # EMAIL_USER/EMAIL_PASS take precedence over credentials.yml
+            user, password = load_credentials()
 
         # Load configuration
         config = load_config()
 
         # Create output directory
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        output_dir = os.path.join(script_dir, "..", "TestEmails")
+        output_dir = OUTPUT_DIR
         os.makedirs(output_dir, exist_ok=True)
         
         print(f"📁 Output directory: {os.path.abspath(output_dir)}")
 
-        # Connect to email
-        mail = imaplib.IMAP4_SSL('imap.gmail.com')
-        mail.login(user, password)
-        mail.select('Inbox')
+        # Read the Inbox (IMAP_HOST/IMAP_PORT/IMAP_SSL select the server) or local files
+        if MESSAGE_SOURCE is None:
+            source = open_source(user=user, password=password)
+        else:
+            source = open_source(MESSAGE_SOURCE)
+            print(f"📂 Lecture des courriels de {MESSAGE_SOURCE}")
 
         print(f"🔍 Recherche de courriels de TRANSACTION uniquement dans {len(config['banks'])} banques:")
         for bank_name, bank_config in config['banks'].items():
@@ -662,49 +641,36 @@ def fetch_transaction_emails_only():
 
         transaction_emails = []
         global_index = 1
+        sender_groups = group_banks_by_sender(config)
+        message_counts = {}
         
-        # Process each bank
-        for bank_name, bank_config in config['banks'].items():
-            sender = bank_config['sender']
-            
-            print(f"🏦 Traitement {bank_name} ({sender})...")
-            
-            # Search for emails from this sender
-            search_criteria = f'(FROM "{sender}" SINCE "{START_DATE}" BEFORE "{END_DATE}")'
-            _, data = mail.search(None, search_criteria)
-            mail_id_list = data[0].split()
-            
-            if not mail_id_list:
-                print(f"   ⚠️ Aucun courriel trouvé de {sender}")
-                continue
+        # Closing the source also closes the IMAP connection, even on errors
+        with source:
+            messages = source.iter_messages(sender_groups, START_DATE, END_DATE)
+            for sender, email_id, raw_email in messages:
+                if sender not in message_counts:
+                    print(f"🏦 Traitement {', '.join(sender_groups[sender])} ({sender})...")
+                message_counts[sender] = message_counts.get(sender, 0) + 1
                 
-            print(f"   📧 {len(mail_id_list)} courriels trouvés, vérification des transactions...")
-            
-            bank_transactions = 0
-            
-            # Process each email from this bank
-            for email_id in mail_id_list:
-                email_info = process_single_email(mail, email_id, sender, bank_name, config)
-                
-                if email_info:  # Only process if it's a transaction
-                    # Create HTML file
-                    filename = create_html_file(email_info, output_dir, global_index)
-                    email_info['filename'] = filename
-                    
-                    transaction_emails.append(email_info)
-                    bank_transactions += 1
+                # Check the email against each bank using this sender
+                for bank_name in sender_groups[sender]:
+                    email_info = process_single_email(raw_email, email_id, sender, bank_name, config)
                     
-                    print(f"   ✅ TRANSACTION {bank_transactions}: {email_info['subject'][:50]}... → {filename}")
-                    print(f"      Mot-clé: '{email_info['matched_keyword']}'")
-                    
-                    global_index += 1
-            
-            print(f"   💳 {bank_transactions} courriels de transaction trouvés pour {bank_name}")
-            print()
+                    if email_info:  # Only process if it's a transaction
+                        # Create HTML file
+                        filename = create_html_file(email_info, output_dir, global_index)
+                        email_info['filename'] = filename
+                        
+                        transaction_emails.append(email_info)
+                        
+                        print(f"   ✅ TRANSACTION {len(transaction_emails)}: {email_info['subject'][:50]}... → {filename}")
+                        print(f"      Mot-clé: '{email_info['matched_keyword']}'")
+                        
+                        global_index += 1
         
-        # Close connection
-        mail.close()
-        mail.logout()
+        for sender in sender_groups:
+            if sender not in message_counts:
+                print(f"   ⚠️ Aucun courriel trouvé de {sender}")
         
         # Create transaction-only index
         if transaction_emails:
@@ -1,21 +1,53 @@
 """Email extraction utilities for transaction parsing.
 
-This module provides two helper functions:
+This module provides three helper functions:
 
-``fetch_emails`` retrieves raw HTML messages from all banks defined in
-``config.yml`` within a date range and returns their metadata.  The
+``iter_emails`` retrieves raw HTML messages from all banks defined in
+``config.yml`` within a date range and yields them with their metadata, one
+at a time.  Messages are downloaded in batches of UIDs to keep network
+round-trips low.  ``fetch_emails`` returns the same emails as a list.  The
 legacy ``fetch_email_text`` remains available and simply returns the
 plain-text body of the first email found using ``fetch_emails``.
+
+Emails are yielded as ``email_record.EmailRecord`` dictionaries, whose
+``text`` is parsed from the HTML at most once and shared by every consumer.
+
+Downloaded messages can be written through a ``MessageCache`` and later
+replayed with ``offline=True`` without contacting the server.
 """
 
-import imaplib
 import email
-import yaml
+import imaplib
 import os
-from bs4 import BeautifulSoup
+import sys
+import logging
 from email.header import decode_header
 from datetime import datetime
 
+# Add the root folder to Python's module search path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from Database.Backfill import BackfillCheckpoint
+from Database.SyncState import get_sync_state, update_sync_state
+from bank_rules import load_config
+from email_record import EmailRecord, as_record
+from html_text import html_to_text
+from imap_utils import (
+    FETCH_CHUNK_SIZE,
+    IMAPSessionPool,
+    fetch_groups_parallel,
+    get_uidvalidity,
+    load_credentials,
+    open_session,
+    search_all_parallel,
+)
+from message_cache import MessageCache
+from message_sources import CacheSource, MessageSource
+from partial_fetch import fetch_text_parts_parallel
+from sender_plan import claiming_banks, downloads_saved, group_banks_by_sender, sender_search_terms
+
+logger = logging.getLogger(__name__)
+
 # ✅ Définissez ici l'expéditeur et la position de l'e-mail à extraire
 SENDER_EMAIL = "info@neofinancial.com"  # Modifiez cette valeur selon l'expéditeur souhaité
 EMAIL_POSITION = -3  # -1 pour le dernier email, -2 pour l'avant-dernier, etc.
@@ -35,124 +67,423 @@ def extract_email_body(my_msg):
             body = part.get_payload(decode=True).decode("utf-8", errors="ignore")
         elif content_type == "text/html" and not body:
             html_content = part.get_payload(decode=True).decode("utf-8", errors="ignore")
-            body = BeautifulSoup(html_content, "html.parser").get_text(separator="\n")
+            body = html_to_text(html_content)
 
     return body if body else "No body content found"
 
-def fetch_emails(start_date: str, end_date: str):
-    """Retrieve HTML emails from all configured banks within a date range.
-
-    Parameters
-    ----------
-    start_date : str
-        The earliest date to search, formatted as ``DD-Mon-YYYY``.
-    end_date : str
-        The latest date to include, formatted as ``DD-Mon-YYYY``.
+def _decode_subject(msg):
+    raw_subject = msg.get("Subject", "")
+    decoded_subject, encoding = decode_header(raw_subject)[0]
+    if isinstance(decoded_subject, bytes):
+        return decoded_subject.decode(encoding or "utf-8", errors="ignore")
+    return decoded_subject
 
-    Returns
-    -------
-    list[dict]
-        A list containing one dictionary per email with HTML content and
-        metadata. Each dictionary has the keys ``full_email_html``,
-        ``email_datetime``, ``subject``, ``sender`` and ``bank_config``.
-    """
 
-    imap_url = "imap.gmail.com"
-    mail = imaplib.IMAP4_SSL(imap_url)
+def parse_email_message(raw_email: bytes, sender: str, bank_name: str):
+    """Build the per-email ``EmailRecord`` returned by ``fetch_emails``.
 
-    # Load credentials
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    credentials_path = os.path.join(base_dir, "credentials.yml")
+    The HTML part is preferred; when the message only has a plain-text body
+    it is wrapped in ``<pre>`` so downstream HTML parsing still works.
+    """
+    msg = email.message_from_bytes(raw_email)
+    subject = _decode_subject(msg)
+
+    html_content = None
+    for part in msg.walk():
+        ctype = part.get_content_type()
+        if ctype == "text/html":
+            payload = part.get_payload(decode=True)
+            if payload:
+                html_content = payload.decode("utf-8", errors="ignore")
+            break
+
+    if html_content is None:
+        # fall back to plain text
+        for part in msg.walk():
+            if part.get_content_type() == "text/plain":
+                payload = part.get_payload(decode=True)
+                if payload:
+                    html_content = (
+                        "<pre>"
+                        + payload.decode("utf-8", errors="ignore")
+                        + "</pre>"
+                    )
+                break
 
-    user = os.getenv("EMAIL_USER")
-    password = os.getenv("EMAIL_PASS")
+    return EmailRecord(
+        full_email_html=html_content or "",
+        email_datetime=msg.get("Date"),
+        subject=subject,
+        sender=sender,
+        bank_config=bank_name,
+    )
 
-    if os.path.exists(credentials_path):
-        with open(credentials_path, "r", encoding="utf-8") as f:
-            creds = yaml.safe_load(f)
-            user = user or creds.get("user")
-            password = password or creds.get("password")
 
-    if not user or not password:
-        raise ValueError(
-            "Email credentials not provided. Set EMAIL_USER and EMAIL_PASS "
-            "environment variables or update credentials.yml"
-        )
+def build_partial_record(header: bytes, body: bytes, subtype, sender: str, bank_name: str):
+    """Build the ``fetch_emails`` dictionary from a partially fetched email.
 
-    # Login and select inbox
-    mail.login(user, password)
-    mail.select("Inbox")
+    ``header`` holds the raw Subject/Date headers and ``body`` the decoded
+    text part chosen from the BODYSTRUCTURE, as returned by
+    ``partial_fetch.fetch_text_parts_parallel``.
+    """
+    msg = email.message_from_bytes(header)
+    html_content = None
+    if body:
+        text = body.decode("utf-8", errors="ignore")
+        html_content = text if subtype == "html" else "<pre>" + text + "</pre>"
+
+    return EmailRecord(
+        full_email_html=html_content or "",
+        email_datetime=msg.get("Date"),
+        subject=_decode_subject(msg),
+        sender=sender,
+        bank_config=bank_name,
+    )
+
+
+def route_email(record, bank_names, config, require_claim=False):
+    """Return the bank profiles a fetched email should be attributed to.
+
+    A sender used by a single profile always maps to it. When several
+    profiles share the sender, the email goes to every profile whose
+    keywords it matches, or to all of them if none can tell it apart.
+    With ``require_claim``, only the profiles whose keywords match are
+    returned, possibly none.
+    """
+    if len(bank_names) == 1 and not require_claim:
+        return bank_names
+
+    claims = claiming_banks(bank_names, record["subject"], as_record(record).text, config)
+    if require_claim:
+        return [bank_name for bank_name, _ in claims]
+    return [bank_name for bank_name, _ in claims] or bank_names
+
+
+def _write_through(cache, fetched):
+    """Store every ``(sender, uid, raw_email)`` in ``cache`` as it goes by."""
+    for sender, uid, raw_email in fetched:
+        cache.put(raw_email, sender)
+        yield sender, uid, raw_email
+
+
+def iter_emails_from_source(
+    start_date: str,
+    end_date: str,
+    source: MessageSource,
+    config: dict,
+    stats: dict,
+    require_claim: bool = False,
+):
+    """Yield the ``iter_emails`` records built from the messages of ``source``."""
+    sender_groups = group_banks_by_sender(config)
+    matched = 0
+    for sender, _, raw_email in source.iter_messages(sender_groups, start_date, end_date, stats):
+        bank_names = sender_groups[sender]
+        record = parse_email_message(raw_email, sender, bank_names[0])
+        matched += 1
+        for bank_name in route_email(record, bank_names, config, require_claim):
+            yield EmailRecord(record, bank_config=bank_name)
+    stats["messages_matched"] = stats.get("messages_matched", 0) + matched
+    logger.info(
+        "Read %d emails from %s, %d from configured senders",
+        stats.get("messages_read", matched),
+        type(source).__name__,
+        matched,
+    )
+
+
+def iter_emails(
+    start_date: str,
+    end_date: str,
+    chunk_size: int = FETCH_CHUNK_SIZE,
+    stats: dict | None = None,
+    incremental: bool = False,
+    db_path: str | None = None,
+    workers: int = 1,
+    partial: bool = False,
+    max_body_bytes: int | None = None,
+    cache: MessageCache | None = None,
+    offline: bool = False,
+    source: MessageSource | None = None,
+    checkpoint: BackfillCheckpoint | None = None,
+    keyword_search: bool = False,
+):
+    """Yield HTML emails from all configured banks within a date range.
+
+    Messages are located with ``UID SEARCH`` and downloaded with one
+    ``UID FETCH`` per ``chunk_size`` UIDs rather than one request per email.
+    Each distinct sender is searched once and every message is downloaded
+    once, then attributed to the bank profiles selected by ``route_email``.
+    Emails are parsed and yielded one at a time as their chunk arrives, and
+    only a few chunks are downloaded ahead of the consumer, so memory use
+    does not grow with the size of the mailbox. ``stats`` and the sync
+    state are complete once the generator is exhausted.
 
-    # Load bank configuration
-    config_file = os.path.join(os.path.dirname(__file__), "config.yml")
-    with open(config_file, "r", encoding="utf-8") as f:
-        config = yaml.safe_load(f)
+    Parameters
+    ----------
+    start_date : str
+        The earliest date to search, formatted as ``DD-Mon-YYYY``.
+    end_date : str
+        The latest date to include, formatted as ``DD-Mon-YYYY``.
+    chunk_size : int, optional
+        Maximum number of UIDs requested per FETCH command.
+    stats : dict, optional
+        If given, updated in place with the number of SEARCH and FETCH
+        round-trips, the number of messages fetched and the searches and
+        downloads saved by grouping banks that share a sender.
+    incremental : bool, optional
+        Only request messages above the UID high-water mark stored in the
+        ``imap_sync_state`` table for each sender, then advance the mark.
+        Senders never synced before, or whose mailbox UIDVALIDITY changed,
+        are fully resynced using the date range.
+    db_path : str, optional
+        SQLite database holding ``imap_sync_state``. Defaults to
+        ``Database/transactions.db``.
+    workers : int, optional
+        Number of pooled IMAP sessions fetching UID chunks concurrently.
+        Results are merged back in sender and UID order, so the output does
+        not depend on this value.
+    partial : bool, optional
+        Fetch each message's BODYSTRUCTURE first and download only the
+        text part used for extraction instead of the full RFC822 message.
+    max_body_bytes : int, optional
+        In ``partial`` mode, download at most this many bytes of the text
+        part (``BODY.PEEK[n]<0.N>``).
+    cache : MessageCache, optional
+        Every fully downloaded message is written to this cache. Partial
+        fetches are not cached since they never see the whole message.
+    offline : bool, optional
+        Do not connect to the server at all: replay the messages stored in
+        ``cache`` (the default cache when ``None``) that fall within the
+        date range, using their Date header. ``incremental`` is ignored.
+    source : MessageSource, optional
+        Read the messages from this source (an mbox, a Maildir, a directory
+        of ``.eml`` files...) instead of the IMAP server. Messages are
+        matched to senders by their From header and to the date range by
+        their Date header; ``incremental``, ``partial`` and ``cache`` do not
+        apply.
+    checkpoint : BackfillCheckpoint, optional
+        Record every message once the consumer has processed it, so that an
+        interrupted run over the same date range resumes after the last
+        processed UID of each sender instead of starting over. Not used with
+        ``offline`` or ``source``.
+    keyword_search : bool, optional
+        Only return emails claimed by a bank's ``keywords`` (and not ruled
+        out by its ``exclude_keywords``). The SEARCH sent to the server
+        includes those keywords so unclaimed emails are never downloaded;
+        if the server rejects that query, the sender's emails are all
+        downloaded and filtered locally instead. ``stats["keyword_search"]``
+        maps each sender to ``(messages kept, messages matching FROM)``.
+
+    Yields
+    ------
+    dict
+        One dictionary per email and bank profile with HTML content and
+        metadata, with the keys ``full_email_html``, ``email_datetime``,
+        ``subject``, ``sender`` and ``bank_config``.
+    """
 
-    fetched_emails = []
+    if stats is None:
+        stats = {}
 
-    for bank_name, bank_cfg in config.get("banks", {}).items():
-        sender = bank_cfg.get("sender")
-        if not sender:
-            continue
+    config = load_config()
 
-        search = f'(FROM "{sender}" SINCE "{start_date}" BEFORE "{end_date}")'
-        _, data = mail.search(None, search)
-        mail_ids = data[0].split()
-
-        for email_id in mail_ids:
-            _, msg_data = mail.fetch(email_id, "(RFC822)")
-            for resp in msg_data:
-                if not isinstance(resp, tuple):
-                    continue
-                msg = email.message_from_bytes(resp[1])
-
-                raw_subject = msg.get("Subject", "")
-                decoded_subject, encoding = decode_header(raw_subject)[0]
-                if isinstance(decoded_subject, bytes):
-                    subject = decoded_subject.decode(
-                        encoding or "utf-8", errors="ignore"
-                    )
+    if source is not None:
+        yield from iter_emails_from_source(start_date, end_date, source, config, stats, keyword_search)
+        return
+    if offline:
+        if cache is None:
+            with MessageCache() as cache:
+                yield from iter_emails_from_source(
+                    start_date, end_date, CacheSource(cache), config, stats, keyword_search
+                )
+        else:
+            yield from iter_emails_from_source(
+                start_date, end_date, CacheSource(cache), config, stats, keyword_search
+            )
+        return
+
+    user, password = load_credentials()
+    mailbox = "Inbox"
+    pool = IMAPSessionPool(lambda: open_session(user, password, mailbox), size=workers)
+
+    # Search and download once per distinct sender; banks sharing a sender
+    # all see the same messages and the same high-water mark
+    sender_groups = group_banks_by_sender(config)
+
+    sync_from = {}
+    high_water = {}
+    uidvalidity = None
+    message_counts = {}
+
+    resume_from = {}
+
+    with pool:
+        if incremental or checkpoint is not None:
+            with pool.session() as mail:
+                uidvalidity = get_uidvalidity(mail, mailbox)
+
+        if checkpoint is not None:
+            checkpoint.begin(user, mailbox, start_date, end_date)
+            for sender in sender_groups:
+                resume_from[sender] = checkpoint.resume_uid(sender, uidvalidity)
+            if checkpoint.resumed:
+                logger.info("Resuming backfill run %d from its last checkpoint", checkpoint.run_id)
+
+        if incremental:
+            for sender in sender_groups:
+                state = get_sync_state(user, mailbox, sender, db_path)
+                if state and state[0] == uidvalidity:
+                    sync_from[sender] = state[1] + 1
                 else:
-                    subject = decoded_subject
-
-                html_content = None
-                for part in msg.walk():
-                    ctype = part.get_content_type()
-                    if ctype == "text/html":
-                        payload = part.get_payload(decode=True)
-                        if payload:
-                            html_content = payload.decode(
-                                "utf-8", errors="ignore"
-                            )
-                        break
-
-                if html_content is None:
-                    # fall back to plain text
-                    for part in msg.walk():
-                        if part.get_content_type() == "text/plain":
-                            payload = part.get_payload(decode=True)
-                            if payload:
-                                html_content = (
-                                    "<pre>"
-                                    + payload.decode("utf-8", errors="ignore")
-                                    + "</pre>"
-                                )
-                            break
-
-                fetched_emails.append(
-                    {
-                        "full_email_html": html_content or "",
-                        "email_datetime": msg.get("Date"),
-                        "subject": subject,
-                        "sender": sender,
-                        "bank_config": bank_name,
-                    }
+                    if state:
+                        logger.warning(
+                            "UIDVALIDITY changed for %s, running a full resync", sender
+                        )
+                    sync_from[sender] = None
+                high_water[sender] = sync_from[sender] - 1 if sync_from[sender] else 0
+
+        base_criteria = []
+        for sender in sender_groups:
+            first_uid = sync_from.get(sender)
+            resume_uid = resume_from.get(sender)
+            if first_uid:
+                base_criteria.append(f'UID {first_uid}:* FROM "{sender}"')
+            elif resume_uid:
+                base_criteria.append(
+                    f'UID {resume_uid}:* FROM "{sender}" SINCE "{start_date}" BEFORE "{end_date}"'
+                )
+            else:
+                base_criteria.append(f'FROM "{sender}" SINCE "{start_date}" BEFORE "{end_date}"')
+        searches = [f"({criteria})" for criteria in base_criteria]
+
+        # Senders whose banks' keywords can be expressed as SEARCH keys are
+        # searched a second time with them, to know what the narrowing saves
+        narrowed_senders = []
+        if keyword_search:
+            for sender, criteria in zip(sender_groups, base_criteria):
+                terms = sender_search_terms(sender_groups[sender], config)
+                if terms:
+                    narrowed_senders.append(sender)
+                    searches.append(f"({criteria} {terms})")
+
+        # Every sender is searched, then every UID chunk fetched, concurrently
+        results = search_all_parallel(pool, searches, stats, allow_rejected=keyword_search)
+        narrowed = dict(zip(narrowed_senders, results[len(sender_groups):]))
+        if keyword_search:
+            stats.setdefault("keyword_search", {})
+
+        uid_groups = []
+        for sender, mail_uids in zip(sender_groups, results):
+            if mail_uids is None:
+                raise imaplib.IMAP4.error(f"UID SEARCH rejected for {sender}")
+            first_uid = max(sync_from.get(sender) or 0, resume_from.get(sender) or 0)
+            if first_uid:
+                # "n:*" always matches the newest message, even below n
+                mail_uids = [uid for uid in mail_uids if int(uid) >= first_uid]
+            if keyword_search:
+                total = len(mail_uids)
+                if incremental and mail_uids:
+                    # Emails left on the server by the narrowing count as synced
+                    high_water[sender] = max(high_water[sender], max(int(uid) for uid in mail_uids))
+                if narrowed.get(sender) is not None:
+                    kept = set(narrowed[sender])
+                    mail_uids = [uid for uid in mail_uids if uid in kept]
+                elif sender in narrowed:
+                    logger.warning("Server rejected the keyword SEARCH for %s, filtering locally", sender)
+                stats["keyword_search"][sender] = (len(mail_uids), total)
+                stats["keyword_search_skipped"] = stats.get("keyword_search_skipped", 0) + total - len(mail_uids)
+                logger.info(
+                    "%s: %d of %d emails left to download after keyword SEARCH",
+                    ", ".join(sender_groups[sender]),
+                    len(mail_uids),
+                    total,
                 )
+            message_counts[sender] = len(mail_uids)
+            uid_groups.append((sender, mail_uids))
+
+        # Results come back in sender then UID order, whatever the pool size
+        if partial:
+            fetched = (
+                (sender, uid, build_partial_record(header, body, subtype, sender, sender_groups[sender][0]))
+                for sender, uid, header, body, subtype in fetch_text_parts_parallel(
+                    pool, uid_groups, chunk_size, max_body_bytes, stats
+                )
+            )
+        else:
+            downloads = fetch_groups_parallel(pool, uid_groups, chunk_size, stats)
+            if cache is not None:
+                downloads = _write_through(cache, downloads)
+            fetched = (
+                (sender, uid, parse_email_message(raw_email, sender, sender_groups[sender][0]))
+                for sender, uid, raw_email in downloads
+            )
+
+        for sender, uid, record in fetched:
+            bank_names = sender_groups[sender]
+            for bank_name in route_email(record, bank_names, config, keyword_search):
+                if checkpoint is not None:
+                    checkpoint.record_yielded()
+                yield EmailRecord(record, bank_config=bank_name)
+            # The consumer is done with this message once we get here
+            # (or, for a deferred checkpoint, once it acknowledges its records)
+            if checkpoint is not None:
+                checkpoint.message_done(sender, uidvalidity, uid)
+            if incremental:
+                high_water[sender] = max(high_water[sender], int(uid))
+
+        stats["reconnects"] = stats.get("reconnects", 0) + pool.reconnects
+
+    # Sessions report their byte counters once the pool has closed them
+    for key, value in pool.transfer.items():
+        stats[key] = stats.get(key, 0) + value
+
+    if cache is not None:
+        cache.commit()
+
+    if checkpoint is not None:
+        checkpoint.finish()
+
+    if incremental:
+        for sender, last_uid in high_water.items():
+            update_sync_state(user, mailbox, sender, uidvalidity, last_uid, db_path)
+
+    stats["searches_saved"] = sum(len(b) - 1 for b in sender_groups.values())
+    stats["downloads_saved"] = downloads_saved(sender_groups, message_counts)
+
+    logger.info(
+        "Fetched %d emails in %d FETCH round-trips (chunk size %d, %d sessions)",
+        stats.get("messages_fetched", 0),
+        stats.get("fetch_round_trips", 0),
+        chunk_size,
+        workers,
+    )
+    if partial:
+        logger.info(
+            "Partial fetch downloaded %d of %d message bytes",
+            stats.get("bytes_fetched", 0),
+            stats.get("bytes_total", 0),
+        )
+    if pool.transfer:
+        logger.info(
+            "COMPRESS=DEFLATE received %d bytes for %d bytes of IMAP responses",
+            pool.transfer["bytes_in_compressed"],
+            pool.transfer["bytes_in"],
+        )
+    logger.info(
+        "Shared senders saved %d searches and %d downloads",
+        stats["searches_saved"],
+        stats["downloads_saved"],
+    )
+
 
-    mail.close()
-    mail.logout()
+def fetch_emails(start_date: str, end_date: str, **options):
+    """Return every email yielded by ``iter_emails`` as a list.
 
-    return fetched_emails
+    Takes the same keyword options as ``iter_emails``. Prefer the generator
+    for large date ranges: this holds every email's HTML in memory at once.
+    """
+    return list(iter_emails(start_date, end_date, **options))
 
 
 def fetch_email_text(start_date: str | None = None, end_date: str | None = None):
@@ -167,16 +498,15 @@ def fetch_email_text(start_date: str | None = None, end_date: str | None = None)
     if end_date is None:
         end_date = datetime.utcnow().strftime("%d-%b-%Y")
 
-    emails = fetch_emails(start_date, end_date)
+    # Only the first email is needed; closing the generator stops the download
+    emails = iter_emails(start_date, end_date)
+    first = next(emails, None)
+    emails.close()
 
-    if not emails:
+    if first is None:
         return None
 
-    first = emails[0]
-    soup = BeautifulSoup(first["full_email_html"], "html.parser")
-    text = soup.get_text(separator="\n") if first["full_email_html"] else ""
-
-    return text, first["email_datetime"], first["subject"], first["sender"]
+    return first.text, first["email_datetime"], first["subject"], first["sender"]
 
 if __name__ == "__main__":
     email_data = fetch_email_text()
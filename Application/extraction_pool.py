@@ -0,0 +1,142 @@
+"""Extract transactions from a stream of emails on several cores.
+
+``iter_extracted`` runs ``extract_transaction_data`` on the emails yielded
+by ``iter_emails`` and yields ``(email, ordered_data)`` pairs in input
+order, so the caller stays the single database writer. With more than one
+worker, emails are sent in chunks to a ``ProcessPoolExecutor`` whose
+processes compile the bank rules once, when they start, and send the
+regex hits they count back to the caller's rules (see ``pattern_stats``).
+Only a bounded number of chunks is read ahead of the caller.
+
+The duplicate check reads the database the caller writes to, so the
+workers skip it and ``iter_extracted`` runs it just before yielding each
+result, once every earlier transaction was stored (on the caller's
+``TransactionStore`` connection when one is given).
+"""
+
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import pattern_stats
+from bank_rules import load_rules
+from traitement import extract_transaction_data, is_duplicate
+
+logger = logging.getLogger(__name__)
+
+# ✅ Emails sent to a worker process at once
+EXTRACT_CHUNK_SIZE = 50
+# ✅ Chunks in flight per worker, bounding how far the stage reads ahead
+CHUNKS_PER_WORKER = 2
+
+
+def resolve_workers(workers):
+    """Number of processes to use; ``0`` or ``None`` means one per core."""
+    if not workers:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def _init_worker(config_path=None):
+    # Compile the bank rules once per process instead of once per chunk
+    pattern_stats.prime(load_rules(config_path))
+
+
+def _extract_chunk(emails, config_path=None):
+    rules = load_rules(config_path)
+    results = []
+    for email in emails:
+        ordered_data = extract_transaction_data(
+            email,
+            email.get("sender"),
+            email.get("subject"),
+            email.get("email_datetime"),
+            cfg=rules,
+            check_duplicate=False,
+        )
+        # Send the parsed text back so the caller's record keeps it too
+        results.append((email.get("email_text"), ordered_data))
+    return results, rules.take_hits()
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _mark_duplicate(ordered_data, store=None):
+    check = store.is_duplicate if store is not None else is_duplicate
+    ordered_data["duplicate"] = bool(
+        ordered_data["amount"]
+        and ordered_data["date"]
+        and check(ordered_data["amount"], ordered_data["date"])
+    )
+    return ordered_data
+
+
+def iter_extracted(emails, workers=1, chunk_size=EXTRACT_CHUNK_SIZE, config_path=None, store=None):
+    """Yield ``(email, ordered_data)`` for each email, in input order.
+
+    Parameters
+    ----------
+    emails : iterable of dict
+        Records yielded by ``iter_emails`` (or any ``fetch_emails``
+        dictionaries).
+    workers : int, optional
+        Worker processes. ``1`` extracts in the calling process, ``0`` uses
+        one process per core.
+    chunk_size : int, optional
+        Emails sent to a worker at once.
+    config_path : str, optional
+        ``config.yml`` used by the workers, ``bank_rules.CONFIG_FILE`` by
+        default.
+    store : Database.TransactionStore.TransactionStore, optional
+        Store the caller inserts into, used for the duplicate check instead
+        of a new connection per email.
+    """
+    workers = resolve_workers(workers)
+    if workers == 1:
+        for email in emails:
+            ordered_data = extract_transaction_data(
+                email,
+                email.get("sender"),
+                email.get("subject"),
+                email.get("email_datetime"),
+                cfg=load_rules(config_path),
+                check_duplicate=store is None,
+            )
+            if store is not None:
+                _mark_duplicate(ordered_data, store)
+            yield email, ordered_data
+        return
+
+    logger.info("Extracting transactions with %d worker processes", workers)
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config_path,))
+    in_flight = deque()
+    try:
+        for chunk in _chunks(emails, chunk_size):
+            in_flight.append((chunk, executor.submit(_extract_chunk, chunk, config_path)))
+            if len(in_flight) < workers * CHUNKS_PER_WORKER:
+                continue
+            chunk, future = in_flight.popleft()
+            yield from _collect(chunk, future, config_path, store)
+        while in_flight:
+            chunk, future = in_flight.popleft()
+            yield from _collect(chunk, future, config_path, store)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _collect(chunk, future, config_path, store):
+    results, hits = future.result()
+    load_rules(config_path).add_hits(hits)
+    for email, (text, ordered_data) in zip(chunk, results):
+        if text is not None and email.get("email_text") is None:
+            email["email_text"] = text
+        yield email, _mark_duplicate(ordered_data, store)
@@ -0,0 +1,696 @@
+"""Local IMAP4 stand-in serving an in-memory mailbox over localhost.
+
+``FakeIMAPServer`` implements the subset of IMAP used by the extractors
+(LOGIN, SELECT, SEARCH, FETCH and their UID variants, plus IDLE) so fetch
+strategies can be exercised and timed without a Gmail account. ``latency``
+adds a delay before every response to mimic a network round-trip, either
+the same for every command or per command (``{"UID FETCH": 0.05, "*": 0.01}``).
+With ``compress=True`` the server also offers ``COMPRESS=DEFLATE`` and
+``bytes_sent`` counts the compressed bytes actually written.
+Messages delivered with :meth:`FakeIMAPServer.deliver` are announced to
+idling clients with an ``EXISTS`` response.
+
+Point the extractors at it with ``IMAP_HOST``, ``IMAP_PORT`` and
+``IMAP_SSL=0`` (see ``imap_utils.imap_settings``). Run as a script, it
+serves generated bank alerts, an mbox/Maildir/``.eml`` source or the
+message cache until interrupted::
+
+    python fake_imap.py --messages 5000 --latency 0.02 --latency "UID FETCH=0.05"
+"""
+
+import argparse
+import email
+import email.utils
+import os
+import re
+import select
+import socket
+import socketserver
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from imap_compress import DeflateStream
+
+_MONTHS = {m: i for i, m in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], 1
+)}
+
+_TOKEN_RE = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"\[]+(?:\[[^\]]*\](?:<[\d.]+>)?)?))')
+
+
+class FakeMessage:
+    """A stored message with its UID and lazily parsed headers."""
+
+    def __init__(self, uid, raw):
+        self.uid = uid
+        self.raw = raw
+        self._msg = None
+        self._text = None
+
+    @property
+    def msg(self):
+        if self._msg is None:
+            self._msg = email.message_from_bytes(self.raw)
+        return self._msg
+
+    @property
+    def text(self):
+        """Lower-cased decoded text of every text part, as servers search it."""
+        if self._text is None:
+            chunks = []
+            for part in self.msg.walk():
+                if part.get_content_maintype() != "text":
+                    continue
+                payload = part.get_payload(decode=True) or b""
+                chunks.append(payload.decode(part.get_content_charset() or "utf-8", "replace"))
+            self._text = "\n".join(chunks).lower()
+        return self._text
+
+    @property
+    def date(self):
+        try:
+            return email.utils.parsedate_to_datetime(self.msg.get("Date")).date()
+        except (TypeError, ValueError):
+            return None
+
+
+def tokenize(data):
+    """Parse IMAP arguments into nested lists of ``bytes`` atoms."""
+    stack = [[]]
+    pos = 0
+    data = data.strip()
+    while pos < len(data):
+        match = _TOKEN_RE.match(data, pos)
+        if not match or match.end() == pos:
+            raise ValueError(f"cannot parse {data[pos:]!r}")
+        pos = match.end()
+        if match.group(1):
+            stack.append([])
+        elif match.group(2):
+            inner = stack.pop()
+            stack[-1].append(inner)
+        elif match.group(3) is not None:
+            stack[-1].append(re.sub(rb"\\(.)", rb"\1", match.group(3)))
+        elif match.group(4):
+            stack[-1].append(match.group(4))
+    if len(stack) != 1:
+        raise ValueError("unbalanced parentheses")
+    return stack[0]
+
+
+def parse_imap_date(value):
+    day, month, year = value.decode().split("-")
+    return datetime(int(year), _MONTHS[month.lower()], int(day)).date()
+
+
+def parse_id_set(value, highest):
+    """Expand an IMAP set such as ``1,4:7,9:*`` into a predicate."""
+    ranges = []
+    for part in value.decode().split(","):
+        if ":" in part:
+            lo, hi = part.split(":")
+            lo = highest if lo == "*" else int(lo)
+            hi = highest if hi == "*" else int(hi)
+            ranges.append((min(lo, hi), max(lo, hi)))
+        else:
+            n = highest if part == "*" else int(part)
+            ranges.append((n, n))
+    return lambda n: any(lo <= n <= hi for lo, hi in ranges)
+
+
+class FakeMailbox:
+    """Ordered collection of :class:`FakeMessage` keyed by UID."""
+
+    def __init__(self, messages, uidvalidity=1):
+        if isinstance(messages, dict):
+            items = sorted(messages.items())
+        else:
+            items = list(enumerate(messages, 1))
+        self.messages = [FakeMessage(uid, raw) for uid, raw in items]
+        self.uidvalidity = uidvalidity
+        # Search keys answered with BAD, to mimic servers lacking them
+        self.unsupported_keys = set()
+
+    @property
+    def uidnext(self):
+        return (self.messages[-1].uid if self.messages else 0) + 1
+
+    def append(self, raw):
+        """Add a message with the next UID and return it."""
+        message = FakeMessage(self.uidnext, raw)
+        self.messages.append(message)
+        return message
+
+    def search(self, criteria, use_uid):
+        """Return matching ``(seq, message)`` pairs."""
+        keys = list(criteria)
+        results = []
+        for seq, message in enumerate(self.messages, 1):
+            if self._match_all(list(keys), seq, message):
+                results.append((seq, message))
+        return results
+
+    def _match_all(self, keys, seq, message):
+        while keys:
+            if not self._match_one(keys, seq, message):
+                return False
+        return True
+
+    def _match_one(self, keys, seq, message):
+        key = keys.pop(0)
+        if isinstance(key, list):
+            return self._match_all(list(key), seq, message)
+        name = key.upper()
+        if name in self.unsupported_keys:
+            raise ValueError(f"search key {key.decode()} not supported")
+        if name == b"ALL":
+            return True
+        if name == b"CHARSET":
+            keys.pop(0)
+            return True
+        if name == b"NOT":
+            return not self._match_one(keys, seq, message)
+        if name == b"OR":
+            left = self._match_one(keys, seq, message)
+            right = self._match_one(keys, seq, message)
+            return left or right
+        if name == b"UID":
+            highest = self.messages[-1].uid if self.messages else 0
+            return parse_id_set(keys.pop(0), highest)(message.uid)
+        if name in (b"FROM", b"TO", b"SUBJECT"):
+            value = keys.pop(0).decode("utf-8", "ignore").lower()
+            return value in str(message.msg.get(name.decode(), "")).lower()
+        if name in (b"BODY", b"TEXT"):
+            value = keys.pop(0).decode("utf-8", "ignore").lower()
+            headers = "\n".join(f"{k}: {v}" for k, v in message.msg.items()).lower()
+            if name == b"TEXT" and value in headers:
+                return True
+            return value in message.text
+        if name in (b"SINCE", b"BEFORE", b"ON"):
+            limit = parse_imap_date(keys.pop(0))
+            if message.date is None:
+                return False
+            if name == b"SINCE":
+                return message.date >= limit
+            if name == b"BEFORE":
+                return message.date < limit
+            return message.date == limit
+        if name[:1].isdigit() or name[:1] == b"*":
+            return parse_id_set(name, len(self.messages))(seq)
+        raise ValueError(f"unsupported search key {key!r}")
+
+    def select(self, id_set, use_uid):
+        if use_uid:
+            highest = self.messages[-1].uid if self.messages else 0
+            wanted = parse_id_set(id_set, highest)
+            return [(seq, m) for seq, m in enumerate(self.messages, 1) if wanted(m.uid)]
+        wanted = parse_id_set(id_set, len(self.messages))
+        return [(seq, m) for seq, m in enumerate(self.messages, 1) if wanted(seq)]
+
+
+_SECTION_RE = re.compile(rb"BODY(?:\.PEEK)?\[([^\]]*)\](?:<(\d+)\.(\d+)>)?$", re.I)
+
+
+def split_header(raw):
+    """Return ``(header_block, body)``; the header block keeps its blank line."""
+    for sep in (b"\r\n\r\n", b"\n\n"):
+        index = raw.find(sep)
+        if index != -1:
+            return raw[:index + len(sep)], raw[index + len(sep):]
+    return raw, b""
+
+
+def header_fields(raw, names):
+    """Return the header lines of ``raw`` whose names are in ``names``."""
+    header, _ = split_header(raw)
+    wanted = {n.upper() for n in names}
+    lines = []
+    keep = False
+    for line in header.splitlines(keepends=True):
+        if line[:1] in (b" ", b"\t"):
+            if keep:
+                lines.append(line)
+            continue
+        keep = line.split(b":", 1)[0].strip().upper() in wanted
+        if keep:
+            lines.append(line)
+    return b"".join(lines) + b"\r\n"
+
+
+def _quote(value):
+    if value is None:
+        return b"NIL"
+    value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return b'"' + value.encode("utf-8") + b'"'
+
+
+def _encoded_payload(part):
+    """Return a leaf part's body as transmitted, still transfer-encoded."""
+    payload = part.get_payload()
+    if isinstance(payload, bytes):
+        return payload
+    return payload.encode("utf-8", "surrogateescape")
+
+
+def bodystructure(part):
+    """Build the IMAP ``BODYSTRUCTURE`` of an ``email.message.Message``."""
+    if part.is_multipart():
+        children = b"".join(bodystructure(child) for child in part.get_payload())
+        boundary = b'("BOUNDARY" ' + _quote(part.get_boundary()) + b")"
+        return b"(" + children + b" " + _quote(part.get_content_subtype().upper()) + b" " + boundary + b" NIL NIL NIL)"
+
+    params = part.get_params()[1:] if part.get_params() else []
+    param_list = b"(" + b" ".join(_quote(k.upper()) + b" " + _quote(v) for k, v in params) + b")" if params else b"NIL"
+    payload = _encoded_payload(part)
+    encoding = part.get("Content-Transfer-Encoding", "7BIT").upper()
+    fields = [
+        _quote(part.get_content_maintype().upper()),
+        _quote(part.get_content_subtype().upper()),
+        param_list,
+        b"NIL",
+        b"NIL",
+        _quote(encoding),
+        str(len(payload)).encode(),
+    ]
+    if part.get_content_maintype() == "text":
+        fields.append(str(payload.count(b"\n")).encode())
+    disposition = part.get_content_disposition()
+    fields.append(b"NIL")
+    if disposition:
+        filename = part.get_filename()
+        dsp_params = b'("FILENAME" ' + _quote(filename) + b")" if filename else b"NIL"
+        fields.append(b"(" + _quote(disposition.upper()) + b" " + dsp_params + b")")
+    else:
+        fields.append(b"NIL")
+    return b"(" + b" ".join(fields) + b")"
+
+
+def find_part(msg, section):
+    """Return the leaf part addressed by a numeric section such as ``1.2``."""
+    part = msg
+    for index in section.split(b"."):
+        if part.is_multipart():
+            part = part.get_payload()[int(index) - 1]
+        elif index != b"1":
+            raise ValueError(f"no part {section!r}")
+    return part
+
+
+def body_section(message, section):
+    """Return the bytes of a ``BODY[section]`` request."""
+    spec = section.upper()
+    if spec == b"":
+        return message.raw
+    if spec[:1].isdigit():
+        return _encoded_payload(find_part(message.msg, section))
+    if spec == b"HEADER":
+        return split_header(message.raw)[0]
+    if spec == b"TEXT":
+        return split_header(message.raw)[1]
+    if spec.startswith(b"HEADER.FIELDS"):
+        names = tokenize(section[len(b"HEADER.FIELDS"):])[0]
+        return header_fields(message.raw, names)
+    raise ValueError(f"unsupported body section {section!r}")
+
+
+def fetch_item(message, item):
+    """Return ``(name, value)`` for one FETCH data item.
+
+    ``value`` is ``bytes`` when it must be sent as a literal and ``str``
+    when it is sent inline.
+    """
+    name = item.upper()
+    if name == b"UID":
+        return "UID", str(message.uid)
+    if name == b"FLAGS":
+        return "FLAGS", "(\\Seen)"
+    if name == b"RFC822.SIZE":
+        return "RFC822.SIZE", str(len(message.raw))
+    if name == b"RFC822":
+        return "RFC822", message.raw
+    if name == b"BODYSTRUCTURE":
+        return "BODYSTRUCTURE", bodystructure(message.msg).decode("utf-8", "replace")
+    if name == b"RFC822.HEADER":
+        return "RFC822.HEADER", split_header(message.raw)[0]
+    match = _SECTION_RE.match(item)
+    if match:
+        section, origin, length = match.groups()
+        data = body_section(message, section)
+        label = f"BODY[{section.decode()}]"
+        if origin is not None:
+            data = data[int(origin):int(origin) + int(length)]
+            label += f"<{int(origin)}>"
+        return label, data
+    raise ValueError(f"unsupported fetch item {item!r}")
+
+
+# Commands that need a SELECTed mailbox
+_SELECTED_COMMANDS = (b"SEARCH", b"UID SEARCH", b"FETCH", b"UID FETCH", b"CLOSE")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # Responses are written line by line; don't let Nagle delay them
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        server = self.server.fake
+        self.selected = None
+        # Messages in the mailbox as last reported to this client
+        self.reported = 0
+        self.compression = None
+        server._register(self)
+        try:
+            self._serve(server)
+        except OSError:
+            pass
+        finally:
+            server._unregister(self)
+
+    def _serve(self, server):
+        self._send(b"* OK [CAPABILITY " + " ".join(server.capabilities).encode() + b"] Fake IMAP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            line = line.rstrip(b"\r\n")
+            if not line:
+                continue
+            tag, _, rest = line.partition(b" ")
+            command, _, args = rest.partition(b" ")
+            command = command.upper()
+            if command == b"UID":
+                command, _, args = args.partition(b" ")
+                command = b"UID " + command.upper()
+            server._count(command.decode())
+            delay = server.delay(command.decode(), args)
+            if delay:
+                time.sleep(delay)
+            try:
+                if not self.dispatch(tag, command, args):
+                    return
+            except (ValueError, IndexError, KeyError) as e:
+                self._send(tag + b" BAD " + str(e).encode())
+
+    def dispatch(self, tag, command, args):
+        server = self.server.fake
+        if command in _SELECTED_COMMANDS and self.selected is None:
+            self._send(tag + b" BAD No mailbox selected")
+            return True
+        if command == b"CAPABILITY":
+            self._send(b"* CAPABILITY " + " ".join(server.capabilities).encode())
+        elif command == b"LOGIN":
+            pass
+        elif command == b"NOOP":
+            pass
+        elif command in (b"SELECT", b"EXAMINE"):
+            box = server.mailbox
+            self.selected = box
+            self.reported = len(box.messages)
+            self._send(b"* %d EXISTS" % self.reported)
+            self._send(b"* 0 RECENT")
+            self._send(b"* OK [UIDVALIDITY %d] UIDs valid" % box.uidvalidity)
+            self._send(b"* OK [UIDNEXT %d] Predicted next UID" % box.uidnext)
+            self._send(b"* FLAGS (\\Seen)")
+        elif command == b"STATUS":
+            box = server.mailbox
+            name = tokenize(args)[0]
+            self._send(
+                b"* STATUS %s (MESSAGES %d UIDNEXT %d UIDVALIDITY %d)"
+                % (name, len(box.messages), box.uidnext, box.uidvalidity)
+            )
+        elif command in (b"SEARCH", b"UID SEARCH"):
+            ids = server.search_results.get(f"{command.decode()} {args.decode('utf-8', 'replace')}".strip())
+            if ids is None:
+                use_uid = command.startswith(b"UID")
+                found = self.selected.search(tokenize(args), use_uid)
+                ids = [m.uid if use_uid else seq for seq, m in found]
+            self._send(b"* SEARCH" + b"".join(b" %d" % n for n in ids))
+        elif command in (b"FETCH", b"UID FETCH"):
+            self.fetch(command.startswith(b"UID"), tokenize(args))
+        elif command == b"COMPRESS":
+            if "COMPRESS=DEFLATE" not in server.capabilities or tokenize(args)[0].upper() != b"DEFLATE":
+                self._send(tag + b" BAD compression not supported")
+            elif self.compression is not None:
+                self._send(tag + b" NO [COMPRESSIONACTIVE] already compressing")
+            else:
+                self._send(tag + b" OK DEFLATE active")
+                # Everything after the tagged OK is compressed, both ways
+                self.compression = DeflateStream(self.connection)
+                self.rfile = self.compression.makefile()
+            return True
+        elif command == b"IDLE":
+            if not self.idle():
+                return False
+        elif command == b"CLOSE":
+            self.selected = None
+        elif command == b"LOGOUT":
+            self._send(b"* BYE Logging out")
+            self._send(tag + b" OK LOGOUT completed")
+            return False
+        else:
+            self._send(tag + b" BAD unknown command")
+            return True
+        self._send(tag + b" OK " + command + b" completed")
+        return True
+
+    def idle(self):
+        """Wait for ``DONE``, reporting new messages as they are delivered."""
+        server = self.server.fake
+        known = len(self.selected.messages) if self.selected else self.reported
+        if known != self.reported:
+            # Mail delivered since the last report is announced at once, in
+            # the same packet as the continuation
+            self._send(b"+ idling\r\n* %d EXISTS" % known)
+        else:
+            self._send(b"+ idling")
+        self.reported = known
+        while True:
+            if self.selected is not None and len(self.selected.messages) != self.reported:
+                self.reported = len(self.selected.messages)
+                self._send(b"* %d EXISTS" % self.reported)
+            if server._stopping.is_set():
+                return False
+            readable, _, _ = select.select([self.connection], [], [], 0.02)
+            if readable:
+                line = self.rfile.readline()
+                if not line:
+                    return False
+                if line.strip().upper() == b"DONE":
+                    return True
+
+    def fetch(self, use_uid, args):
+        id_set, items = args[0], args[1]
+        if not isinstance(items, list):
+            items = [items]
+        if items and isinstance(items[0], bytes) and items[0].upper() in (b"ALL", b"FAST", b"FULL"):
+            items = [b"FLAGS", b"RFC822.SIZE"]
+        if use_uid and not any(isinstance(i, bytes) and i.upper() == b"UID" for i in items):
+            items = [b"UID"] + items
+        for seq, message in self.selected.select(id_set, use_uid):
+            out = b"* %d FETCH (" % seq
+            for index, item in enumerate(items):
+                name, value = fetch_item(message, item)
+                if index:
+                    out += b" "
+                if isinstance(value, bytes):
+                    out += name.encode() + b" {%d}\r\n" % len(value) + value
+                else:
+                    out += f"{name} {value}".encode()
+            self._send(out + b")")
+
+    def _send(self, data):
+        if self.compression is not None:
+            size = self.compression.sendall(data + b"\r\n")
+        else:
+            self.wfile.write(data + b"\r\n")
+            size = len(data) + 2
+        self.server.fake._count_bytes(size)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeIMAPServer:
+    """Threaded IMAP stand-in bound to ``host:port`` (port 0 picks a free one).
+
+    ``messages`` is a list of raw RFC822 messages (UIDs 1..n) or a dict
+    mapping UIDs to raw messages. ``latency`` is a number of seconds or a
+    dict mapping command names (``"SELECT"``, ``"UID FETCH"``...) to
+    seconds, with ``"*"`` for the other commands, or a callable receiving
+    the command name and its raw arguments. ``search_results`` maps whole
+    commands (``'UID SEARCH (FROM "x")'``) to the IDs to answer instead of
+    searching the mailbox, as recorded by ``imap_recorder``. Use as a
+    context manager or call :meth:`start` and :meth:`stop`.
+    """
+
+    def __init__(
+        self,
+        messages=(),
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        uidvalidity=1,
+        compress=False,
+        search_results=None,
+    ):
+        self.mailbox = FakeMailbox(messages, uidvalidity)
+        self.latency = latency
+        self.search_results = search_results or {}
+        self.capabilities = ["IMAP4rev1", "IDLE"]
+        if compress:
+            self.capabilities.append("COMPRESS=DEFLATE")
+        self.command_counts = Counter()
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._handlers = set()
+        self._stopping = threading.Event()
+        self._server = _TCPServer((host, port), _Handler)
+        self._server.fake = self
+        self._thread = None
+
+    def delay(self, command, args=b""):
+        """Seconds to wait before answering ``command``."""
+        if callable(self.latency):
+            return self.latency(command, args)
+        if isinstance(self.latency, dict):
+            return self.latency.get(command, self.latency.get("*", 0.0))
+        return self.latency
+
+    @property
+    def address(self):
+        return self._server.server_address[:2]
+
+    def _count(self, command):
+        with self._lock:
+            self.command_counts[command] += 1
+
+    def _count_bytes(self, size):
+        with self._lock:
+            self.bytes_sent += size
+
+    def _register(self, handler):
+        with self._lock:
+            self._handlers.add(handler)
+
+    def _unregister(self, handler):
+        with self._lock:
+            self._handlers.discard(handler)
+
+    @property
+    def connections(self):
+        """Number of client connections currently open."""
+        with self._lock:
+            return len(self._handlers)
+
+    def deliver(self, raw):
+        """Append a new message to the mailbox, as if it had just arrived."""
+        with self._lock:
+            return self.mailbox.append(raw).uid
+
+    def drop_connections(self):
+        """Abruptly close every client connection, like a server restart."""
+        with self._lock:
+            handlers = list(self._handlers)
+        for handler in handlers:
+            try:
+                handler.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def env(self):
+        """Environment variables pointing ``imap_utils`` at this server."""
+        host, port = self.address
+        return {"IMAP_HOST": host, "IMAP_PORT": str(port), "IMAP_SSL": "0"}
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def parse_latency(values):
+    """Turn ``--latency`` values (``0.02`` or ``"UID FETCH=0.05"``) into a latency."""
+    latency = {}
+    for value in values or ():
+        command, _, seconds = value.rpartition("=")
+        latency[command.strip().upper() or "*"] = float(seconds)
+    if set(latency) <= {"*"}:
+        return latency.get("*", 0.0)
+    return latency
+
+
+def generated_mailbox(count, seed=0):
+    """Return ``count`` raw alerts spread over the banks of ``config.yml``."""
+    from bank_rules import load_config
+    from benchmarks.bank_templates import iter_alerts, raw_alert
+
+    banks = load_config()["banks"]
+    return [
+        raw_alert(banks[bank]["sender"], bank, amount, merchant, variant)
+        for bank, variant, amount, merchant in iter_alerts(banks, count, seed)
+    ]
+
+
+def recorded_mailbox(location):
+    """Return the raw messages of a message cache directory, mbox, Maildir or ``.eml`` directory."""
+    from message_cache import MessageCache
+    from message_sources import open_source
+
+    if os.path.isfile(os.path.join(location, "index.db")):
+        with MessageCache(location) as cache:
+            return [raw for _, _, raw in cache.iter_messages()]
+    with open_source(location) as source:
+        return [raw for _, raw in source.iter_raw()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local IMAP mailbox for load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1143)
+    parser.add_argument("--messages", type=int, default=1000, help="generated bank alerts to serve")
+    parser.add_argument("--source", help="message cache, mbox, Maildir or .eml directory to serve instead")
+    parser.add_argument(
+        "--latency",
+        action="append",
+        metavar="[COMMAND=]SECONDS",
+        help="delay before each response, for every command or one command (repeatable)",
+    )
+    parser.add_argument("--compress", action="store_true", help="offer COMPRESS=DEFLATE")
+    args = parser.parse_args(argv)
+
+    messages = recorded_mailbox(args.source) if args.source else generated_mailbox(args.messages)
+    server = FakeIMAPServer(
+        messages, args.host, args.port, latency=parse_latency(args.latency), compress=args.compress
+    )
+    with server:
+        print(f"📬 Serving {len(messages)} messages on {server.address[0]}:{server.address[1]}")
+        print("   Point the extractors at it with:")
+        for key, value in server.env().items():
+            print(f"   export {key}={value}")
+        print("   export EMAIL_USER=load@example.com EMAIL_PASS=load")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print(f"\n📊 Commands served: {dict(server.command_counts)}")
+
+
+if __name__ == "__main__":
+    main()
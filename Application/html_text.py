@@ -0,0 +1,268 @@
+"""HTML-to-text conversion with interchangeable backends.
+
+The ``config.yml`` regexes were written against
+``BeautifulSoup(html, "html.parser").get_text(separator="\\n")``: every text
+node of the document on its own line, whitespace-only nodes collapsed to
+a single space or newline (except inside ``<pre>`` and ``<textarea>``),
+and the contents of comments, ``<script>``, ``<style>`` and
+``<template>`` left out. Building a whole BeautifulSoup tree only to read
+its strings back is the dominant CPU cost of extracting an email, so the
+other backends reproduce the same text in a single pass over the markup:
+
+``stdlib``
+    A streaming ``html.parser.HTMLParser``, without building a tree. Same
+    tokenizer as bs4, hence the same text; the default.
+``lxml``
+    libxml2's HTML parser driving the same collector (needs ``lxml``).
+``selectolax``
+    A walk over a Lexbor tree (needs ``selectolax``).
+``bs4``
+    The original BeautifulSoup path, kept as the reference.
+
+The HTML5 parsers behind ``lxml`` and ``selectolax`` repair malformed
+markup in their own way (misnested tables, stray ``CDATA``...) and may then
+disagree with ``bs4`` on where lines break. ``HTML_TEXT_BACKEND`` selects
+the backend used by :func:`html_to_text`.
+"""
+
+import html as html_lib
+import os
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+except ImportError:  # lxml is optional
+    etree = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # selectolax is optional
+    LexborHTMLParser = None
+
+DEFAULT_BACKEND = "stdlib"
+
+# Tags whose strings bs4 does not count as text (Script, Stylesheet,
+# TemplateString and ruby annotations)
+_SKIPPED_TAGS = frozenset(("script", "style", "template", "rt", "rp"))
+_PRESERVE_WHITESPACE_TAGS = frozenset(("pre", "textarea"))
+_VOID_TAGS = frozenset((
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link",
+    "menuitem", "meta", "param", "source", "track", "wbr", "basefont", "bgsound",
+    "command", "frame", "image", "isindex", "nextid", "spacer",
+))
+_ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+
+class _TextBuilder:
+    """Collect text nodes the way BeautifulSoup's tree builder splits them.
+
+    Consecutive character data forms one string, ended by any tag,
+    comment or declaration. ``lines`` receives the strings ``get_text``
+    would return, which are then joined with newlines.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self._pending = []
+        self._open = []
+        self._skipped = 0
+        self._preserved = 0
+
+    def data(self, data):
+        self._pending.append(data)
+
+    def flush(self, include=None):
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending = []
+        if not self._preserved and not text.strip(_ASCII_SPACES):
+            text = "\n" if "\n" in text else " "
+        if include if include is not None else not self._skipped:
+            self.lines.append(text)
+
+    def start(self, tag):
+        self.flush()
+        if tag in _VOID_TAGS:
+            return
+        self._open.append(tag)
+        self._skipped += tag in _SKIPPED_TAGS
+        self._preserved += tag in _PRESERVE_WHITESPACE_TAGS
+
+    def end(self, tag):
+        self.flush()
+        if tag not in self._open:
+            return
+        # Like bs4, close every element opened inside this one
+        while True:
+            name = self._open.pop()
+            self._skipped -= name in _SKIPPED_TAGS
+            self._preserved -= name in _PRESERVE_WHITESPACE_TAGS
+            if name == tag:
+                break
+
+    def cdata(self, data):
+        # CDATA sections are text even inside <script> or <template>
+        self.flush()
+        self._pending.append(data)
+        self.flush(include=True)
+
+    def text(self):
+        self.flush()
+        return "\n".join(self.lines)
+
+
+class _StdlibTextParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.builder = _TextBuilder()
+        # Void elements opened as <br> rather than <br/>: bs4 ignores one
+        # stray end tag for each, without ending the current string
+        self._closed_void = []
+
+    def handle_starttag(self, tag, attrs):
+        self.builder.start(tag)
+        if tag in _VOID_TAGS:
+            self._closed_void.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.builder.start(tag)
+        self.builder.end(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self._closed_void:
+            self._closed_void.remove(tag)
+            return
+        self.builder.end(tag)
+
+    def handle_data(self, data):
+        self.builder.data(data)
+
+    def handle_charref(self, name):
+        self.builder.data(html_lib.unescape(f"&#{name};"))
+
+    def handle_entityref(self, name):
+        text = html_lib.unescape(f"&{name};")
+        # Unknown entities are kept as written, minus the semicolon (as bs4 does)
+        self.builder.data(f"&{name}" if text == f"&{name};" else text)
+
+    def handle_comment(self, data):
+        self.builder.flush()
+
+    def handle_decl(self, decl):
+        self.builder.flush()
+
+    def handle_pi(self, data):
+        self.builder.flush()
+
+    def unknown_decl(self, data):
+        if data.upper().startswith("CDATA["):
+            self.builder.cdata(data[len("CDATA["):])
+        else:
+            self.builder.flush()
+
+
+def bs4_text(html):
+    return BeautifulSoup(html, "html.parser").get_text(separator="\n")
+
+
+def stdlib_text(html):
+    parser = _StdlibTextParser()
+    parser.feed(html)
+    parser.close()
+    return parser.builder.text()
+
+
+class _LxmlTarget:
+    """lxml parser target forwarding SAX-style events to a ``_TextBuilder``."""
+
+    def __init__(self):
+        self.builder = _TextBuilder()
+
+    def start(self, tag, attrib):
+        self.builder.start(tag)
+
+    def end(self, tag):
+        self.builder.end(tag)
+
+    def data(self, data):
+        self.builder.data(data)
+
+    def comment(self, text):
+        self.builder.flush()
+
+    def pi(self, target, data=None):
+        self.builder.flush()
+
+    def close(self):
+        return self.builder.text()
+
+
+def lxml_text(html):
+    if etree is None:
+        raise RuntimeError("the lxml backend requires the lxml package")
+    parser = etree.HTMLParser(target=_LxmlTarget(), remove_blank_text=False)
+    parser.feed(html)
+    return parser.close()
+
+
+def selectolax_text(html):
+    if LexborHTMLParser is None:
+        raise RuntimeError("the selectolax backend requires the selectolax package")
+    builder = _TextBuilder()
+    root = LexborHTMLParser(html).root
+    if root is None:
+        return ""
+    stack = [(root, False)]
+    while stack:
+        node, closing = stack.pop()
+        tag = node.tag
+        if closing:
+            builder.end(tag)
+        elif tag == "-text":
+            builder.data(node.text_content or "")
+        elif tag.startswith("-"):
+            # Comments and doctypes
+            builder.flush()
+        else:
+            builder.start(tag)
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(list(node.iter(include_text=True))))
+    return builder.text()
+
+
+BACKENDS = {
+    "stdlib": stdlib_text,
+    "lxml": lxml_text,
+    "selectolax": selectolax_text,
+    "bs4": bs4_text,
+}
+
+
+def available_backends():
+    """Names of the backends whose dependencies are installed."""
+    missing = set()
+    if etree is None:
+        missing.add("lxml")
+    if LexborHTMLParser is None:
+        missing.add("selectolax")
+    return [name for name in BACKENDS if name not in missing]
+
+
+def get_backend(name=None):
+    """Return the conversion function called ``name`` (default: ``HTML_TEXT_BACKEND``)."""
+    name = name or os.getenv("HTML_TEXT_BACKEND", DEFAULT_BACKEND)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown HTML backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    if name not in available_backends():
+        raise RuntimeError(f"HTML backend {name!r} is not installed")
+    return BACKENDS[name]
+
+
+def html_to_text(html, backend=None):
+    """Return the newline-separated text of an HTML body, as the regexes expect it."""
+    if not html:
+        return ""
+    return get_backend(backend)(html)
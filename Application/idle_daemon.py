@@ -0,0 +1,307 @@
+"""Long-running ingestion daemon driven by IMAP IDLE.
+
+Instead of re-running ``main.py`` over a date range, the daemon keeps one
+connection in IDLE and sleeps until the server announces new mail. It then
+runs an incremental ``fetch_emails`` (only UIDs above each sender's
+high-water mark), extracts the transactions with
+``extract_transaction_data`` and stores them through one
+``Database.TransactionStore`` kept open for the daemon's lifetime, which
+also answers the duplicate checks. Mail that no bank in
+``config.yml`` claims only costs a couple of ``UID SEARCH`` commands per
+configured sender and is never downloaded.
+
+IDLE is re-issued every ``IDLE_TIMEOUT`` seconds, before servers drop idle
+connections (RFC 2177 allows them to after 30 minutes). Connection errors
+trigger a reconnect with exponential backoff followed by a catch-up sync.
+Servers without the IDLE capability are polled every ``POLL_INTERVAL``.
+
+Run it with ``python Application/idle_daemon.py [--since DD-Mon-YYYY]``.
+"""
+
+import argparse
+import imaplib
+import logging
+import os
+import select
+import signal
+import ssl
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Add the root folder to Python's module search path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from Database.TransactionStore import TransactionStore
+from extracteur import fetch_emails
+from imap_utils import TRANSIENT_ERRORS, keyword_search_enabled, load_credentials, open_session
+from message_cache import MessageCache
+import pattern_stats
+from traitement import extract_transaction_data
+
+logger = logging.getLogger(__name__)
+
+# ✅ Re-IDLE before the server's inactivity timeout (Gmail and RFC 2177: ~30 min)
+IDLE_TIMEOUT = 25 * 60
+# ✅ Polling period for servers without the IDLE capability
+POLL_INTERVAL = 60
+# ✅ Reconnect backoff, doubled after every failed attempt
+RECONNECT_DELAY = 5
+MAX_RECONNECT_DELAY = 300
+# ✅ How often a waiting daemon checks whether it was asked to stop
+STOP_CHECK_INTERVAL = 1.0
+
+# Untagged responses meaning the mailbox changed
+_WAKE_RESPONSES = (b"EXISTS", b"RECENT")
+
+
+def _is_wake(line):
+    words = line.split()
+    return len(words) >= 3 and words[0] == b"*" and words[2].upper() in _WAKE_RESPONSES
+
+
+def _wait_readable(mail, timeout):
+    """Wait up to ``timeout`` seconds for a response line to be readable.
+
+    ``mail.file`` may already hold bytes received with the previous line
+    (and, on a compressed connection, the inflater may hold decompressed
+    ones; on SSL, decrypted ones), which ``select()`` on the socket cannot
+    see. The reader is peeked with the socket in non-blocking mode first,
+    so nothing that already arrived is left waiting for the next packet.
+    """
+    sock = mail.sock
+    previous = sock.gettimeout()
+    sock.settimeout(0)
+    try:
+        if mail.file.peek(1):
+            return True
+    except (BlockingIOError, ssl.SSLWantReadError):
+        pass
+    finally:
+        sock.settimeout(previous)
+    readable, _, _ = select.select([sock], [], [], timeout)
+    return bool(readable)
+
+
+def idle_wait(mail, timeout, stop=None):
+    """Hold an IDLE command until new mail arrives or ``timeout`` expires.
+
+    ``imaplib`` has no IDLE support before Python 3.14, so the command is
+    written and its responses read by hand. Returns ``True`` when the
+    server reported new messages (``EXISTS``/``RECENT``), ``False`` on
+    timeout or when ``stop`` is set. The IDLE is always terminated with
+    ``DONE`` so the connection can be reused.
+    """
+    tag = mail._new_tag()
+    mail.send(tag + b" IDLE\r\n")
+    woke = False
+    while True:
+        line = mail.readline()
+        if not line or line.startswith(b"* BYE"):
+            raise imaplib.IMAP4.abort("connection closed before IDLE")
+        if line.startswith(b"+"):
+            break
+        if line.startswith(tag + b" "):
+            mail.tagged_commands.pop(tag, None)
+            raise imaplib.IMAP4.error(f"IDLE rejected: {line.strip()!r}")
+        # Untagged updates ("* 4 EXISTS", "* 2 EXPUNGE") may come before the continuation
+        woke = woke or _is_wake(line)
+
+    deadline = time.monotonic() + timeout
+    while not woke:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or (stop is not None and stop.is_set()):
+            break
+        if not _wait_readable(mail, min(remaining, STOP_CHECK_INTERVAL)):
+            continue
+        line = mail.readline()
+        if not line or line.startswith(b"* BYE"):
+            raise imaplib.IMAP4.abort("connection closed during IDLE")
+        woke = _is_wake(line)
+
+    mail.send(b"DONE\r\n")
+    while True:
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("connection closed while ending IDLE")
+        if line.startswith(tag + b" "):
+            break
+    mail.tagged_commands.pop(tag, None)
+    if line.split()[1].upper() != b"OK":
+        raise imaplib.IMAP4.error(f"IDLE failed: {line.strip()!r}")
+    return woke
+
+
+def ingest_new_emails(since, store, db_path=None, cache=None, stats=None, insert=None):
+    """Fetch emails newer than the last sync and insert their transactions.
+
+    ``since`` only bounds the first sync of a sender; afterwards the UID
+    high-water marks stored by ``fetch_emails`` decide what is new.
+    Duplicates are checked and transactions inserted through ``store``
+    (``insert`` replaces ``store.insert``). Returns the number of
+    transactions inserted.
+    """
+    insert = insert or store.insert
+    end_date = (datetime.now() + timedelta(days=1)).strftime("%d-%b-%Y")
+    emails = fetch_emails(
+        since,
+        end_date,
+        stats=stats,
+        incremental=True,
+        db_path=db_path,
+        cache=cache,
+        keyword_search=keyword_search_enabled(),
+    )
+
+    inserted = 0
+    for email in emails:
+        ordered_data = extract_transaction_data(
+            email,
+            email.get("sender"),
+            email.get("subject"),
+            email.get("email_datetime"),
+            store=store,
+        )
+        if not ordered_data.get("amount"):
+            logger.info("Skipped email without transaction amount: %s", email.get("subject"))
+            continue
+        result = insert(ordered_data)
+        if result and "error" in result:
+            logger.error("Transaction not inserted: %s", result["error"])
+            continue
+        inserted += 1
+    return inserted
+
+
+class IdleDaemon:
+    """Keep an IDLE connection open and ingest new transactions as they arrive.
+
+    ``run`` blocks until :meth:`stop` is called. Transactions go through
+    ``store``, or through a ``TransactionStore`` over ``db_path`` that
+    ``run`` opens (in its own thread, as sqlite3 requires) and keeps until
+    it returns. ``stats`` counts ``wakeups`` (new-mail notifications),
+    ``syncs``, ``inserted`` transactions and ``reconnects``.
+    """
+
+    def __init__(
+        self,
+        since=None,
+        insert=None,
+        db_path=None,
+        store=None,
+        cache=None,
+        mailbox="Inbox",
+        idle_timeout=IDLE_TIMEOUT,
+        poll_interval=POLL_INTERVAL,
+        reconnect_delay=RECONNECT_DELAY,
+        max_reconnect_delay=MAX_RECONNECT_DELAY,
+    ):
+        self.since = since or datetime.now().strftime("%d-%b-%Y")
+        self.insert = insert
+        self.db_path = db_path
+        self.store = store
+        self.cache = cache
+        self.mailbox = mailbox
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.stats = {"wakeups": 0, "syncs": 0, "inserted": 0, "reconnects": 0}
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Ask ``run`` to return at its next check."""
+        self._stop.set()
+
+    def sync(self, store):
+        """Ingest everything that arrived since the previous sync into ``store``."""
+        pattern_stats.prime(db_path=self.db_path)
+        try:
+            inserted = ingest_new_emails(self.since, store, self.db_path, self.cache, insert=self.insert)
+        finally:
+            pattern_stats.save(db_path=self.db_path)
+        self.stats["syncs"] += 1
+        self.stats["inserted"] += inserted
+        if inserted:
+            logger.info("Inserted %d new transactions", inserted)
+        return inserted
+
+    def _watch(self, mail, store):
+        supports_idle = "IDLE" in mail.capabilities
+        if not supports_idle:
+            logger.warning("Server has no IDLE capability, polling every %ss", self.poll_interval)
+
+        while not self._stop.is_set():
+            if supports_idle:
+                woke = idle_wait(mail, self.idle_timeout, self._stop)
+            else:
+                woke = not self._stop.wait(self.poll_interval)
+                mail.noop()
+            if woke:
+                self.stats["wakeups"] += 1
+                self.sync(store)
+
+    def run(self):
+        user, password = load_credentials()
+        store = self.store or TransactionStore(self.db_path)
+        try:
+            self._run(user, password, store)
+        finally:
+            if store is not self.store:
+                store.close()
+
+    def _run(self, user, password, store):
+        delay = self.reconnect_delay
+        connected_once = False
+
+        while not self._stop.is_set():
+            mail = None
+            try:
+                mail = open_session(user, password, self.mailbox)
+                if connected_once:
+                    self.stats["reconnects"] += 1
+                connected_once = True
+                delay = self.reconnect_delay
+                logger.info("Watching %s for new transaction emails", self.mailbox)
+                # Catch up on anything that arrived while disconnected
+                self.sync(store)
+                self._watch(mail, store)
+            except TRANSIENT_ERRORS + (imaplib.IMAP4.error,) as e:
+                logger.warning("IMAP connection lost (%s), reconnecting in %ss", e, delay)
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+            finally:
+                if mail is not None:
+                    try:
+                        mail.logout()
+                    except Exception:
+                        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Insert new transactions as soon as their emails arrive.")
+    parser.add_argument(
+        "--since",
+        help="DD-Mon-YYYY lower bound for senders never synced before (default: today)",
+    )
+    args = parser.parse_args()
+
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=logging.INFO)
+
+    with MessageCache() as cache, TransactionStore() as store:
+        daemon = IdleDaemon(since=args.since, store=store, cache=cache)
+        signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+        try:
+            daemon.run()
+        except KeyboardInterrupt:
+            daemon.stop()
+    print(
+        f"👋 Daemon stopped: {daemon.stats['inserted']} transactions inserted after "
+        f"{daemon.stats['wakeups']} notifications ({daemon.stats['reconnects']} reconnects)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+"""Record the IMAP traffic of a real run and replay it from a local server.
+
+Setting ``IMAP_RECORD`` to a file name makes every session opened by
+``imap_utils.open_session`` log its commands: when each started, how long
+the server took to answer, the response size, the ``SEARCH`` results and
+the messages returned by ``FETCH``. The recording is written as gzipped
+JSON when the process exits::
+
+    IMAP_RECORD=run.imap.json.gz python main.py 01-Jan-2025 01-Feb-2025
+
+Sessions are attached after ``LOGIN``, so credentials never reach the
+file. Messages are redacted before they are stored: letters become ``x``
+and digits ``0``, except in the ``From`` header of the ``config.yml``
+senders, the ``Date`` and MIME headers and the multipart boundaries. Sizes
+and MIME structure are kept byte for byte, the content is not.
+
+``replay`` serves a recording from ``fake_imap.FakeIMAPServer``: same
+UIDVALIDITY, same ``SEARCH`` answers and each command delayed by the time
+it took originally (the median over the recording for a command issued
+with other arguments), optionally scaled::
+
+    python imap_recorder.py replay run.imap.json.gz --time-scale 0.5
+    python imap_recorder.py summary run.imap.json.gz
+
+Replay serves messages rather than the byte stream, so a different fetch
+strategy (chunk size, pool size, partial fetch) gets correct answers to
+commands the original run never sent. Messages the run only saw the
+headers of are served with a filler body padded to their ``RFC822.SIZE``;
+record with a full download to replay partial fetches faithfully.
+"""
+
+import argparse
+import atexit
+import gzip
+import json
+import logging
+import os
+import re
+import statistics
+import threading
+import time
+from datetime import datetime, timezone
+
+from imap_utils import TRANSIENT_ERRORS, parse_fetch_items
+
+logger = logging.getLogger(__name__)
+
+RECORD_ENV = "IMAP_RECORD"
+FORMAT = "imap-recording/1"
+
+# ✅ Headers kept as they are, everything else is masked
+KEEP_HEADERS = frozenset({
+    b"date",
+    b"mime-version",
+    b"content-type",
+    b"content-transfer-encoding",
+    b"content-disposition",
+})
+# ✅ Methods of imaplib.IMAP4 whose calls are recorded
+RECORDED_METHODS = ("select", "status", "search", "fetch", "uid")
+
+_MASK = bytes(
+    ord("0") if chr(i).isdigit() else ord("x") if chr(i).isalpha() or i >= 0x80 else i
+    for i in range(256)
+)
+_BOUNDARY_RE = re.compile(rb'boundary="?([^";\r\n]+)"?', re.IGNORECASE)
+_FILENAME_RE = re.compile(rb'(name\*?=)("[^"]*"|[^;\s]+)', re.IGNORECASE)
+_SIZE_RE = re.compile(rb"RFC822\.SIZE (\d+)")
+_FULL_RE = re.compile(rb"(?:RFC822|BODY\[\]) \{")
+_HEADER_RE = re.compile(rb"(?:RFC822\.HEADER|BODY\[HEADER[^\]]*\]) \{")
+_QP_ESCAPE_RE = re.compile(rb"=([0-9A-Fa-f]{2})")
+_ENCODED_WORD_RE = re.compile(rb"(=\?[^?\s]+\?[QqBb]\?)([^?\s]*)(\?=)")
+_FILLER = b"x" * 76 + b"\r\n"
+
+
+def mask(data):
+    """Replace letters (and non-ASCII bytes) by ``x`` and digits by ``0``."""
+    return data.translate(_MASK)
+
+
+def _mask_quoted_printable(line):
+    # Escapes of ASCII punctuation (=3D, =20) keep the decoded text the same
+    # size; escaped non-ASCII bytes decode to "x"
+    pieces = _QP_ESCAPE_RE.split(line)
+    out = [mask(pieces[0])]
+    for escape, text in zip(pieces[1::2], pieces[2::2]):
+        out.append(b"=" + escape if int(escape, 16) < 0x80 and not chr(int(escape, 16)).isalnum() else b"=78")
+        out.append(mask(text))
+    return b"".join(out)
+
+
+def _mask_header_value(value):
+    # Encoded words keep their charset so the header still decodes
+    out = []
+    pos = 0
+    for match in _ENCODED_WORD_RE.finditer(value):
+        prefix, text, suffix = match.groups()
+        text = _mask_quoted_printable(text) if prefix[-2:-1] in b"Qq" else mask(text)
+        out += [mask(value[pos:match.start()]), prefix, text, suffix]
+        pos = match.end()
+    out.append(mask(value[pos:]))
+    return b"".join(out)
+
+
+def redact_message(raw, senders=()):
+    """Return ``raw`` with its personal content masked, at the same size.
+
+    Header names, the headers of ``KEEP_HEADERS`` (with attachment names
+    masked), the ``From`` header when it holds one of ``senders``, blank
+    lines and multipart boundaries are kept; every other letter and digit
+    is masked. Quoted-printable escapes are masked so that the part still
+    decodes to the same number of bytes.
+    """
+    senders = [sender.lower().encode() for sender in senders]
+    boundaries = set()
+    in_header = True
+    keep = False
+    name = None
+    encoding = part_encoding = b""
+    out = []
+    for line in raw.splitlines(keepends=True):
+        content = line.rstrip(b"\r\n")
+        if in_header:
+            if not content:
+                in_header = False
+                encoding = part_encoding
+                out.append(line)
+                continue
+            if content[:1] not in (b" ", b"\t"):
+                name, _, _ = content.partition(b":")
+                name = name.strip().lower()
+                keep = name in KEEP_HEADERS or (
+                    name == b"from" and any(sender in content.lower() for sender in senders)
+                )
+                prefix = len(name) + 1 if b":" in content else 0
+            else:
+                prefix = 0
+            if name == b"content-transfer-encoding":
+                part_encoding = content.partition(b":")[2].strip().lower() if prefix else part_encoding
+            if keep:
+                boundaries.update(_BOUNDARY_RE.findall(content))
+                out.append(_FILENAME_RE.sub(lambda m: m.group(1) + mask(m.group(2)), line))
+            else:
+                out.append(line[:prefix] + _mask_header_value(line[prefix:]))
+            continue
+        delimiter = content.rstrip()
+        if delimiter.startswith(b"--") and delimiter[2:] in boundaries:
+            # Each part starts with its own headers
+            in_header = True
+            part_encoding = b""
+            out.append(line)
+            continue
+        if delimiter.startswith(b"--") and delimiter.endswith(b"--") and delimiter[2:-2] in boundaries:
+            out.append(line)
+            continue
+        out.append(_mask_quoted_printable(line) if encoding == b"quoted-printable" else mask(line))
+    return b"".join(out)
+
+
+def command_key(name, args):
+    """Return the command line an ``imaplib`` call sends, without its tag."""
+    name = name.upper()
+    if name == "UID" and args:
+        name, args = f"UID {args[0].upper()}", args[1:]
+    words = [name]
+    for arg in args:
+        if arg is not None:
+            words.append(arg.decode("utf-8", "replace") if isinstance(arg, bytes) else str(arg))
+    return " ".join(words)
+
+
+def _response_size(data):
+    size = 0
+    for item in data or ():
+        if isinstance(item, tuple):
+            size += sum(len(part) for part in item if isinstance(part, bytes))
+        elif isinstance(item, bytes):
+            size += len(item)
+    return size
+
+
+class SessionRecorder:
+    """Collect the commands and messages of every attached IMAP session.
+
+    ``senders`` are the addresses whose ``From`` header is kept, the bank
+    senders of ``config.yml`` by default.
+    """
+
+    def __init__(self, path=None, senders=None):
+        if senders is None:
+            from bank_rules import load_config
+
+            senders = {bank["sender"] for bank in load_config().get("banks", {}).values() if bank.get("sender")}
+        self.path = path
+        self.senders = sorted(senders)
+        self.started = time.monotonic()
+        self.calls = []
+        self.searches = {}
+        self.messages = {}
+        self.headers = {}
+        self.sizes = {}
+        self.uidvalidity = None
+        self.sessions = 0
+        self._lock = threading.Lock()
+
+    def attach(self, mail):
+        """Record the calls of a logged-in ``imaplib`` connection from now on."""
+        with self._lock:
+            session = self.sessions
+            self.sessions += 1
+        for name in RECORDED_METHODS:
+            setattr(mail, name, self._wrap(mail, session, name, getattr(mail, name)))
+        return mail
+
+    def _wrap(self, mail, session, name, method):
+        def recorded(*args):
+            key = command_key(name, args)
+            started = time.monotonic()
+            try:
+                typ, data = result = method(*args)
+            except TRANSIENT_ERRORS + (mail.error,) as e:
+                self._log(session, key, started, type(e).__name__, 0)
+                raise
+            self._log(session, key, started, typ, _response_size(data))
+            if typ == "OK":
+                self._observe(mail, key, data)
+            return result
+
+        return recorded
+
+    def _log(self, session, key, started, status, size):
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self.calls.append({
+                "session": session,
+                "start": round(started - self.started, 6),
+                "elapsed": round(elapsed, 6),
+                "command": key,
+                "status": status,
+                "bytes": size,
+            })
+
+    def _observe(self, mail, key, data):
+        command = key.split(" ", 2)
+        command = " ".join(command[:2]) if command[0] == "UID" else command[0]
+        if command in ("SELECT", "EXAMINE"):
+            validity = mail.untagged_responses.get("UIDVALIDITY")
+            if validity:
+                with self._lock:
+                    self.uidvalidity = int(validity[-1])
+        elif command in ("SEARCH", "UID SEARCH"):
+            ids = [int(n) for n in data[0].split()] if data and data[0] else []
+            with self._lock:
+                self.searches[key] = ids
+        elif command == "UID FETCH":
+            self._observe_fetch(data)
+
+    def _observe_fetch(self, data):
+        for uid, payload, meta in parse_fetch_items(data):
+            uid = int(uid)
+            size = _SIZE_RE.search(meta)
+            redacted = redact_message(payload, self.senders) if payload else None
+            with self._lock:
+                if size:
+                    self.sizes[uid] = int(size.group(1))
+                if redacted is None:
+                    continue
+                if _FULL_RE.search(meta):
+                    self.messages[uid] = redacted
+                    self.sizes[uid] = len(redacted)
+                elif _HEADER_RE.search(meta):
+                    self.headers[uid] = redacted
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "format": FORMAT,
+                "recorded": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "uidvalidity": self.uidvalidity,
+                "sessions": self.sessions,
+                "calls": sorted(self.calls, key=lambda call: call["start"]),
+                "searches": dict(self.searches),
+                "messages": {str(uid): raw.decode("latin-1") for uid, raw in sorted(self.messages.items())},
+                "headers": {str(uid): raw.decode("latin-1") for uid, raw in sorted(self.headers.items())},
+                "sizes": {str(uid): size for uid, size in sorted(self.sizes.items())},
+            }
+
+    def save(self, path=None):
+        """Write the recording as gzipped JSON to ``path``."""
+        path = path or self.path
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        logger.info("Recorded %d IMAP commands to %s", len(self.calls), path)
+        return path
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def active_recorder():
+    """Return the recorder of ``IMAP_RECORD``, or ``None`` when not recording.
+
+    The recording is saved at exit, or by :func:`stop_recording`.
+    """
+    global _recorder
+    path = os.getenv(RECORD_ENV)
+    if not path:
+        return None
+    with _recorder_lock:
+        if _recorder is None or _recorder.path != path:
+            if _recorder is None:
+                atexit.register(stop_recording)
+            else:
+                _recorder.save()
+            _recorder = SessionRecorder(path)
+        return _recorder
+
+
+def stop_recording():
+    """Save the active recording and stop recording; return its path."""
+    global _recorder
+    with _recorder_lock:
+        recorder, _recorder = _recorder, None
+    if recorder is None:
+        return None
+    try:
+        return recorder.save()
+    except OSError as e:
+        logger.warning("Could not save the IMAP recording to %s: %s", recorder.path, e)
+        return None
+
+
+def load_recording(path):
+    """Read a recording written by :class:`SessionRecorder`."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        recording = json.load(f)
+    if recording.get("format") != FORMAT:
+        raise ValueError(f"{path} is not an IMAP recording")
+    return recording
+
+
+def replay_messages(recording):
+    """Return ``{uid: raw}`` for every message seen by the recorded run."""
+    messages = {int(uid): raw.encode("latin-1") for uid, raw in recording["messages"].items()}
+    for uid, header in recording["headers"].items():
+        uid = int(uid)
+        if uid in messages:
+            continue
+        header = header.encode("latin-1")
+        missing = max(0, recording["sizes"].get(str(uid), len(header)) - len(header))
+        filler = _FILLER * (missing // len(_FILLER) + 1)
+        messages[uid] = header + filler[:missing]
+    return messages
+
+
+class ReplayLatency:
+    """Delay of each command during a replay, from the recorded timings.
+
+    A command sent with the same arguments as in the recording waits the
+    median of its recorded times; another one waits the median of its
+    command name (``"UID FETCH"``...). Times are multiplied by
+    ``time_scale``.
+    """
+
+    def __init__(self, calls, time_scale=1.0):
+        self.time_scale = time_scale
+        exact = {}
+        by_command = {}
+        for call in calls:
+            exact.setdefault(call["command"], []).append(call["elapsed"])
+            by_command.setdefault(self.command_name(call["command"]), []).append(call["elapsed"])
+        self.exact = {key: statistics.median(times) for key, times in exact.items()}
+        self.by_command = {key: statistics.median(times) for key, times in by_command.items()}
+
+    @staticmethod
+    def command_name(key):
+        words = key.split(" ", 2)
+        return " ".join(words[:2]).upper() if words[0].upper() == "UID" else words[0].upper()
+
+    def __call__(self, command, args=b""):
+        if not self.time_scale:
+            return 0.0
+        key = f"{command} {args.decode('utf-8', 'replace')}".strip()
+        seconds = self.exact.get(key)
+        if seconds is None:
+            seconds = self.by_command.get(command, 0.0)
+        return seconds * self.time_scale
+
+
+def replay_server(recording, time_scale=1.0, host="127.0.0.1", port=0):
+    """Return a ``FakeIMAPServer`` answering like the recorded server."""
+    from fake_imap import FakeIMAPServer
+
+    if not isinstance(recording, dict):
+        recording = load_recording(recording)
+    return FakeIMAPServer(
+        replay_messages(recording),
+        host,
+        port,
+        latency=ReplayLatency(recording["calls"], time_scale),
+        uidvalidity=recording.get("uidvalidity") or 1,
+        search_results=recording["searches"],
+    )
+
+
+def summary(recording):
+    """Return per-command counts, times and bytes of a recording."""
+    commands = {}
+    for call in recording["calls"]:
+        entry = commands.setdefault(
+            ReplayLatency.command_name(call["command"]), {"count": 0, "seconds": 0.0, "bytes": 0}
+        )
+        entry["count"] += 1
+        entry["seconds"] += call["elapsed"]
+        entry["bytes"] += call["bytes"]
+    sizes = sorted(len(raw) for raw in replay_messages(recording).values())
+    wall = max((call["start"] + call["elapsed"] for call in recording["calls"]), default=0.0)
+    return {
+        "sessions": recording["sessions"],
+        "wall_seconds": round(wall, 3),
+        "commands": commands,
+        "messages": len(sizes),
+        "full_messages": len(recording["messages"]),
+        "median_size": statistics.median(sizes) if sizes else 0,
+        "max_size": sizes[-1] if sizes else 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay or inspect a recorded IMAP run.")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    replay = subparsers.add_parser("replay", help="serve a recording until interrupted")
+    replay.add_argument("recording")
+    replay.add_argument("--host", default="127.0.0.1")
+    replay.add_argument("--port", type=int, default=1143)
+    replay.add_argument(
+        "--time-scale", type=float, default=1.0, help="multiply recorded times (0 answers at once)"
+    )
+    inspect = subparsers.add_parser("summary", help="print what a recording holds")
+    inspect.add_argument("recording")
+    args = parser.parse_args(argv)
+
+    recording = load_recording(args.recording)
+    if args.action == "summary":
+        info = summary(recording)
+        print(f"🎞️  {info['sessions']} sessions over {info['wall_seconds']}s")
+        for command, entry in sorted(info["commands"].items()):
+            print(
+                f"   {command:<12} {entry['count']:>6} calls  {entry['seconds']:9.3f}s  {entry['bytes']:>12} bytes"
+            )
+        print(
+            f"✉️  {info['messages']} messages ({info['full_messages']} complete), "
+            f"median {info['median_size']} bytes, largest {info['max_size']} bytes"
+        )
+        return
+
+    server = replay_server(recording, args.time_scale, args.host, args.port)
+    with server:
+        print(f"🎞️  Replaying {args.recording} on {server.address[0]}:{server.address[1]} (x{args.time_scale})")
+        print("   Point the extractors at it with:")
+        for key, value in server.env().items():
+            print(f"   export {key}={value}")
+        print("   export EMAIL_USER=replay@example.com EMAIL_PASS=replay")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print(f"\n📊 Commands served: {dict(server.command_counts)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+"""Shared IMAP helpers used by the email extractors.
+
+``fetch_messages`` downloads messages by UID in batches so that a whole
+chunk of emails costs a single ``UID FETCH`` round-trip instead of one
+request per message. ``IMAPSessionPool`` spreads such fetch jobs over
+several authenticated connections.
+"""
+
+import imaplib
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import yaml
+
+from imap_compress import enable_compression, transfer_counters
+
+logger = logging.getLogger(__name__)
+
+# ✅ Default server and number of UIDs requested per FETCH command
+IMAP_HOST = "imap.gmail.com"
+FETCH_CHUNK_SIZE = 200
+# ✅ Default number of IMAP sessions downloading in parallel (IMAP_WORKERS overrides it)
+IMAP_WORKERS = 4
+
+# Errors after which a connection can no longer be trusted
+TRANSIENT_ERRORS = (imaplib.IMAP4.abort, OSError, EOFError)
+
+# Headers needed to screen a message before downloading its body
+HEADER_FIELDS = "(SUBJECT DATE FROM MESSAGE-ID)"
+
+_UID_RE = re.compile(rb"UID (\d+)")
+_SIZE_RE = re.compile(rb"RFC822\.SIZE (\d+)")
+
+
+def chunked(items, size):
+    """Yield successive lists of at most ``size`` items."""
+    if size < 1:
+        raise ValueError("chunk size must be at least 1")
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def parse_fetch_items(data):
+    """Split a multi-message ``UID FETCH`` response into ``(uid, payload, meta)``.
+
+    ``imaplib`` returns one ``(header, literal)`` tuple per message followed
+    by a closing ``b")"``. ``meta`` is the response text surrounding the
+    literal, holding non-literal items such as ``RFC822.SIZE``. Some
+    servers (Gmail among them) place the ``UID`` item after the literal, in
+    which case it is read from that trailing element instead.
+    """
+    results = []
+    pending = None
+
+    for item in data or []:
+        if isinstance(item, tuple):
+            if pending is not None:
+                results.append(pending)
+            pending = [None, item[1], item[0]]
+        elif isinstance(item, bytes) and pending is not None:
+            pending[2] += item
+            results.append(pending)
+            pending = None
+
+    if pending is not None:
+        results.append(pending)
+
+    for entry in results:
+        match = _UID_RE.search(entry[2])
+        entry[0] = match.group(1) if match else None
+
+    return [tuple(entry) for entry in results if entry[0] is not None]
+
+
+def parse_fetch_response(data):
+    """Split a multi-message ``UID FETCH`` response into ``(uid, payload)`` pairs."""
+    return [(uid, payload) for uid, payload, _ in parse_fetch_items(data)]
+
+
+def search_uids(mail, criteria, stats=None):
+    """Run ``UID SEARCH`` and return the matching UIDs as a list of bytes."""
+    _, data = mail.uid("SEARCH", None, criteria)
+    if stats is not None:
+        stats["search_round_trips"] = stats.get("search_round_trips", 0) + 1
+    return data[0].split() if data and data[0] else []
+
+
+def try_search_uids(mail, criteria, stats=None):
+    """Like :func:`search_uids`, but return ``None`` if the server rejects the query.
+
+    Servers answer ``NO`` or ``BAD`` to search keys they do not support;
+    connection errors are still raised.
+    """
+    try:
+        typ, data = mail.uid("SEARCH", None, criteria)
+    except imaplib.IMAP4.abort:
+        raise
+    except imaplib.IMAP4.error:
+        typ, data = "BAD", None
+    if stats is not None:
+        stats["search_round_trips"] = stats.get("search_round_trips", 0) + 1
+    if typ != "OK":
+        return None
+    return data[0].split() if data and data[0] else []
+
+
+def fetch_messages(mail, uids, chunk_size=FETCH_CHUNK_SIZE, parts="(RFC822)", stats=None):
+    """Yield ``(uid, payload)`` for ``uids`` using one FETCH per chunk.
+
+    Parameters
+    ----------
+    mail : imaplib.IMAP4
+        Authenticated connection with a mailbox selected.
+    uids : list[bytes]
+        Message UIDs as returned by :func:`search_uids`.
+    chunk_size : int
+        Maximum number of UIDs sent in a single ``UID FETCH`` command.
+    parts : str
+        FETCH data items to request.
+    stats : dict, optional
+        Updated in place with ``fetch_round_trips`` and ``messages_fetched``.
+    """
+    for chunk in chunked(uids, chunk_size):
+        uid_set = b",".join(chunk).decode()
+        _, data = mail.uid("FETCH", uid_set, parts)
+        messages = parse_fetch_response(data)
+
+        if stats is not None:
+            stats["fetch_round_trips"] = stats.get("fetch_round_trips", 0) + 1
+            stats["messages_fetched"] = stats.get("messages_fetched", 0) + len(messages)
+
+        for uid, payload in messages:
+            yield uid, payload
+
+
+def get_uidvalidity(mail, mailbox="Inbox"):
+    """Return the UIDVALIDITY of the selected mailbox as an integer.
+
+    ``SELECT`` already reports it as a response code, so the cached value is
+    used when present and ``STATUS`` is only issued as a fallback.
+    """
+    _, data = mail.response("UIDVALIDITY")
+    if not data or data[0] is None:
+        _, data = mail.status(mailbox, "(UIDVALIDITY)")
+        match = re.search(rb"UIDVALIDITY (\d+)", data[0])
+        return int(match.group(1))
+    return int(data[-1])
+
+
+def imap_settings():
+    """Return ``(host, port, use_ssl)`` for the IMAP server to connect to.
+
+    Defaults to Gmail over SSL; ``IMAP_HOST``, ``IMAP_PORT`` and ``IMAP_SSL``
+    (``0`` to disable) point the extractors at another server, such as the
+    local stand-in in ``fake_imap.py``.
+    """
+    host = os.getenv("IMAP_HOST", IMAP_HOST)
+    port = os.getenv("IMAP_PORT")
+    use_ssl = os.getenv("IMAP_SSL", "1").lower() not in ("0", "false", "no")
+    if port:
+        port = int(port)
+    else:
+        port = imaplib.IMAP4_SSL_PORT if use_ssl else imaplib.IMAP4_PORT
+    return host, port, use_ssl
+
+
+def load_credentials():
+    """Return ``(user, password)`` from the environment or ``credentials.yml``."""
+    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    credentials_path = os.path.join(base_dir, "credentials.yml")
+
+    user = os.getenv("EMAIL_USER")
+    password = os.getenv("EMAIL_PASS")
+
+    if os.path.exists(credentials_path):
+        with open(credentials_path, "r", encoding="utf-8") as f:
+            creds = yaml.safe_load(f)
+            user = user or creds.get("user")
+            password = password or creds.get("password")
+
+    if not user or not password:
+        raise ValueError(
+            "Email credentials not provided. Set EMAIL_USER and EMAIL_PASS "
+            "environment variables or update credentials.yml"
+        )
+    return user, password
+
+
+def compression_enabled():
+    """Whether sessions negotiate ``COMPRESS=DEFLATE`` (``IMAP_COMPRESS=0`` disables it)."""
+    return os.getenv("IMAP_COMPRESS", "1").lower() not in ("0", "false", "no")
+
+
+def imap_workers():
+    """Return the number of IMAP sessions the extractors download with.
+
+    ``IMAP_WORKERS`` overrides the default of :data:`IMAP_WORKERS`; Gmail
+    accepts about 15 simultaneous connections per account.
+    """
+    value = os.getenv("IMAP_WORKERS")
+    if not value:
+        return IMAP_WORKERS
+    workers = int(value)
+    if workers < 1:
+        raise ValueError("IMAP_WORKERS must be at least 1")
+    return workers
+
+
+def keyword_search_enabled():
+    """Whether bank keywords narrow the IMAP SEARCH (opt-in with ``IMAP_KEYWORD_SEARCH=1``).
+
+    Servers match ``TEXT`` by words (Gmail) rather than by the substrings
+    ``is_transaction_email`` looks for, so the narrowing is off by default.
+    """
+    return os.getenv("IMAP_KEYWORD_SEARCH", "0").lower() in ("1", "true", "yes")
+
+
+def open_session(user, password, mailbox="Inbox", compress=None):
+    """Connect to the configured server, log in and select ``mailbox``.
+
+    The connection is compressed when the server supports
+    ``COMPRESS=DEFLATE``, unless ``compress`` (default:
+    :func:`compression_enabled`) is false. With ``IMAP_RECORD`` set, the
+    session's commands are recorded (see ``imap_recorder``).
+    """
+    host, port, use_ssl = imap_settings()
+    if use_ssl:
+        mail = imaplib.IMAP4_SSL(host, port)
+    else:
+        mail = imaplib.IMAP4(host, port)
+    mail.login(user, password)
+    if os.getenv("IMAP_RECORD"):
+        # Attached after LOGIN so credentials are never recorded
+        from imap_recorder import active_recorder
+
+        active_recorder().attach(mail)
+    if compress is None:
+        compress = compression_enabled()
+    if compress:
+        enable_compression(mail)
+    mail.select(mailbox)
+    return mail
+
+
+def _logout_quietly(session):
+    try:
+        session.logout()
+    except Exception:
+        pass
+
+
+class IMAPSessionPool:
+    """Bounded pool of authenticated IMAP sessions shared by worker threads.
+
+    ``connect`` is a callable returning a logged-in session with the mailbox
+    selected. At most ``size`` sessions are opened, lazily. A session that
+    fails with a connection error is discarded and the job is retried on a
+    fresh one, up to ``retries`` times, waiting ``backoff`` seconds before
+    the first retry and twice as long before each following one (at most
+    ``max_backoff``).
+
+    ``transfer`` adds up the byte counters of the compressed sessions the
+    pool has closed (see ``imap_compress.DeflateStream.counters``).
+    """
+
+    def __init__(self, connect, size=4, retries=3, backoff=0.5, max_backoff=30.0):
+        if size < 1:
+            raise ValueError("pool size must be at least 1")
+        self.size = size
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.reconnects = 0
+        self.transfer = {}
+        self._connect = connect
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._sessions = []
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            session = self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._sessions.append(session)
+        return session
+
+    def _count_transfer(self, session):
+        counters = transfer_counters(session)
+        if counters:
+            with self._lock:
+                for key, value in counters.items():
+                    self.transfer[key] = self.transfer.get(key, 0) + value
+
+    def _release(self, session, broken=False):
+        if broken:
+            with self._lock:
+                if session in self._sessions:
+                    self._sessions.remove(session)
+            self._count_transfer(session)
+            try:
+                session.logout()
+            except Exception:
+                pass
+        else:
+            self._idle.put(session)
+        self._slots.release()
+
+    @contextmanager
+    def session(self):
+        """Borrow a session for the duration of a ``with`` block."""
+        session = self._acquire()
+        broken = False
+        try:
+            yield session
+        except TRANSIENT_ERRORS:
+            broken = True
+            raise
+        finally:
+            self._release(session, broken)
+
+    def run(self, job, *args):
+        """Call ``job(session, *args)``, reconnecting on connection errors."""
+        attempt = 0
+        while True:
+            try:
+                with self.session() as session:
+                    return job(session, *args)
+            except TRANSIENT_ERRORS as e:
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                with self._lock:
+                    self.reconnects += 1
+                delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+                logger.warning("IMAP session failed (%s), reconnecting in %.1fs", e, delay)
+                time.sleep(delay)
+
+    def map(self, job, items):
+        """Run ``job(session, item)`` for every item, yielding results in order.
+
+        At most two jobs per session are in flight or waiting to be
+        consumed, so a slow consumer keeps memory bounded instead of the
+        whole result set piling up.
+        """
+        items = list(items)
+        if self.size == 1 or len(items) <= 1:
+            for item in items:
+                yield self.run(job, item)
+            return
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            pending = deque()
+            remaining = iter(items)
+            try:
+                for item in remaining:
+                    pending.append(executor.submit(self.run, job, item))
+                    if len(pending) >= 2 * self.size:
+                        break
+                while pending:
+                    result = pending.popleft().result()
+                    for item in remaining:
+                        pending.append(executor.submit(self.run, job, item))
+                        break
+                    yield result
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def close(self):
+        """Log out every session opened by the pool, concurrently."""
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        if not sessions:
+            return
+        for session in sessions:
+            self._count_transfer(session)
+        with ThreadPoolExecutor(max_workers=len(sessions)) as executor:
+            list(executor.map(_logout_quietly, sessions))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _fetch_chunk(mail, uids):
+    chunk_stats = {}
+    messages = list(fetch_messages(mail, uids, len(uids), stats=chunk_stats))
+    return messages, chunk_stats
+
+
+def _fetch_header_chunk(mail, uids):
+    _, data = mail.uid(
+        "FETCH", b",".join(uids).decode(), f"(RFC822.SIZE BODY.PEEK[HEADER.FIELDS {HEADER_FIELDS}])"
+    )
+    headers = []
+    for uid, payload, meta in parse_fetch_items(data):
+        size = _SIZE_RE.search(meta)
+        headers.append((uid, int(size.group(1)) if size else 0, payload))
+    return headers
+
+
+def fetch_headers_parallel(pool, uids, chunk_size=FETCH_CHUNK_SIZE, stats=None):
+    """Yield ``(uid, size, header_bytes)`` without downloading message bodies.
+
+    Only the ``HEADER_FIELDS`` headers are requested, with ``BODY.PEEK`` so
+    the messages are not marked as read, together with ``RFC822.SIZE`` so
+    callers can tell how many bytes skipping the body saves.
+    """
+    if not uids:
+        return
+    chunk_size = max(1, min(chunk_size, -(-len(uids) // pool.size)))
+    for headers in pool.map(_fetch_header_chunk, chunked(uids, chunk_size)):
+        if stats is not None:
+            stats["header_round_trips"] = stats.get("header_round_trips", 0) + 1
+            stats["header_bytes"] = stats.get("header_bytes", 0) + sum(len(h[2]) for h in headers)
+        yield from headers
+
+
+def search_all_parallel(pool, criteria_list, stats=None, allow_rejected=False):
+    """Run one ``UID SEARCH`` per criteria string concurrently, in order.
+
+    With ``allow_rejected``, a query the server refuses gives ``None``
+    instead of an error, so callers can fall back to a simpler search.
+    """
+    results = []
+    for uids in pool.map(try_search_uids if allow_rejected else search_uids, criteria_list):
+        results.append(uids)
+        if stats is not None:
+            stats["search_round_trips"] = stats.get("search_round_trips", 0) + 1
+    return results
+
+
+def fetch_groups_parallel(pool, groups, chunk_size=FETCH_CHUNK_SIZE, stats=None):
+    """Fetch several ``(key, uids)`` groups with every chunk spread over ``pool``.
+
+    Yields ``(key, uid, payload)`` in group order then UID order, whatever
+    the pool size. Chunks are shrunk so that every session gets work when
+    there are fewer than ``pool.size * chunk_size`` UIDs in total.
+    """
+    total = sum(len(uids) for _, uids in groups)
+    if not total:
+        return
+    chunk_size = max(1, min(chunk_size, -(-total // pool.size)))
+    jobs = [(key, chunk) for key, uids in groups for chunk in chunked(uids, chunk_size)]
+
+    results = pool.map(_fetch_chunk, [chunk for _, chunk in jobs])
+    for (key, _), (messages, chunk_stats) in zip(jobs, results):
+        if stats is not None:
+            for name, value in chunk_stats.items():
+                stats[name] = stats.get(name, 0) + value
+        for uid, payload in messages:
+            yield key, uid, payload
+
+
+def fetch_messages_parallel(pool, uids, chunk_size=FETCH_CHUNK_SIZE, stats=None):
+    """Like :func:`fetch_messages`, spreading UID chunks over ``pool``."""
+    for _, uid, payload in fetch_groups_parallel(pool, [(None, uids)], chunk_size, stats):
+        yield uid, payload
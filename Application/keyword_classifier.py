@@ -0,0 +1,206 @@
+"""Match the bank keywords of an email against its lowered text, once.
+
+Deciding whether an email is a transaction means looking for the
+``keywords`` and ``exclude_keywords`` phrases of its bank profile in its
+subject and body, case-insensitively. The loops this module replaces
+lowered the subject and the body again for every phrase.
+``KeywordClassifier`` lowers each text once per email, then applies the
+same rules: an exclude keyword always wins, otherwise the first keyword in
+``config.yml`` order is reported.
+
+A profile's phrases can be matched with an Aho-Corasick automaton, which
+reads each character of the text once whatever the number of phrases. The
+C automaton of the optional ``pyahocorasick`` package is used when it is
+installed. The pure-Python ``Automaton`` below pays the interpreter's cost
+per character and only beats one C-level ``in`` per phrase past roughly
+``AUTOMATON_MIN_KEYWORDS`` phrases per profile (see
+``benchmarks/bench_keyword_classifier.py``); smaller profiles are checked
+with ``in``, stopping at the first decisive phrase.
+"""
+
+from collections import deque
+
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick is optional
+    ahocorasick = None
+
+AUTOMATON_MIN_KEYWORDS = 100
+
+
+class Automaton:
+    """Pure-Python Aho-Corasick automaton over a set of phrases."""
+
+    def __init__(self, phrases):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for phrase in phrases:
+            self._add(phrase)
+        self._link()
+
+    def _add(self, phrase):
+        state = 0
+        for char in phrase:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._goto[state][char] = nxt
+            state = nxt
+        self._out[state] = self._out[state] + (phrase,)
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text):
+        """Return the set of phrases occurring in ``text``."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class _PyAhoCorasick:
+    def __init__(self, phrases):
+        self._automaton = ahocorasick.Automaton()
+        for phrase in phrases:
+            self._automaton.add_word(phrase, phrase)
+        self._automaton.make_automaton()
+
+    def find(self, text):
+        return {phrase for _, phrase in self._automaton.iter(text)} if text else set()
+
+
+ENGINES = ("pyahocorasick", "automaton", "substring")
+
+
+def _pick_engine(phrase_count, engine=None):
+    if engine is None:
+        if ahocorasick is not None:
+            return "pyahocorasick"
+        return "automaton" if phrase_count >= AUTOMATON_MIN_KEYWORDS else "substring"
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {', '.join(ENGINES)}")
+    if engine == "pyahocorasick" and ahocorasick is None:
+        raise RuntimeError("the pyahocorasick engine requires the pyahocorasick package")
+    return engine
+
+
+class _ProfileMatcher:
+    """Keyword rules of one bank profile over already lowered texts."""
+
+    def __init__(self, bank_cfg, engine=None):
+        self.keywords = [(kw.lower(), kw) for kw in bank_cfg.get("keywords", [])]
+        self.excludes = [kw.lower() for kw in bank_cfg.get("exclude_keywords", [])]
+        phrases = sorted({kw for kw, _ in self.keywords} | set(self.excludes))
+        self.engine = _pick_engine(len(phrases), engine)
+        self._automaton = None
+        if self.engine == "pyahocorasick":
+            self._automaton = _PyAhoCorasick(phrases)
+        elif self.engine == "automaton":
+            self._automaton = Automaton(phrases)
+
+    def match(self, texts):
+        """Return the keyword claiming the email, or ``None``."""
+        if self._automaton is None:
+            for ex in self.excludes:
+                if any(ex in text for text in texts):
+                    return None
+            for lowered, keyword in self.keywords:
+                if any(lowered in text for text in texts):
+                    return keyword
+            return None
+
+        found = set()
+        for text in texts:
+            found |= self._automaton.find(text)
+        if any(ex in found for ex in self.excludes):
+            return None
+        for lowered, keyword in self.keywords:
+            if lowered in found:
+                return keyword
+        return None
+
+
+class KeywordClassifier:
+    """Keyword rules of every bank profile in a configuration."""
+
+    def __init__(self, config, engine=None):
+        self.profiles = {}
+        self._bank_by_sender = {}
+        for bank_name, bank_cfg in config.get("banks", {}).items():
+            self.profiles[bank_name] = _ProfileMatcher(bank_cfg, engine)
+            sender = (bank_cfg.get("sender") or "").lower()
+            # Like the loops this replaces, the first profile of a sender decides
+            self._bank_by_sender.setdefault(sender, bank_name)
+
+    def classify(self, sender, subject, content):
+        """Return ``(is_transaction, bank_name, keyword)`` for an email."""
+        bank_name = self._bank_by_sender.get(sender.lower())
+        if bank_name is None:
+            return False, None, None
+        keyword = self.profiles[bank_name].match((subject.lower(), content.lower()))
+        if keyword is None:
+            return False, None, None
+        return True, bank_name, keyword
+
+    def claims(self, bank_names, subject, content):
+        """Return ``[(bank_name, keyword), ...]`` for the profiles claiming an email."""
+        texts = ((subject or "").lower(), (content or "").lower())
+        claims = []
+        for bank_name in bank_names:
+            keyword = self.profiles[bank_name].match(texts)
+            if keyword is not None:
+                claims.append((bank_name, keyword))
+        return claims
+
+
+_classifiers = {}
+
+
+def _rules_key(config):
+    # Everything a KeywordClassifier reads from a configuration, hashable
+    return tuple(
+        (
+            bank_name,
+            bank_cfg.get("sender"),
+            tuple(bank_cfg.get("keywords", ())),
+            tuple(bank_cfg.get("exclude_keywords", ())),
+        )
+        for bank_name, bank_cfg in config.get("banks", {}).items()
+    )
+
+
+def classifier_for(config):
+    """Return the ``KeywordClassifier`` of a configuration dictionary.
+
+    Classifiers are cached by the senders and keywords of the profiles, so
+    the copies ``bank_rules.load_config`` returns share one classifier, and
+    a configuration whose keywords were edited gets a new one.
+    """
+    key = _rules_key(config)
+    classifier = _classifiers.get(key)
+    if classifier is None:
+        if len(_classifiers) >= 8:
+            _classifiers.clear()
+        classifier = _classifiers[key] = KeywordClassifier(config)
+    return classifier
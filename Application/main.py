@@ -1,60 +1,159 @@
 import sys
 import os
 import json
+import argparse
+from contextlib import nullcontext
 
 # ✅ Add the root folder to Python’s module search path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from Database.Insert import insert_transaction  # ✅ Now it should work!
+from Database.TransactionStore import TransactionStore  # ✅ Now it should work!
+from Database.Backfill import BackfillCheckpoint
 from datetime import datetime
-from extracteur import fetch_emails
-from traitement import extract_transaction_data
+from extracteur import iter_emails
+from extraction_pool import iter_extracted
+from imap_utils import TRANSIENT_ERRORS, imap_workers, keyword_search_enabled
+from message_cache import MessageCache
+from message_sources import open_source
+import pattern_stats
+
+# ✅ Opt-in (--keyword-search or IMAP_KEYWORD_SEARCH=1): let the server skip emails
+# no bank keyword matches, once its TEXT search is known to agree with local filtering
+KEYWORD_SEARCH = keyword_search_enabled()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch bank alert emails and store their transactions.")
+    parser.add_argument("start_date", nargs="?", help="DD-Mon-YYYY, only new emails when omitted")
+    parser.add_argument("end_date", nargs="?", help="DD-Mon-YYYY (exclusive), today when omitted")
+    parser.add_argument("--offline", action="store_true", help="replay the local message cache")
+    parser.add_argument("--source", help="mbox file, Maildir or .eml directory to read instead of IMAP (default: imap)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="processes extracting transactions (1: in this process, 0: one per core)",
+    )
+    parser.add_argument(
+        "--imap-workers",
+        type=int,
+        default=None,
+        help="IMAP sessions downloading emails in parallel (default: IMAP_WORKERS or 4)",
+    )
+    parser.add_argument(
+        "--keyword-search",
+        action="store_true",
+        default=KEYWORD_SEARCH,
+        help="narrow the IMAP SEARCH with each bank's keywords",
+    )
+    args = parser.parse_args(argv)
+    if args.imap_workers is None:
+        args.imap_workers = imap_workers()
+    elif args.imap_workers < 1:
+        parser.error("--imap-workers must be at least 1")
+    return args
 
 def main():
     """
     Orchestrates the workflow:
-    1. Fetch the email body and received date/time.
+    1. Fetch the email body and received date/time (only new emails when no
+       start date is given).
     2. Extract transaction details.
     3. Store the extracted data in the database.
+
+    With ``--offline`` the emails are replayed from the local message cache
+    instead of being downloaded, and ``--source`` reads them from a local
+    mbox file (e.g. a Google Takeout export), Maildir or ``.eml`` directory.
+    ``--workers`` spreads the extraction over several processes for large
+    backfills; transactions are still stored in order, by this process.
+    ``--imap-workers`` sets the number of IMAP sessions downloading emails.
     """
-    start_date = sys.argv[1] if len(sys.argv) > 1 else None
-    end_date = sys.argv[2] if len(sys.argv) > 2 else None
+    args = parse_args()
+    offline = args.offline
+    start_date = args.start_date
+    end_date = args.end_date
+    # ✅ "--source imap" is the regular IMAP path, with its incremental sync and checkpoints
+    location = None if args.source == "imap" else args.source
+    source = open_source(location) if location else None
 
+    # ✅ Without an explicit range, only fetch emails newer than the last run
+    incremental = start_date is None and not offline and source is None
     if start_date is None:
         start_date = "01-Jan-1970"
     if end_date is None:
         end_date = datetime.utcnow().strftime("%d-%b-%Y")
 
-    emails = fetch_emails(start_date, end_date)
+    fetch_stats = {}
+    processed = 0
+    checkpoint = None
+    # ✅ Every downloaded email is also stored in the local cache for --offline runs
+    # ✅ One database connection for the whole run, shared by the duplicate check and the inserts
+    # ✅ The local source is closed with them
+    with MessageCache() as cache, TransactionStore() as store, source or nullcontext():
+        # ✅ Date-range backfills are checkpointed so an interrupted run resumes where it stopped
+        if not incremental and not offline and source is None:
+            # ✅ Deferred: a message only counts as done once its transactions are stored, and
+            # they are committed together with its progress, on the store's connection
+            checkpoint = BackfillCheckpoint(deferred=True, store=store)
 
-    if not emails:
-        print("❌ No transaction email found.")
-        return
+        # ✅ Emails are streamed: each one is extracted and stored as soon as it arrives
+        emails = iter_emails(
+            start_date,
+            end_date,
+            stats=fetch_stats,
+            incremental=incremental,
+            workers=args.imap_workers,
+            cache=cache,
+            offline=offline,
+            source=source,
+            checkpoint=checkpoint,
+            keyword_search=args.keyword_search,
+        )
+        # ✅ Try each bank's regex variants in the order learned by previous runs
+        pattern_stats.prime()
+        try:
+            for email, ordered_data in iter_extracted(emails, workers=args.workers, store=store):
+                print(json.dumps(ordered_data, indent=4))
+                result = store.insert(ordered_data, commit=checkpoint is None)
+                if checkpoint is not None:
+                    checkpoint.add_inserted(result.get("transaction_id"))
+                    checkpoint.acknowledge()
+                processed += 1
+        except TRANSIENT_ERRORS as e:
+            print(f"❌ IMAP connection lost after {processed} emails: {e}")
+            if checkpoint is not None:
+                print("💾 Progress was saved; run the same command again to resume.")
+            sys.exit(1)
+        finally:
+            pattern_stats.save()
 
-    if len(emails) == 1:
-        email = emails[0]
-        ordered_data = extract_transaction_data(
-            email,
-            email.get("sender"),
-            email.get("subject"),
-            email.get("email_datetime"),
+        if checkpoint is not None and checkpoint.resumed:
+            print(f"♻️ Resumed an interrupted run ({len(checkpoint.inserted_ids())} transactions inserted in total)")
+
+    if source is not None:
+        print(
+            f"📂 {fetch_stats.get('messages_matched', 0)} of {fetch_stats.get('messages_read', 0)} "
+            f"emails read from {location} come from a configured bank"
         )
-        print("✅ Extracted Data:")
-        print(json.dumps(ordered_data, indent=4))
-        insert_transaction(ordered_data)
-        print("✅ Transaction successfully inserted into the database.")
+    elif offline:
+        print(f"💾 {fetch_stats.get('messages_read', 0)} emails replayed from the local cache")
     else:
-        print(f"📧 Processing {len(emails)} emails...")
-        for email in emails:
-            ordered_data = extract_transaction_data(
-                email,
-                email.get("sender"),
-                email.get("subject"),
-                email.get("email_datetime"),
+        print(
+            f"📡 {fetch_stats.get('messages_fetched', 0)} emails fetched in "
+            f"{fetch_stats.get('fetch_round_trips', 0)} FETCH round-trips "
+            f"({fetch_stats.get('downloads_saved', 0)} duplicate downloads avoided, "
+            f"{fetch_stats.get('keyword_search_skipped', 0)} emails without bank keywords skipped)"
+        )
+        if fetch_stats.get("bytes_in_compressed"):
+            print(
+                f"🗜️ COMPRESS=DEFLATE: {fetch_stats['bytes_in_compressed'] / 1024:.0f} KB received "
+                f"for {fetch_stats['bytes_in'] / 1024:.0f} KB of IMAP responses"
             )
-            print(json.dumps(ordered_data, indent=4))
-            insert_transaction(ordered_data)
-        print("✅ All transactions successfully inserted into the database.")
+
+    if not processed:
+        print("❌ No transaction email found.")
+        return
+
+    print(f"✅ {processed} transactions successfully inserted into the database.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,197 @@
+"""Local on-disk cache of raw email messages.
+
+Every message downloaded by ``fetch_emails`` can be written through a
+``MessageCache`` so that extraction rules can later be re-tested against
+the whole history without contacting the IMAP server (``--offline``).
+
+Messages are content-addressed: each raw RFC822 message is stored once,
+compressed, under the SHA-256 of its bytes. A small SQLite index next to
+the blobs maps each digest to its Message-ID, the configured sender it was
+searched for and its date, which is what offline replay filters on.
+"""
+
+import hashlib
+import os
+import sqlite3
+import zlib
+from datetime import datetime
+from email.parser import BytesHeaderParser
+from email.utils import parsedate_to_datetime
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, zlib is always available
+    zstandard = None
+
+DEFAULT_CACHE_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "Database", "message_cache")
+)
+
+
+def _default_cache_dir():
+    return os.getenv("MESSAGE_CACHE_DIR", DEFAULT_CACHE_DIR)
+
+
+def _compress(raw, codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(raw)
+    return zlib.compress(raw, 6)
+
+
+def _decompress(blob, codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("message cached with zstd but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
+
+
+def _parse_imap_date(value):
+    """Turn an IMAP ``DD-Mon-YYYY`` date into ISO ``YYYY-MM-DD``."""
+    return datetime.strptime(value, "%d-%b-%Y").date().isoformat()
+
+
+def _message_headers(raw):
+    headers = BytesHeaderParser().parsebytes(raw)
+    message_id = (headers.get("Message-ID") or "").strip() or None
+    try:
+        date = parsedate_to_datetime(headers.get("Date")).date().isoformat()
+    except (TypeError, ValueError, IndexError):
+        date = None
+    return message_id, date
+
+
+class MessageCache:
+    """Compressed, content-addressed store of raw messages with a SQLite index.
+
+    Blobs live in ``<root>/objects/<2 hex>/<62 hex>`` and are compressed with
+    zstd when the ``zstandard`` package is installed, zlib otherwise. The
+    codec is recorded per message, so both can be read back.
+    """
+
+    def __init__(self, root=None, codec=None):
+        self.root = root or _default_cache_dir()
+        self.codec = codec or ("zstd" if zstandard is not None else "zlib")
+        if self.codec == "zstd" and zstandard is None:
+            raise RuntimeError("zstd compression requires the zstandard package")
+        os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self.root, "index.db"))
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                digest TEXT PRIMARY KEY,
+                message_id TEXT,
+                sender TEXT,
+                date TEXT,
+                size INTEGER NOT NULL,
+                codec TEXT NOT NULL,
+                cached_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_messages_sender_date ON messages(sender, date)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_messages_message_id ON messages(message_id)"
+        )
+
+    def _blob_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], digest[2:])
+
+    def put(self, raw_email, sender=None):
+        """Store a raw message and return its SHA-256 digest.
+
+        Storing the same bytes again is a no-op apart from filling in the
+        sender if it was unknown.
+        """
+        digest = hashlib.sha256(raw_email).hexdigest()
+        row = self._conn.execute(
+            "SELECT sender FROM messages WHERE digest = ?", (digest,)
+        ).fetchone()
+        if row is not None:
+            if row[0] is None and sender:
+                self._conn.execute(
+                    "UPDATE messages SET sender = ? WHERE digest = ?", (sender, digest)
+                )
+            return digest
+
+        path = self._blob_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_compress(raw_email, self.codec))
+        os.replace(tmp_path, path)
+
+        message_id, date = _message_headers(raw_email)
+        self._conn.execute(
+            """
+            INSERT INTO messages (digest, message_id, sender, date, size, codec)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (digest, message_id, sender, date, len(raw_email), self.codec),
+        )
+        return digest
+
+    def get(self, digest):
+        """Return the raw bytes of a cached message, or ``None``."""
+        row = self._conn.execute(
+            "SELECT codec FROM messages WHERE digest = ?", (digest,)
+        ).fetchone()
+        if row is None:
+            return None
+        with open(self._blob_path(digest), "rb") as f:
+            return _decompress(f.read(), row[0])
+
+    def get_by_message_id(self, message_id):
+        """Return the raw bytes of the message with this Message-ID, or ``None``."""
+        row = self._conn.execute(
+            "SELECT digest FROM messages WHERE message_id = ? ORDER BY rowid LIMIT 1",
+            (message_id,),
+        ).fetchone()
+        return self.get(row[0]) if row else None
+
+    def iter_messages(self, sender=None, start_date=None, end_date=None):
+        """Yield ``(digest, sender, raw_email)`` in the order messages were cached.
+
+        ``start_date`` (inclusive) and ``end_date`` (exclusive) use the IMAP
+        ``DD-Mon-YYYY`` format, like ``SINCE``/``BEFORE``, and are compared
+        with the message's Date header. Messages without a usable Date
+        header are always included.
+        """
+        query = "SELECT digest, sender, codec FROM messages WHERE 1 = 1"
+        params = []
+        if sender is not None:
+            query += " AND sender = ?"
+            params.append(sender)
+        if start_date:
+            query += " AND (date IS NULL OR date >= ?)"
+            params.append(_parse_imap_date(start_date))
+        if end_date:
+            query += " AND (date IS NULL OR date < ?)"
+            params.append(_parse_imap_date(end_date))
+        query += " ORDER BY rowid"
+
+        for digest, msg_sender, codec in self._conn.execute(query, params).fetchall():
+            with open(self._blob_path(digest), "rb") as f:
+                yield digest, msg_sender, _decompress(f.read(), codec)
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def __contains__(self, digest):
+        return self._conn.execute(
+            "SELECT 1 FROM messages WHERE digest = ?", (digest,)
+        ).fetchone() is not None
+
+    def commit(self):
+        """Persist index rows added since the last commit."""
+        self._conn.commit()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
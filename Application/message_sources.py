@@ -0,0 +1,248 @@
+"""Pluggable sources of raw email messages.
+
+The extractors only need the raw bytes of the messages sent by the senders
+configured in ``config.yml`` within a date range. A ``MessageSource``
+provides exactly that, whether the messages come from the IMAP server
+(``IMAPSource``), a local mbox file such as a Google Takeout export
+(``MboxSource``), a Maildir (``MaildirSource``), a directory of ``.eml``
+files (``EmlDirectorySource``) or the local message cache
+(``CacheSource``). Local sources are read in a single streaming pass, so
+years of alerts can be ingested at disk speed.
+
+Every source yields ``(sender, key, raw_email)`` tuples, where ``sender``
+is the configured sender the message belongs to and ``key`` identifies the
+message within the source (an IMAP UID, a file path, an mbox offset...).
+"""
+
+import os
+import re
+from abc import ABC, abstractmethod
+from datetime import datetime
+from email.parser import BytesHeaderParser
+from email.utils import parsedate_to_datetime
+
+from imap_utils import (
+    FETCH_CHUNK_SIZE,
+    IMAPSessionPool,
+    fetch_groups_parallel,
+    load_credentials,
+    open_session,
+    search_all_parallel,
+)
+
+# mboxrd escaping: ">From " and ">>From " lines lose their first ">"
+_FROM_ESCAPE_RE = re.compile(rb"^>(?=>*From )")
+
+
+def _imap_date(value):
+    return datetime.strptime(value, "%d-%b-%Y").date()
+
+
+def in_date_range(date_header, start_date=None, end_date=None):
+    """Check a Date header against IMAP-style ``SINCE``/``BEFORE`` dates.
+
+    ``start_date`` is inclusive and ``end_date`` exclusive, both formatted
+    as ``DD-Mon-YYYY``. Messages without a usable Date header are kept.
+    """
+    if not start_date and not end_date:
+        return True
+    try:
+        day = parsedate_to_datetime(date_header).date()
+    except (TypeError, ValueError, IndexError):
+        return True
+    if start_date and day < _imap_date(start_date):
+        return False
+    if end_date and day >= _imap_date(end_date):
+        return False
+    return True
+
+
+def match_sender(from_header, senders):
+    """Return the configured sender found in a From header, or ``None``.
+
+    Like an IMAP ``FROM`` search, a sender matches when it appears anywhere
+    in the header, case-insensitively.
+    """
+    from_header = (from_header or "").lower()
+    for sender in senders:
+        if sender.lower() in from_header:
+            return sender
+    return None
+
+
+class MessageSource(ABC):
+    """Base class of every message source."""
+
+    @abstractmethod
+    def iter_messages(self, senders, start_date=None, end_date=None, stats=None):
+        """Yield ``(sender, key, raw_email)`` for messages from ``senders``."""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LocalSource(MessageSource):
+    """Source reading raw messages from local files in a single pass.
+
+    Subclasses implement ``iter_raw`` and this class filters the messages
+    on their From and Date headers, without parsing the bodies.
+    """
+
+    _headers = BytesHeaderParser()
+
+    @abstractmethod
+    def iter_raw(self):
+        """Yield ``(key, raw_email)`` for every message in the source."""
+
+    def iter_messages(self, senders, start_date=None, end_date=None, stats=None):
+        senders = list(senders)
+        for key, raw_email in self.iter_raw():
+            if stats is not None:
+                stats["messages_read"] = stats.get("messages_read", 0) + 1
+            headers = self._headers.parsebytes(raw_email, headersonly=True)
+            sender = match_sender(headers.get("From"), senders)
+            if sender is None or not in_date_range(headers.get("Date"), start_date, end_date):
+                continue
+            yield sender, key, raw_email
+
+
+class MboxSource(LocalSource):
+    """Stream the messages of an mbox file, such as a Google Takeout export.
+
+    The file is read line by line, so memory use does not depend on its
+    size. Messages are split on ``From `` lines that start the file or
+    follow a blank line. The ``From `` separator line is dropped and body
+    lines escaped as ``>From `` (as Gmail and :mod:`mailbox` write them)
+    lose one ``>``, following the mboxrd convention.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def iter_raw(self):
+        with open(self.path, "rb") as f:
+            offset = None
+            lines = []
+            previous_blank = True
+            position = 0
+            for line in f:
+                if previous_blank and line.startswith(b"From "):
+                    if offset is not None:
+                        yield offset, _strip_separator(lines)
+                    offset, lines = position, []
+                elif offset is not None:
+                    lines.append(_FROM_ESCAPE_RE.sub(b"", line, count=1))
+                previous_blank = line in (b"\n", b"\r\n")
+                position += len(line)
+            if offset is not None:
+                yield offset, _strip_separator(lines)
+
+
+def _strip_separator(lines):
+    # The blank line before the next "From " belongs to the mbox format
+    if lines and lines[-1] in (b"\n", b"\r\n"):
+        lines = lines[:-1]
+    return b"".join(lines)
+
+
+class MaildirSource(LocalSource):
+    """Read the messages of a Maildir (``cur`` then ``new``), by file name."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def iter_raw(self):
+        for folder in ("cur", "new"):
+            directory = os.path.join(self.path, folder)
+            if not os.path.isdir(directory):
+                continue
+            for name in sorted(os.listdir(directory)):
+                path = os.path.join(directory, name)
+                if name.startswith(".") or not os.path.isfile(path):
+                    continue
+                with open(path, "rb") as f:
+                    yield path, f.read()
+
+
+class EmlDirectorySource(LocalSource):
+    """Read every ``.eml`` file below a directory, in path order."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def iter_raw(self):
+        paths = []
+        for root, _, files in os.walk(self.path):
+            paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(".eml"))
+        for path in sorted(paths):
+            with open(path, "rb") as f:
+                yield path, f.read()
+
+
+class CacheSource(MessageSource):
+    """Replay messages stored in a ``message_cache.MessageCache``."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def iter_messages(self, senders, start_date=None, end_date=None, stats=None):
+        for sender in senders:
+            for digest, _, raw_email in self.cache.iter_messages(sender, start_date, end_date):
+                if stats is not None:
+                    stats["messages_read"] = stats.get("messages_read", 0) + 1
+                yield sender, digest, raw_email
+
+
+class IMAPSource(MessageSource):
+    """Search and download messages over IMAP through a session pool.
+
+    Each sender is searched once with ``FROM``/``SINCE``/``BEFORE`` and the
+    matching UIDs are fetched in chunks over ``workers`` sessions.
+    Credentials default to :func:`imap_utils.load_credentials`.
+    """
+
+    def __init__(self, user=None, password=None, mailbox="Inbox", workers=1, chunk_size=FETCH_CHUNK_SIZE):
+        if user is None or password is None:
+            user, password = load_credentials()
+        self.chunk_size = chunk_size
+        self.pool = IMAPSessionPool(lambda: open_session(user, password, mailbox), size=workers)
+
+    def iter_messages(self, senders, start_date=None, end_date=None, stats=None):
+        senders = list(senders)
+        searches = []
+        for sender in senders:
+            criteria = f'FROM "{sender}"'
+            if start_date:
+                criteria += f' SINCE "{start_date}"'
+            if end_date:
+                criteria += f' BEFORE "{end_date}"'
+            searches.append(f"({criteria})")
+        groups = list(zip(senders, search_all_parallel(self.pool, searches, stats)))
+        yield from fetch_groups_parallel(self.pool, groups, self.chunk_size, stats)
+
+    def close(self):
+        self.pool.close()
+
+
+def open_source(location=None, **imap_options):
+    """Pick the message source for ``location``.
+
+    ``None`` or ``"imap"`` selects the IMAP server. A directory containing
+    ``cur`` or ``new`` is read as a Maildir, any other directory as a
+    collection of ``.eml`` files and a file as an mbox.
+    """
+    if location is None or location == "imap":
+        return IMAPSource(**imap_options)
+    if os.path.isdir(location):
+        if os.path.isdir(os.path.join(location, "cur")) or os.path.isdir(os.path.join(location, "new")):
+            return MaildirSource(location)
+        return EmlDirectorySource(location)
+    if os.path.isfile(location):
+        return MboxSource(location)
+    raise FileNotFoundError(f"Message source not found: {location}")
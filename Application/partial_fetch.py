@@ -0,0 +1,199 @@
+"""BODYSTRUCTURE-guided partial downloads of the text part used for extraction.
+
+Instead of downloading the whole RFC822 message, ``fetch_text_parts_parallel``
+first asks the server for each message's ``BODYSTRUCTURE`` (plus the few
+headers needed), picks the part ``extracteur.parse_email_message`` would
+use — the first ``text/html`` part, else the first ``text/plain`` one — and
+downloads only that section, optionally capped to ``max_bytes``. Inline
+images, attachments and duplicate alternative parts never cross the wire.
+"""
+
+import base64
+import binascii
+import quopri
+import re
+
+from imap_utils import (
+    FETCH_CHUNK_SIZE,
+    HEADER_FIELDS,
+    chunked,
+    parse_fetch_items,
+    parse_fetch_response,
+)
+
+_ATOM_RE = re.compile(rb'[^\s()"{]+')
+_LITERAL_RE = re.compile(rb"\{(\d+)\}\r\n")
+_SIZE_RE = re.compile(rb"RFC822\.SIZE (\d+)")
+
+
+def parse_sexp(data, pos=0):
+    """Parse one IMAP response value starting at ``pos``.
+
+    Lists become Python lists, ``NIL`` becomes ``None`` and strings, atoms
+    and literals become ``bytes``. Returns ``(value, next_pos)``.
+    """
+    while pos < len(data) and data[pos:pos + 1].isspace():
+        pos += 1
+    char = data[pos:pos + 1]
+    if char == b"(":
+        items = []
+        pos += 1
+        while True:
+            while data[pos:pos + 1].isspace():
+                pos += 1
+            if data[pos:pos + 1] == b")":
+                return items, pos + 1
+            if pos >= len(data):
+                raise ValueError("unterminated list")
+            value, pos = parse_sexp(data, pos)
+            items.append(value)
+    if char == b'"':
+        out = bytearray()
+        pos += 1
+        while data[pos:pos + 1] != b'"':
+            if pos >= len(data):
+                raise ValueError("unterminated string")
+            if data[pos:pos + 1] == b"\\":
+                pos += 1
+            out += data[pos:pos + 1]
+            pos += 1
+        return bytes(out), pos + 1
+    if char == b"{":
+        match = _LITERAL_RE.match(data, pos)
+        if not match:
+            raise ValueError("malformed literal")
+        start = match.end()
+        end = start + int(match.group(1))
+        return data[start:end], end
+    match = _ATOM_RE.match(data, pos)
+    if not match:
+        raise ValueError(f"unexpected data at {pos}")
+    atom = match.group(0)
+    return (None if atom.upper() == b"NIL" else atom), match.end()
+
+
+def parse_bodystructure(meta):
+    """Extract and parse the ``BODYSTRUCTURE`` item from FETCH response text."""
+    index = meta.upper().find(b"BODYSTRUCTURE ")
+    if index == -1:
+        return None
+    structure, _ = parse_sexp(meta, index + len(b"BODYSTRUCTURE "))
+    return structure
+
+
+def iter_leaf_parts(structure, prefix=""):
+    """Yield ``(section, part)`` for every non-multipart part, depth first.
+
+    A single-part message has its body at section ``1``; parts of a
+    multipart are numbered from 1 and nested parts are joined with dots.
+    """
+    if structure and isinstance(structure[0], list):
+        index = 0
+        for child in structure:
+            if not isinstance(child, list):
+                break
+            index += 1
+            yield from iter_leaf_parts(child, f"{prefix}.{index}" if prefix else str(index))
+    elif structure:
+        yield prefix or "1", structure
+
+
+def find_text_part(structure):
+    """Return ``(section, subtype, encoding)`` of the part used for extraction.
+
+    Mirrors ``extracteur.parse_email_message``: the first ``text/html``
+    part wins, otherwise the first ``text/plain`` part. ``None`` when the
+    message has neither.
+    """
+    plain = None
+    for section, part in iter_leaf_parts(structure or []):
+        main_type = (part[0] or b"").lower()
+        sub_type = (part[1] or b"").lower()
+        if main_type != b"text":
+            continue
+        encoding = (part[5] or b"7bit").lower() if len(part) > 5 else b"7bit"
+        if sub_type == b"html":
+            return section, "html", encoding
+        if sub_type == b"plain" and plain is None:
+            plain = (section, "plain", encoding)
+    return plain
+
+
+def decode_transfer_encoding(payload, encoding):
+    """Undo the Content-Transfer-Encoding of a (possibly truncated) section."""
+    if encoding == b"base64":
+        data = re.sub(rb"[^A-Za-z0-9+/=]", b"", payload)
+        data = data[: len(data) - len(data) % 4]
+        try:
+            return base64.b64decode(data)
+        except binascii.Error:
+            return b""
+    if encoding == b"quoted-printable":
+        return quopri.decodestring(payload)
+    return payload
+
+
+def _fetch_text_chunk(mail, job):
+    uids, max_bytes = job
+    chunk_stats = {"fetch_round_trips": 1}
+    _, data = mail.uid(
+        "FETCH",
+        b",".join(uids).decode(),
+        f"(RFC822.SIZE BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS {HEADER_FIELDS}])",
+    )
+
+    entries = []
+    sections = {}
+    for uid, header, meta in parse_fetch_items(data):
+        size = _SIZE_RE.search(meta)
+        chunk_stats["bytes_total"] = chunk_stats.get("bytes_total", 0) + (int(size.group(1)) if size else 0)
+        chunk_stats["bytes_fetched"] = chunk_stats.get("bytes_fetched", 0) + len(header)
+        part = find_text_part(parse_bodystructure(meta))
+        entries.append((uid, header, part))
+        if part:
+            spec = f"BODY.PEEK[{part[0]}]" + (f"<0.{max_bytes}>" if max_bytes else "")
+            sections.setdefault(spec, []).append(uid)
+
+    # One FETCH per distinct section, usually one or two per chunk
+    bodies = {}
+    for spec, spec_uids in sections.items():
+        _, data = mail.uid("FETCH", b",".join(spec_uids).decode(), f"({spec})")
+        chunk_stats["fetch_round_trips"] += 1
+        for uid, payload in parse_fetch_response(data):
+            bodies[uid] = payload
+            chunk_stats["bytes_fetched"] += len(payload)
+
+    results = []
+    for uid, header, part in entries:
+        if part:
+            section, subtype, encoding = part
+            body = decode_transfer_encoding(bodies.get(uid, b""), encoding)
+        else:
+            body, subtype = b"", None
+        results.append((uid, header, body, subtype))
+    chunk_stats["messages_fetched"] = len(results)
+    return results, chunk_stats
+
+
+def fetch_text_parts_parallel(pool, groups, chunk_size=FETCH_CHUNK_SIZE, max_bytes=None, stats=None):
+    """Fetch only the extraction text part of every message in ``groups``.
+
+    ``groups`` is a list of ``(key, uids)``. Yields
+    ``(key, uid, header_bytes, body_bytes, subtype)`` in group then UID
+    order, where ``subtype`` is ``"html"``, ``"plain"`` or ``None`` and
+    ``body_bytes`` is already transfer-decoded. ``stats`` receives
+    ``bytes_fetched`` alongside ``bytes_total``, the full message sizes.
+    """
+    total = sum(len(uids) for _, uids in groups)
+    if not total:
+        return
+    chunk_size = max(1, min(chunk_size, -(-total // pool.size)))
+    jobs = [(key, chunk) for key, uids in groups for chunk in chunked(uids, chunk_size)]
+
+    results = pool.map(_fetch_text_chunk, [(chunk, max_bytes) for _, chunk in jobs])
+    for (key, _), (messages, chunk_stats) in zip(jobs, results):
+        if stats is not None:
+            for name, value in chunk_stats.items():
+                stats[name] = stats.get(name, 0) + value
+        for uid, header, body, subtype in messages:
+            yield key, uid, header, body, subtype
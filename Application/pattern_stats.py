@@ -0,0 +1,108 @@
+"""Hit statistics of the regex variants of each bank profile.
+
+``BankRule.match`` counts which ``(amount, description)`` variant matched
+and moves frequent variants ahead of rarer ones. This module persists those
+counts in the ``pattern_hits`` table so every run starts from the order
+learned by the previous ones:
+
+- :func:`prime` orders the variants by their hits over the last
+  ``PATTERN_WINDOW_DAYS`` days;
+- :func:`save` adds the hits counted since the last save;
+- :func:`report` (``python pattern_stats.py``) shows the counts and the
+  resulting order.
+
+The counts are kept in ``transactions.db`` unless ``PATTERN_STATS_DB``
+names another SQLite file. Statistics are best effort: a database error is
+logged and never stops an extraction.
+"""
+
+import logging
+import os
+import sqlite3
+import sys
+import weakref
+
+# ✅ Add the root folder to Python’s module search path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bank_rules import load_rules
+from Database.PatternStats import add_pattern_hits, get_pattern_hits
+
+logger = logging.getLogger(__name__)
+
+# ✅ Only hits of the last 90 days decide the order, so new templates take over
+PATTERN_WINDOW_DAYS = 90
+
+_primed = weakref.WeakSet()
+
+
+def _db_path(db_path):
+    return db_path or os.getenv("PATTERN_STATS_DB") or None
+
+
+def prime(rules=None, db_path=None):
+    """Order the variants of ``rules`` (default ``config.yml``) by recent hits, once."""
+    rules = rules or load_rules()
+    if rules in _primed:
+        return rules
+    try:
+        rules.apply_scores(get_pattern_hits(PATTERN_WINDOW_DAYS, _db_path(db_path)))
+    except sqlite3.Error as e:
+        logger.warning("Could not load regex hit statistics: %s", e)
+    _primed.add(rules)
+    return rules
+
+
+def save(rules=None, db_path=None):
+    """Persist the hits counted by ``rules`` since the last save."""
+    rules = rules or load_rules()
+    hits = rules.take_hits()
+    try:
+        add_pattern_hits(hits, db_path=_db_path(db_path))
+    except sqlite3.Error as e:
+        logger.warning("Could not save regex hit statistics: %s", e)
+
+
+def report(rules=None, db_path=None, days=PATTERN_WINDOW_DAYS):
+    """Return one row per regex variant of every bank profile.
+
+    Rows are dictionaries with ``bank``, ``variant`` (1-based position in
+    ``config.yml``), ``pattern`` (its key), ``rank`` (1-based position in
+    the order tried), ``recent`` (hits over ``days`` days) and ``total``.
+    """
+    rules = prime(rules, db_path)
+    recent = get_pattern_hits(days, _db_path(db_path))
+    total = get_pattern_hits(None, _db_path(db_path))
+    rows = []
+    for name, rule in rules.banks.items():
+        for index, key in enumerate(rule.pattern_keys):
+            rows.append({
+                "bank": name,
+                "variant": index + 1,
+                "pattern": key,
+                "rank": rule.order.index(index) + 1,
+                "recent": recent.get((name, key), 0),
+                "total": total.get((name, key), 0),
+            })
+    return rows
+
+
+def main():
+    rows = report()
+    if not rows:
+        print("❌ No regex variant in config.yml.")
+        return
+    print(f"📊 Regex variant hits (last {PATTERN_WINDOW_DAYS} days / all time)")
+    bank = None
+    for row in rows:
+        if row["bank"] != bank:
+            bank = row["bank"]
+            print(f"🏦 {bank}")
+        print(
+            f"   variant {row['variant']} ({row['pattern']}): tried #{row['rank']}, "
+            f"{row['recent']} recent / {row['total']} total hits"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Plan IMAP searches per distinct sender instead of per bank profile.
+
+Several bank profiles in ``config.yml`` can share one sender address (CIBC
+debit and credit alerts both come from ``mailbox.noreply@cibc.com``).
+Searching and downloading once per sender, then routing each message to
+the profiles that claim it, avoids fetching the same message twice.
+"""
+
+from keyword_classifier import classifier_for
+
+
+def group_banks_by_sender(config):
+    """Return ``{sender: [bank_name, ...]}`` in ``config.yml`` order."""
+    groups = {}
+    for bank_name, bank_cfg in config.get("banks", {}).items():
+        sender = bank_cfg.get("sender")
+        if not sender:
+            continue
+        groups.setdefault(sender, []).append(bank_name)
+    return groups
+
+
+def claiming_banks(bank_names, subject, content, config):
+    """Return ``[(bank_name, keyword), ...]`` for profiles claiming an email.
+
+    A profile claims the email with the first of its ``keywords`` found in
+    the subject or body (case-insensitive), unless one of its
+    ``exclude_keywords`` is present. The text is lowered and scanned once
+    for the keywords of every profile.
+    """
+    return classifier_for(config).claims(bank_names, subject, content)
+
+
+def subject_may_claim(bank_cfg, subject):
+    """Decide from the subject alone whether a profile could claim an email.
+
+    An exclude keyword in the subject always rules the email out. Profiles
+    with ``subject_keywords: true`` put their keywords in the subject, so a
+    subject without any of them rules the email out as well; other profiles
+    stay undecided until the body is read.
+    """
+    subject = (subject or "").lower()
+    if any(ex_kw.lower() in subject for ex_kw in bank_cfg.get("exclude_keywords", [])):
+        return False
+    if bank_cfg.get("subject_keywords"):
+        return any(kw.lower() in subject for kw in bank_cfg.get("keywords", []))
+    return True
+
+
+def is_body_candidate(bank_names, subject, config):
+    """Return True if any profile sharing a sender could still claim the email."""
+    return any(
+        subject_may_claim(config["banks"][bank_name], subject) for bank_name in bank_names
+    )
+
+
+def _imap_quote(value):
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _imap_or(terms):
+    # IMAP OR takes exactly two search keys, so longer lists are nested
+    if len(terms) == 1:
+        return terms[0]
+    return f"OR {terms[0]} {_imap_or(terms[1:])}"
+
+
+def bank_search_terms(bank_cfg):
+    """Build IMAP SEARCH keys selecting the emails a profile could claim.
+
+    Keywords are looked for with ``TEXT`` (headers and body), even for
+    ``subject_keywords`` profiles, and each of the ``exclude_keywords`` adds
+    a ``NOT TEXT`` key. Returns ``None`` when the
+    profile cannot be narrowed: it has no keywords, or a keyword is not
+    plain ASCII and would need a ``CHARSET`` the server may not support.
+    """
+    keywords = bank_cfg.get("keywords", [])
+    excludes = bank_cfg.get("exclude_keywords", [])
+    if not keywords or not all(kw.isascii() for kw in keywords + excludes):
+        return None
+
+    terms = [_imap_or([f"TEXT {_imap_quote(kw)}" for kw in keywords])]
+    terms += [f"NOT TEXT {_imap_quote(ex)}" for ex in excludes]
+    return terms[0] if len(terms) == 1 else "(" + " ".join(terms) + ")"
+
+
+def sender_search_terms(bank_names, config):
+    """SEARCH keys matching emails any profile sharing a sender could claim.
+
+    ``None`` means the sender's search cannot be narrowed on the server.
+    """
+    terms = [bank_search_terms(config["banks"][bank_name]) for bank_name in bank_names]
+    if any(term is None for term in terms):
+        return None
+    return _imap_or(terms)
+
+
+def downloads_saved(groups, message_counts):
+    """Number of downloads avoided compared to one search per bank profile.
+
+    ``message_counts`` maps each sender to the number of messages fetched.
+    """
+    return sum(
+        (len(banks) - 1) * message_counts.get(sender, 0)
+        for sender, banks in groups.items()
+    )
@@ -0,0 +1,159 @@
+import imaplib
+import re
+
+import pytest
+
+
+class StubIMAP:
+    """In-memory stand-in for ``imaplib.IMAP4_SSL`` used by fetch tests.
+
+    ``messages`` maps each UID to ``(sender, raw_bytes)``. Only the commands
+    issued by the extractors are implemented; date criteria are ignored.
+    """
+
+    def __init__(self, messages, uidvalidity=1):
+        self.messages = dict(messages)
+        self.uidvalidity = uidvalidity
+        self.commands = []
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def login(self, user, password):
+        return "OK", [b"Logged in"]
+
+    def select(self, mailbox="INBOX"):
+        return "OK", [str(len(self.messages)).encode()]
+
+    def response(self, code):
+        if code == "UIDVALIDITY":
+            return code, [str(self.uidvalidity).encode()]
+        return code, [None]
+
+    def uid(self, command, *args):
+        self.commands.append((command,) + args)
+        if command == "SEARCH":
+            return "OK", [b" ".join(str(u).encode() for u in self._search(args[-1]))]
+        if command == "FETCH":
+            data = []
+            for uid in args[0].split(","):
+                raw = self.messages[int(uid)][1]
+                data.append((f"{uid} (UID {uid} RFC822 {{{len(raw)}}}".encode(), raw))
+                data.append(b")")
+            return "OK", data
+        raise imaplib.IMAP4.error(f"unsupported command {command}")
+
+    def _search(self, criteria):
+        uids = sorted(self.messages)
+        sender = re.search(r'FROM "([^"]+)"', criteria)
+        if sender:
+            uids = [u for u in uids if self.messages[u][0] == sender.group(1)]
+        uid_range = re.search(r"UID (\d+):\*", criteria)
+        if uid_range:
+            newer = [u for u in uids if u >= int(uid_range.group(1))]
+            # Like real servers, "n:*" always includes the highest UID
+            uids = newer or uids[-1:]
+        return uids
+
+    def close(self):
+        return "OK", [b""]
+
+    def logout(self):
+        return "BYE", [b""]
+
+
+def make_raw_email(sender, subject, html, date="Mon, 10 Feb 2025 10:00:00 -0500"):
+    """Return the bytes of a minimal single-part HTML email."""
+    return (
+        f"From: {sender}\r\nSubject: {subject}\r\nDate: {date}\r\n"
+        f"Content-Type: text/html; charset=utf-8\r\n\r\n{html}"
+    ).encode()
+
+
+@pytest.fixture
+def stub_imap(monkeypatch):
+    """Patch ``imaplib.IMAP4_SSL`` with a :class:`StubIMAP` factory."""
+    monkeypatch.setenv("EMAIL_USER", "me@example.com")
+    monkeypatch.setenv("EMAIL_PASS", "secret")
+
+    def install(messages, uidvalidity=1):
+        stub = StubIMAP(messages, uidvalidity)
+        monkeypatch.setattr(imaplib, "IMAP4_SSL", stub)
+        return stub
+
+    return install
+
+
+@pytest.fixture
+def fake_imap_server(monkeypatch):
+    """Start a :class:`fake_imap.FakeIMAPServer` and point ``imap_utils`` at it.
+
+    Call it with the server's messages and options, or with a server that is
+    not started yet (e.g. from ``imap_recorder.replay_server``). The
+    environment points at the last server started; all of them are stopped
+    at teardown.
+    """
+    from fake_imap import FakeIMAPServer
+
+    monkeypatch.setenv("EMAIL_USER", "me@example.com")
+    monkeypatch.setenv("EMAIL_PASS", "secret")
+    servers = []
+
+    def start(messages=(), **kwargs):
+        server = messages if isinstance(messages, FakeIMAPServer) else FakeIMAPServer(messages, **kwargs)
+        servers.append(server.start())
+        for key, value in server.env().items():
+            monkeypatch.setenv(key, value)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+TRANSACTIONS_SCHEMA = """
+CREATE TABLE transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    amount REAL NOT NULL,
+    description TEXT NOT NULL,
+    card_type TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT DEFAULT NULL,
+    bank TEXT NOT NULL,
+    full_email TEXT DEFAULT 'No email content',
+    category TEXT DEFAULT 'Uncategorized',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE tags (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tag_name TEXT UNIQUE NOT NULL
+);
+CREATE TABLE transaction_tags (
+    transaction_id INTEGER,
+    tag_id INTEGER,
+    PRIMARY KEY (transaction_id, tag_id)
+);
+CREATE TABLE keyword_rules (
+    keyword TEXT PRIMARY KEY,
+    category TEXT,
+    tags TEXT
+);
+CREATE INDEX idx_amount_date ON transactions(amount, date);
+INSERT INTO keyword_rules (keyword, category, tags) VALUES ('uber', 'Transport', 'Rides, Uber');
+"""
+
+
+def make_transactions_db(path):
+    """Create the ``transactions.db`` tables (and one keyword rule) at ``path``."""
+    import sqlite3
+
+    conn = sqlite3.connect(path)
+    conn.executescript(TRANSACTIONS_SCHEMA)
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def transactions_db(tmp_path):
+    """Path of a scratch database with the ``transactions.db`` tables."""
+    return make_transactions_db(str(tmp_path / "transactions.db"))
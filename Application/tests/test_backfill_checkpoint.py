@@ -0,0 +1,156 @@
+import os
+import sys
+
+import pytest
+
+# Ensure Application modules and the project root can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from conftest import make_raw_email
+from Database.Backfill import BackfillCheckpoint
+from Database.TransactionStore import TransactionStore
+
+
+def _alerts(count):
+    return [
+        make_raw_email("noreply@mbna.ca", "Transaction Alert", f"<p>purchase of ${i}.00 from SHOP</p>")
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def server(fake_imap_server):
+    return fake_imap_server(_alerts(10))
+
+
+def _run(checkpoint, stored, stop_after=None):
+    from extracteur import iter_emails
+
+    for email in iter_emails("01-Jan-2025", "01-Mar-2025", chunk_size=2, checkpoint=checkpoint):
+        if len(stored) == stop_after:
+            raise KeyboardInterrupt
+        stored.append(email["full_email_html"])
+        checkpoint.add_inserted(len(stored))
+
+
+def test_interrupted_backfill_resumes_after_last_processed_message(server, tmp_path):
+    db_path = str(tmp_path / "backfill.db")
+    stored = []
+
+    with pytest.raises(KeyboardInterrupt):
+        _run(BackfillCheckpoint(db_path), stored, stop_after=4)
+    fetched_before = server.command_counts["UID FETCH"]
+
+    checkpoint = BackfillCheckpoint(db_path)
+    _run(checkpoint, stored)
+
+    assert checkpoint.resumed
+    assert stored == [f"<p>purchase of ${i}.00 from SHOP</p>" for i in range(10)]
+    assert checkpoint.inserted_ids() == list(range(1, 11))
+    # Only the 6 remaining messages were downloaded again
+    assert server.command_counts["UID FETCH"] - fetched_before == 3
+
+    # A finished run is not resumed: the same range starts afresh
+    again = BackfillCheckpoint(db_path)
+    _run(again, [])
+    assert not again.resumed
+
+
+def test_deferred_checkpoint_waits_for_acknowledged_records(server, tmp_path):
+    from extracteur import iter_emails
+
+    db_path = str(tmp_path / "backfill.db")
+    checkpoint = BackfillCheckpoint(db_path, deferred=True)
+    emails = iter_emails("01-Jan-2025", "01-Mar-2025", chunk_size=2, checkpoint=checkpoint)
+    # Read 5 records ahead but only store the first 2
+    ahead = [next(emails) for _ in range(5)]
+    for i in range(2):
+        checkpoint.add_inserted(i + 1)
+        checkpoint.acknowledge()
+    emails.close()
+    assert ahead[0]["full_email_html"] == "<p>purchase of $0.00 from SHOP</p>"
+
+    resumed = BackfillCheckpoint(db_path, deferred=True)
+    stored = []
+    for email in iter_emails("01-Jan-2025", "01-Mar-2025", chunk_size=2, checkpoint=resumed):
+        stored.append(email["full_email_html"])
+        resumed.add_inserted(len(stored) + 2)
+        resumed.acknowledge()
+
+    assert resumed.resumed
+    assert stored == [f"<p>purchase of ${i}.00 from SHOP</p>" for i in range(2, 10)]
+    assert resumed.inserted_ids() == list(range(1, 11))
+    # Every record was acknowledged, so the run was finished
+    again = BackfillCheckpoint(db_path)
+    again.begin("me@example.com", "Inbox", "01-Jan-2025", "01-Mar-2025")
+    assert not again.resumed
+
+
+def test_transient_errors_are_retried_with_backoff(server):
+    from extracteur import iter_emails
+
+    seen = []
+    for email in iter_emails("01-Jan-2025", "01-Mar-2025", chunk_size=2):
+        seen.append(email)
+        if len(seen) == 3:
+            server.drop_connections()
+
+    assert len(seen) == 10
+
+
+def _store_all(checkpoint, crash_after=None):
+    from extracteur import iter_emails
+    from traitement import extract_transaction_data
+
+    store = checkpoint.store
+    for email in iter_emails("01-Jan-2025", "01-Mar-2025", chunk_size=2, checkpoint=checkpoint):
+        data = extract_transaction_data(email, check_duplicate=False)
+        result = store.insert(data, commit=False)
+        if data["amount"] == crash_after:
+            # Stored but not yet checkpointed: the process dies here
+            raise KeyboardInterrupt
+        checkpoint.add_inserted(result["transaction_id"])
+        checkpoint.acknowledge()
+
+
+def test_crash_between_insert_and_checkpoint_inserts_nothing_twice(server, transactions_db):
+    with TransactionStore(transactions_db) as store:
+        with pytest.raises(KeyboardInterrupt):
+            _store_all(BackfillCheckpoint(deferred=True, store=store), crash_after="4.00")
+
+    with TransactionStore(transactions_db) as store:
+        checkpoint = BackfillCheckpoint(deferred=True, store=store)
+        _store_all(checkpoint)
+        amounts = [row[0] for row in store.conn.execute("SELECT amount FROM transactions ORDER BY id")]
+        assert checkpoint.resumed
+        assert amounts == [float(i) for i in range(10)]
+        assert len(checkpoint.inserted_ids()) == 10
+
+
+def test_interrupted_html_export_resumes_with_following_file_numbers(server, tmp_path, monkeypatch):
+    import Realtransactions
+
+    monkeypatch.setattr(Realtransactions, "OUTPUT_DIR", str(tmp_path / "TestEmails"))
+    write_html = Realtransactions.create_html_file
+    written = []
+
+    def create_html_file(email_info, output_dir, index):
+        if len(written) == 4:
+            raise ConnectionResetError("connection lost")
+        written.append(index)
+        return write_html(email_info, output_dir, index)
+
+    monkeypatch.setattr(Realtransactions, "create_html_file", create_html_file)
+    db_path = str(tmp_path / "backfill.db")
+    first = Realtransactions.fetch_transaction_emails_only(BackfillCheckpoint(db_path))
+
+    monkeypatch.setattr(Realtransactions, "create_html_file", write_html)
+    checkpoint = BackfillCheckpoint(db_path)
+    second = Realtransactions.fetch_transaction_emails_only(checkpoint)
+
+    assert checkpoint.resumed
+    assert len(first) == 4 and len(second) == 6
+    files = sorted(name for name in os.listdir(tmp_path / "TestEmails") if name != "index.html")
+    assert [int(name[:4]) for name in files] == list(range(1, 11))
+    assert checkpoint.inserted_ids() == list(range(1, 11))
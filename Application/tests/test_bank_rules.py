@@ -0,0 +1,86 @@
+import os
+import sys
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import bank_rules
+from bank_rules import load_config, load_rules
+
+CONFIG = """banks:
+  shop_credit:
+    sender: "alerts@bank.example"
+    keywords: ["Purchase"]
+    regex:
+      amount: "\\\\$([0-9]+\\\\.[0-9]{2})"
+      description: "at ([A-Z ]+)"
+"""
+
+
+def test_rules_reload_only_when_the_file_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(bank_rules, "CHECK_INTERVAL", 0)
+    path = tmp_path / "config.yml"
+    path.write_text(CONFIG)
+
+    rules = load_rules(path)
+    assert rules.identify_bank("alerts@bank.example", "Purchase made") == "shop_credit"
+    amount, description = rules.banks["shop_credit"].match("Paid $12.50 at CORNER STORE")
+    assert (amount.group(1), description.group(1)) == ("12.50", "CORNER STORE")
+
+    # Same content, new mtime: the compiled rules are kept
+    os.utime(path, ns=(0, 0))
+    assert load_rules(path) is rules
+
+    path.write_text(CONFIG.replace("Purchase", "Achat"))
+    os.utime(path, ns=(10**9, 10**9))
+    reloaded = load_rules(path)
+    assert reloaded is not rules
+    assert reloaded.identify_bank("alerts@bank.example", "Purchase made") == "Unknown"
+
+
+def test_load_config_returns_a_private_copy():
+    config = load_config()
+    config["banks"].clear()
+    assert load_config()["banks"]
+
+
+def test_anchor_window_is_searched_before_the_whole_text():
+    from bank_rules import BankRuleSet
+
+    config = {"banks": {"shop_credit": {
+        "sender": "alerts@bank.example",
+        "anchors": ["Card ending in"],
+        "anchor_window": [0, 60],
+        "regex": {"amount": r"Total: \$([0-9]+\.[0-9]{2})", "description": r"Merchant: ([A-Z][A-Z ]+[A-Z])"},
+    }}}
+    rule = BankRuleSet(config).banks["shop_credit"]
+    footer = "\n".join(["LEGAL NOTICE Total: $0.00 APPLIES"] * 50)
+    text = "Merchant: PROMO, Total: $5.00 OFF\nCard ending in 1234\nMerchant: CORNER STORE\nTotal: $12.50\n" + footer
+
+    assert rule.window(text).startswith("Card ending in 1234")
+    amount, description = rule.match(text)
+    assert (amount.group(1), description.group(1)) == ("12.50", "CORNER STORE")
+
+    # Without the anchor, the whole text is searched as before
+    amount, description = rule.match(text.replace("Card ending in", "Carte"))
+    assert (amount.group(1), description.group(1)) == ("5.00", "PROMO")
+
+
+def test_unanchored_regexes_give_the_whole_text_result():
+    from bank_rules import BankRuleSet
+
+    config = load_config()
+    capital_one = config["banks"]["capital_one_credit"]
+    capital_one.update(anchors=["Account ending in"], anchor_window=[0, 300])
+    rule = BankRuleSet(config).banks["capital_one_credit"]
+    text = (
+        "Earn $25.00 back on your next trip\n"
+        "Account ending in 1234\n"
+        "CORNER STORE $12.50\n"
+    )
+
+    # The amount regex matches anywhere, so the anchor would skip the promotion
+    assert rule.anchors == []
+    amount, description = rule.match(text)
+    assert (amount.group(1), description.group(1)) == ("25.00", "Earn ")
+    assert [m.group(0) for m in rule.match(text)] == [m.group(0) for m in rule._match(text)]
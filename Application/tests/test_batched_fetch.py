@@ -0,0 +1,43 @@
+import os
+import sys
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from imap_utils import fetch_messages, parse_fetch_response
+
+
+class _StubMail:
+    """Minimal stand-in for ``imaplib.IMAP4`` answering ``UID FETCH``."""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.fetch_calls = []
+
+    def uid(self, command, uid_set, parts):
+        assert command == "FETCH"
+        self.fetch_calls.append(uid_set)
+        data = []
+        for uid in uid_set.split(","):
+            raw = self.messages[uid]
+            data.append((f"{uid} (UID {uid} RFC822 {{{len(raw)}}}".encode(), raw))
+            data.append(b")")
+        return "OK", data
+
+
+def test_fetch_messages_batches_uids_per_chunk():
+    messages = {str(i): f"Subject: {i}\r\n\r\nbody".encode() for i in range(1, 451)}
+    mail = _StubMail(messages)
+    stats = {}
+
+    fetched = list(fetch_messages(mail, [k.encode() for k in messages], chunk_size=200, stats=stats))
+
+    assert len(mail.fetch_calls) == 3
+    assert stats == {"fetch_round_trips": 3, "messages_fetched": 450}
+    assert [uid for uid, _ in fetched] == [k.encode() for k in messages]
+    assert fetched[0][1] == messages["1"]
+
+
+def test_parse_fetch_response_reads_trailing_uid():
+    data = [(b"7 (RFC822 {4}", b"abcd"), b" UID 42)"]
+    assert parse_fetch_response(data) == [(b"42", b"abcd")]
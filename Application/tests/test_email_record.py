@@ -0,0 +1,61 @@
+import json
+import os
+import sys
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import email_record
+from conftest import make_raw_email
+from email_record import EmailRecord
+
+
+def _count_parses(monkeypatch):
+    calls = []
+    real = email_record.html_to_text
+
+    def counting(html):
+        calls.append(html)
+        return real(html)
+
+    monkeypatch.setattr(email_record, "html_to_text", counting)
+    return calls
+
+
+def test_html_is_parsed_once_from_routing_to_extraction(monkeypatch):
+    from extracteur import parse_email_message, route_email
+    from bank_rules import load_config
+    from traitement import extract_transaction_data
+
+    calls = _count_parses(monkeypatch)
+    html = "<p>Montant de l'achat : 25,99$</p><p>Lieu de l'achat : CORNER STORE</p>"
+    raw = make_raw_email("mailbox.noreply@cibc.com", "Achat", html)
+    record = parse_email_message(raw, "mailbox.noreply@cibc.com", "cibc_credit")
+
+    routed = [
+        EmailRecord(record, bank_config=bank)
+        for bank in route_email(record, ["cibc_credit", "cibc_debit"], load_config())
+    ]
+    for email in routed:
+        extract_transaction_data(email)
+
+    assert len(calls) == 1
+    assert routed[0].text == record.text
+
+
+def test_text_survives_a_json_round_trip(monkeypatch):
+    from traitement import extract_transaction_data
+
+    calls = _count_parses(monkeypatch)
+    record = EmailRecord(
+        full_email_html="<p>You made a purchase of $9.99 from SHOP</p>",
+        bank_config="mbna_credit",
+    )
+    record.text
+    # What extract_emails.py prints and process_queue.py reads back
+    received = json.loads(json.dumps([record]))[0]
+    result = extract_transaction_data(received)
+
+    assert len(calls) == 1
+    assert result["amount"] == "9.99"
+    assert result["description"] == "SHOP"
@@ -0,0 +1,38 @@
+import os
+import sys
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import extraction_pool
+from email_record import EmailRecord
+
+
+def _emails(count):
+    return [
+        EmailRecord(
+            bank_config="mbna_credit",
+            sender="noreply@mbna.ca",
+            subject="Transaction Alert",
+            email_datetime="Mon, 03 Feb 2025 10:00:00 +0000",
+            full_email_html=f"<p>You made a purchase of ${i}.25 from SHOP {i}</p>",
+        )
+        for i in range(count)
+    ]
+
+
+def test_parallel_extraction_matches_serial_order(monkeypatch):
+    # Duplicates are checked by the writing process, never against the real database
+    checked = []
+    monkeypatch.setattr(extraction_pool, "is_duplicate", lambda amount, date: checked.append(amount) or False)
+
+    serial = [data for _, data in extraction_pool.iter_extracted(_emails(11), workers=1)]
+    emails = _emails(11)
+    parallel = list(extraction_pool.iter_extracted(iter(emails), workers=2, chunk_size=3))
+
+    assert [email for email, _ in parallel] == emails
+    assert [data for _, data in parallel] == [dict(data, duplicate=False) for data in serial]
+    assert [data["description"] for _, data in parallel] == [f"SHOP {i}" for i in range(11)]
+    assert checked == [f"{i}.25" for i in range(11)]
+    # The text parsed in the workers is kept on the caller's records
+    assert all("SHOP" in email["email_text"] for email in emails)
@@ -0,0 +1,49 @@
+import imaplib
+import os
+import sys
+
+import pytest
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fake_imap import FakeIMAPServer, generated_mailbox, parse_latency
+
+
+def test_latency_can_be_set_per_command():
+    latency = parse_latency(["0.01", "uid fetch=0.05"])
+    assert latency == {"*": 0.01, "UID FETCH": 0.05}
+    assert parse_latency(["0.02"]) == 0.02
+
+    with FakeIMAPServer(latency=latency) as server:
+        assert server.delay("UID FETCH") == 0.05
+        assert server.delay("SELECT") == 0.01
+
+
+def test_commands_before_select_are_rejected(fake_imap_server):
+    server = fake_imap_server(generated_mailbox(1))
+    host, port = server.address
+    mail = imaplib.IMAP4(host, port)
+    mail.login("me@example.com", "secret")
+    # imaplib checks the state itself; pretend a mailbox is selected so the commands are sent
+    mail.state = "SELECTED"
+    for command, args in (("SEARCH", (None, "ALL")), ("FETCH", ("1", "(RFC822)"))):
+        with pytest.raises(imaplib.IMAP4.error, match="No mailbox selected"):
+            mail.uid(command, *args)
+    mail.select("Inbox")
+    assert mail.uid("SEARCH", None, "ALL") == ("OK", [b"1"])
+    mail.logout()
+
+
+def test_generated_mailbox_is_extracted_end_to_end(fake_imap_server):
+    from extracteur import fetch_emails
+    from traitement import extract_transaction_data
+
+    server = fake_imap_server(generated_mailbox(30))
+    emails = fetch_emails("01-Jan-2025", "01-Mar-2025", keyword_search=True)
+
+    extracted = [extract_transaction_data(email, check_duplicate=False) for email in emails]
+    # Both CIBC profiles share a sender, so each of their alerts is routed once
+    assert len(extracted) == 30
+    assert all(data["amount"] and data["description"] for data in extracted)
+    assert server.command_counts["UID FETCH"] >= 1
@@ -0,0 +1,44 @@
+import os
+import sys
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import email
+
+from conftest import make_raw_email
+from imap_utils import IMAPSessionPool, fetch_headers_parallel, open_session
+from Realtransactions import load_config
+from sender_plan import is_body_candidate
+
+CAPITAL_ONE = "capitalone@notification.capitalone.com"
+
+
+def test_headers_are_fetched_without_bodies(fake_imap_server):
+    footer = "<p>legal footer</p>" * 200
+    messages = [
+        make_raw_email(CAPITAL_ONE, "Payment posted", footer),
+        make_raw_email(CAPITAL_ONE, "A transaction was charged to your account", footer),
+    ]
+    fake_imap_server(messages)
+    stats = {}
+    with IMAPSessionPool(lambda: open_session("me", "pw"), size=1) as pool:
+        headers = list(fetch_headers_parallel(pool, [b"1", b"2"], stats=stats))
+
+    assert [(uid, size) for uid, size, _ in headers] == [(b"1", len(messages[0])), (b"2", len(messages[1]))]
+    subject = email.message_from_bytes(headers[0][2])["Subject"]
+    assert subject == "Payment posted"
+    assert b"legal footer" not in headers[0][2]
+    assert stats["header_bytes"] < len(messages[0])
+
+
+def test_subject_screening_respects_excludes_and_subject_keywords():
+    config = load_config()
+    assert not is_body_candidate(["capital_one_credit"], "Payment posted", config)
+    assert is_body_candidate(["capital_one_credit"], "Your statement is ready", config)
+
+    # Neo keywords can be in the body only, so its subjects are only screened by excludes
+    assert is_body_candidate(["neo_credit"], "New rewards partners this month", config)
+    config["banks"]["neo_credit"]["subject_keywords"] = True
+    assert not is_body_candidate(["neo_credit"], "New rewards partners this month", config)
+    assert is_body_candidate(["neo_credit"], "Your purchase at STORE", config)
@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from html_text import available_backends, bs4_text, get_backend, html_to_text
+
+DOCUMENTS = [
+    # Shaped like the bank alerts: head, conditional comments, nested tables
+    """<!DOCTYPE html><html><head><title>Achat</title><style>td { color: #333; }</style>
+<!--[if mso]><style>.x {}</style><![endif]--></head>
+<body><div class="preheader">Achat&nbsp;&zwnj;</div>
+<table><tr><td>
+  <p>Montant de l'achat : 25,99$</p>
+  <p>Lieu de l'achat : MAXI #8634</p>
+</td></tr>
+<tr><td>Veuillez ne pas r&eacute;pondre.<br />&copy; 2025 La Banque</td></tr></table>
+<script>track();</script></body></html>""",
+    "<p>You made a purchase of <b>$9.99</b> from SHOP</p>\r\n<p>Thanks</p>",
+    "a < b &foo; &amp c &#169; &#x41; &#150; <pre>\n  \n</pre> <ruby>x<rt>y</rt></ruby>",
+    "<template><div>hidden</template>shown</div><p/>q<![CDATA[ c ]]><textarea>  </textarea>\t",
+    # Stray end tags of void elements
+    "x<br>&amp;</br>y<br/>a</br>b</img>c<hr><hr>d</hr></hr>e",
+]
+
+
+@pytest.mark.parametrize("backend", available_backends())
+@pytest.mark.parametrize("html", DOCUMENTS)
+def test_backends_match_beautifulsoup(backend, html):
+    assert get_backend(backend)(html) == bs4_text(html)
+
+
+def test_default_backend_feeds_the_regexes(monkeypatch):
+    from traitement import extract_transaction_data
+
+    monkeypatch.delenv("HTML_TEXT_BACKEND", raising=False)
+    result = extract_transaction_data({"bank_config": "cibc_debit", "full_email_html": DOCUMENTS[0]})
+
+    assert html_to_text("") == ""
+    assert result["amount"] == "25.99"
+    assert result["description"] == "MAXI #8634"
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        get_backend("regex")
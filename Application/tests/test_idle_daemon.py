@@ -0,0 +1,104 @@
+import imaplib
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from conftest import make_raw_email
+import idle_daemon
+from idle_daemon import IdleDaemon, idle_wait
+from imap_utils import open_session
+
+
+def _alert(amount, shop):
+    return make_raw_email(
+        "noreply@mbna.ca", "Transaction Alert", f"<p>You made a purchase of ${amount} from {shop}</p>"
+    )
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_daemon_ingests_pushed_mail_and_survives_disconnects(fake_imap_server, monkeypatch, transactions_db):
+    monkeypatch.setattr(idle_daemon, "STOP_CHECK_INTERVAL", 0.05)
+    inserted = []
+
+    server = fake_imap_server([_alert("1.00", "OLDSHOP")])
+    daemon = IdleDaemon(
+        since="01-Jan-2025",
+        insert=lambda data: inserted.append(data) or {},
+        db_path=transactions_db,
+        reconnect_delay=0.01,
+    )
+    thread = threading.Thread(target=daemon.run, daemon=True)
+    thread.start()
+
+    # The catch-up sync picks up mail that arrived before the daemon started
+    _wait_for(lambda: len(inserted) == 1 and server.command_counts["IDLE"] == 1)
+
+    server.deliver(_alert("2.50", "NEWSHOP"))
+    # Drop the connection only once the daemon is idling on it again
+    _wait_for(lambda: len(inserted) == 2 and server.command_counts["IDLE"] == 2)
+
+    server.drop_connections()
+    _wait_for(lambda: daemon.stats["reconnects"] == 1 and server.command_counts["IDLE"] == 3)
+    server.deliver(_alert("3.75", "LATESHOP"))
+    _wait_for(lambda: len(inserted) == 3)
+
+    daemon.stop()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert [t["amount"] for t in inserted] == ["1.00", "2.50", "3.75"]
+    assert daemon.stats["wakeups"] == 2
+
+
+class ScriptedIMAP:
+    """Connection replaying canned server lines to ``idle_wait``."""
+
+    def __init__(self, lines):
+        self.lines = list(lines)
+        self.sent = []
+        self.tagged_commands = {}
+
+    def _new_tag(self):
+        return b"A1"
+
+    def send(self, data):
+        self.sent.append(data)
+
+    def readline(self):
+        return self.lines.pop(0) if self.lines else b""
+
+
+def test_idle_wait_reads_untagged_responses_before_the_continuation():
+    mail = ScriptedIMAP([b"* 3 EXPUNGE\r\n", b"* 4 EXISTS\r\n", b"+ idling\r\n", b"A1 OK IDLE terminated\r\n"])
+    assert idle_wait(mail, timeout=5)
+    assert mail.sent == [b"A1 IDLE\r\n", b"DONE\r\n"]
+
+    mail = ScriptedIMAP([b"* 4 EXISTS\r\n", b"A1 NO IDLE not allowed now\r\n"])
+    with pytest.raises(imaplib.IMAP4.error, match="IDLE rejected"):
+        idle_wait(mail, timeout=5)
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_idle_wait_sees_exists_sent_with_the_continuation(fake_imap_server, compress):
+    server = fake_imap_server([_alert("1.00", "OLDSHOP")], compress=compress)
+    mail = open_session("me@example.com", "secret")
+    assert (getattr(mail, "compression", None) is not None) == compress
+    # Delivered after SELECT: the server reports it right after "+ idling", in one packet
+    server.deliver(_alert("2.50", "NEWSHOP"))
+
+    started = time.monotonic()
+    assert idle_wait(mail, timeout=3)
+    assert time.monotonic() - started < 1
+    mail.logout()
@@ -0,0 +1,52 @@
+import os
+import sys
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from conftest import make_raw_email
+
+
+def _alerts(count):
+    body = "<table><tr><td>Purchase of ${}.00 at SHOP</td></tr></table>" + "<p>Thank you for banking with us.</p>" * 20
+    return [
+        make_raw_email("noreply@mbna.ca", "Transaction Alert", body.format(i))
+        for i in range(count)
+    ]
+
+
+def test_compressed_sync_matches_plain_sync_with_fewer_bytes(fake_imap_server):
+    from extracteur import fetch_emails
+
+    messages = _alerts(60)
+    plain = fake_imap_server(messages)
+    expected = fetch_emails("01-Jan-2025", "01-Mar-2025", workers=2)
+    plain_bytes = plain.bytes_sent
+
+    stats = {}
+    server = fake_imap_server(messages, compress=True)
+    emails = fetch_emails("01-Jan-2025", "01-Mar-2025", workers=2, stats=stats)
+
+    assert server.command_counts["COMPRESS"] == 2
+    assert emails == expected
+    assert stats["bytes_in_compressed"] < stats["bytes_in"] / 3
+    assert server.bytes_sent < plain_bytes / 3
+
+
+def test_compression_can_be_disabled(fake_imap_server, monkeypatch):
+    from imap_utils import open_session
+
+    server = fake_imap_server(_alerts(1), compress=True)
+    monkeypatch.setenv("IMAP_COMPRESS", "0")
+    mail = open_session("me@example.com", "secret")
+    assert getattr(mail, "compression", None) is None
+    mail.logout()
+
+    monkeypatch.delenv("IMAP_COMPRESS")
+    mail = open_session("me@example.com", "secret")
+    _, data = mail.uid("SEARCH", None, "ALL")
+    assert data == [b"1"]
+    assert mail.compression.counters()["bytes_out"] > 0
+    mail.logout()
+
+    assert server.command_counts["COMPRESS"] == 1
@@ -0,0 +1,58 @@
+import os
+import sys
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import imap_recorder
+from fake_imap import generated_mailbox
+from imap_recorder import load_recording, redact_message, replay_server
+
+RAW = (
+    b"From: Neo Financial <notifications@neofinancial.com>\r\n"
+    b"To: Jane Doe <jane@example.com>\r\n"
+    b"Subject: You spent $12.34 at Cafe Olimpico\r\n"
+    b'Content-Type: multipart/alternative; boundary="b1"\r\n'
+    b"\r\n"
+    b"--b1\r\n"
+    b"Content-Type: text/plain; charset=utf-8\r\n"
+    b"\r\n"
+    b"Jane, you spent $12.34 at Cafe Olimpico.\r\n"
+    b"--b1--\r\n"
+)
+
+
+def test_redaction_keeps_size_and_structure():
+    redacted = redact_message(RAW, ["notifications@neofinancial.com"])
+    assert len(redacted) == len(RAW)
+    assert b"From: Neo Financial <notifications@neofinancial.com>" in redacted
+    assert b'boundary="b1"' in redacted and b"--b1--" in redacted
+    assert b"Content-Type: text/plain; charset=utf-8" in redacted
+    for secret in (b"Jane", b"jane@example.com", b"12.34", b"Olimpico"):
+        assert secret not in redacted
+
+
+def test_replay_answers_like_the_recorded_server(fake_imap_server, monkeypatch, tmp_path):
+    from extracteur import fetch_emails
+
+    path = str(tmp_path / "run.imap.json.gz")
+    monkeypatch.setenv("IMAP_RECORD", path)
+    server = fake_imap_server(generated_mailbox(20), uidvalidity=7)
+    recorded = fetch_emails("01-Jan-2025", "01-Mar-2025")
+    assert imap_recorder.stop_recording() == path
+    monkeypatch.delenv("IMAP_RECORD")
+
+    recording = load_recording(path)
+    assert recording["uidvalidity"] == 7
+    assert len(recording["messages"]) == 20
+    assert "secret" not in str(recording)
+
+    replay = fake_imap_server(replay_server(path, time_scale=0))
+    replayed = fetch_emails("01-Jan-2025", "01-Mar-2025")
+
+    assert replay.command_counts == server.command_counts
+    # Masked keywords no longer pick one of the CIBC profiles, so compare messages
+    def messages(emails):
+        return sorted({(e["sender"], len(e["subject"]), len(e["full_email_html"])) for e in emails})
+
+    assert messages(replayed) == messages(recorded)
@@ -0,0 +1,65 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from conftest import make_raw_email
+
+
+def _alerts(count):
+    return [
+        make_raw_email("noreply@mbna.ca", "Transaction Alert", f"<p>purchase of ${i}.00 from SHOP</p>")
+        for i in range(count)
+    ]
+
+
+def test_iter_emails_only_downloads_ahead_of_the_consumer(fake_imap_server):
+    from extracteur import fetch_emails, iter_emails
+
+    server = fake_imap_server(_alerts(200))
+    emails = iter_emails("01-Jan-2025", "01-Mar-2025", chunk_size=5, workers=2)
+    first = next(emails)
+    # Two chunks per session in flight, plus the one being consumed
+    assert server.command_counts["UID FETCH"] <= 5
+    emails.close()
+
+    everything = fetch_emails("01-Jan-2025", "01-Mar-2025", chunk_size=5, workers=2)
+
+    assert first == everything[0]
+    assert len(everything) == 200
+
+
+def test_extract_emails_script_streams_valid_json(fake_imap_server, monkeypatch, tmp_path, capsys):
+    from api_scripts import extract_emails
+
+    monkeypatch.setenv("MESSAGE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("PATTERN_STATS_DB", str(tmp_path / "stats.db"))
+    fake_imap_server(_alerts(3))
+    monkeypatch.setattr(sys, "argv", ["extract_emails.py", "01-Jan-2025", "01-Mar-2025"])
+    extract_emails.main()
+
+    results = json.loads(capsys.readouterr().out)
+    assert [r["transaction"]["amount"] for r in results] == ["0.00", "1.00", "2.00"]
+
+
+def test_extract_emails_script_closes_the_array_on_errors(fake_imap_server, monkeypatch, tmp_path, capsys):
+    from api_scripts import extract_emails
+
+    def failing(emails, workers=1):
+        yield next(emails), {"amount": "1.00"}
+        raise ConnectionResetError("connection lost")
+
+    monkeypatch.setenv("MESSAGE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("PATTERN_STATS_DB", str(tmp_path / "stats.db"))
+    monkeypatch.setattr(extract_emails, "iter_extracted", failing)
+    fake_imap_server(_alerts(3))
+    monkeypatch.setattr(sys, "argv", ["extract_emails.py", "01-Jan-2025", "01-Mar-2025"])
+    with pytest.raises(ConnectionResetError):
+        extract_emails.main()
+
+    results = json.loads(capsys.readouterr().out)
+    assert [r["transaction"]["amount"] for r in results] == ["1.00"]
@@ -0,0 +1,62 @@
+import os
+import random
+import sys
+
+import pytest
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bank_rules import load_config
+from keyword_classifier import Automaton, KeywordClassifier, ahocorasick, classifier_for
+
+
+def _reference(sender, subject, content, config):
+    # The per-keyword loop KeywordClassifier replaces
+    for bank_name, bank_config in config["banks"].items():
+        if bank_config["sender"].lower() == sender.lower():
+            for ex_kw in bank_config.get("exclude_keywords", []):
+                if ex_kw.lower() in subject.lower() or ex_kw.lower() in content.lower():
+                    return False, None, None
+            for keyword in bank_config["keywords"]:
+                if keyword.lower() in subject.lower() or keyword.lower() in content.lower():
+                    return True, bank_name, keyword
+            return False, None, None
+    return False, None, None
+
+
+def test_automaton_reports_overlapping_phrases():
+    automaton = Automaton(["transaction alert", "mbna - transaction alert", "alert", "he", "she", "hers"])
+    assert automaton.find("mbna - transaction alert for ushers") == {
+        "transaction alert", "mbna - transaction alert", "alert", "he", "she", "hers"
+    }
+    assert automaton.find("nothing here") == {"he"}
+
+
+ENGINES = ["automaton", "substring"] + (["pyahocorasick"] if ahocorasick is not None else [])
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_classifier_matches_the_keyword_loops(engine):
+    config = load_config()
+    classifier = KeywordClassifier(config, engine=engine)
+    phrases = [kw for bank in config["banks"].values() for kw in bank["keywords"] + bank.get("exclude_keywords", [])]
+    senders = [bank["sender"].upper() for bank in config["banks"].values()] + ["someone@else.com"]
+    rng = random.Random(7)
+
+    for _ in range(500):
+        words = [rng.choice(phrases).upper() if rng.random() < 0.3 else "filler" for _ in range(rng.randint(0, 6))]
+        cut = rng.randint(0, len(words))
+        subject, content = " ".join(words[:cut]), " ".join(words[cut:])
+        sender = rng.choice(senders)
+        assert classifier.classify(sender, subject, content) == _reference(sender, subject, content, config)
+
+
+def test_classifier_for_follows_the_keywords_not_the_object():
+    config = load_config()
+    assert classifier_for(load_config()) is classifier_for(config)
+
+    email = ("noreply@mbna.ca", "MBNA - Transaction Alert", "You made a purchase")
+    assert classifier_for(config).classify(*email)[0]
+    config["banks"]["mbna_credit"]["exclude_keywords"] = ["purchase"]
+    assert classifier_for(config).classify(*email) == (False, None, None)
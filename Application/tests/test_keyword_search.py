@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from conftest import make_raw_email
+from sender_plan import bank_search_terms
+
+
+def _mailbox():
+    return [
+        make_raw_email("noreply@mbna.ca", "Transaction Alert", "<p>purchase of $1.00 from SHOP</p>"),
+        make_raw_email("noreply@mbna.ca", "New card offer", "<p>Apply today</p>"),
+        make_raw_email("info@neofinancial.com", "Neo newsletter", "<p>News</p>"),
+        make_raw_email("info@neofinancial.com", "You made a purchase", "<p>purchase of $5.00 at CAFE</p>"),
+        make_raw_email(
+            "capitalone@notification.capitalone.com",
+            "Payment posted",
+            "<p>A transaction was charged to your account</p>",
+        ),
+        make_raw_email(
+            "capitalone@notification.capitalone.com",
+            "Alert",
+            "<p>A transaction was charged to your account: SHOP $3.00</p>",
+        ),
+    ]
+
+
+def test_bank_search_terms():
+    cfg = {"keywords": ["a", "b"], "exclude_keywords": ['say "no"']}
+    assert bank_search_terms(cfg) == '(OR TEXT "a" TEXT "b" NOT TEXT "say \\"no\\"")'
+    # Keywords can sit in the body of any profile's emails
+    assert bank_search_terms({"keywords": ["a"], "subject_keywords": True}) == 'TEXT "a"'
+    assert bank_search_terms({"keywords": ["Achat réussi"]}) is None
+
+
+@pytest.mark.parametrize("unsupported", [set(), {b"TEXT", b"SUBJECT"}])
+def test_keyword_search_only_downloads_claimed_emails(fake_imap_server, unsupported):
+    from extracteur import fetch_emails
+
+    server = fake_imap_server(_mailbox())
+    server.mailbox.unsupported_keys = unsupported
+    stats = {}
+    emails = fetch_emails("01-Jan-2025", "01-Mar-2025", keyword_search=True, stats=stats)
+
+    assert [(e["bank_config"], e["subject"]) for e in emails] == [
+        ("capital_one_credit", "Alert"),
+        ("mbna_credit", "Transaction Alert"),
+        ("neo_credit", "You made a purchase"),
+    ]
+    if unsupported:
+        assert stats["messages_fetched"] == 6
+    else:
+        assert stats["messages_fetched"] == 3
+        assert stats["keyword_search"]["info@neofinancial.com"] == (1, 2)
@@ -0,0 +1,47 @@
+import os
+import sys
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from conftest import make_raw_email
+from message_cache import MessageCache
+
+
+def test_cache_is_content_addressed(tmp_path):
+    raw = make_raw_email("noreply@mbna.ca", "Alert", "<p>x</p>").replace(
+        b"Subject:", b"Message-ID: <a1@mbna.ca>\r\nSubject:"
+    )
+    with MessageCache(str(tmp_path), codec="zlib") as cache:
+        digest = cache.put(raw, "noreply@mbna.ca")
+        assert cache.put(raw) == digest
+        assert len(cache) == 1
+        assert cache.get(digest) == raw
+        assert cache.get_by_message_id("<a1@mbna.ca>") == raw
+
+    # The index survives reopening the cache
+    with MessageCache(str(tmp_path)) as cache:
+        assert digest in cache
+        assert list(cache.iter_messages("noreply@mbna.ca", "10-Feb-2025", "11-Feb-2025"))
+        assert not list(cache.iter_messages("noreply@mbna.ca", "11-Feb-2025", "12-Feb-2025"))
+
+
+def test_offline_replay_matches_online_fetch(fake_imap_server, monkeypatch, tmp_path):
+    from extracteur import fetch_emails
+
+    messages = [
+        make_raw_email("noreply@mbna.ca", "Transaction Alert", f"<p>purchase of ${i}.00</p>")
+        for i in range(5)
+    ] + [make_raw_email("info@neofinancial.com", "Neo alert", "<p>purchase</p>")]
+
+    with MessageCache(str(tmp_path)) as cache:
+        fake_imap_server(messages)
+        online = fetch_emails("01-Jan-2025", "01-Mar-2025", cache=cache)
+
+        # Point at a closed port: nothing may reach the network any more
+        monkeypatch.setenv("IMAP_PORT", "1")
+        stats = {}
+        offline = fetch_emails("01-Jan-2025", "01-Mar-2025", cache=cache, offline=True, stats=stats)
+
+    assert offline == online
+    assert stats["messages_read"] == 6
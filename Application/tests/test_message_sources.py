@@ -0,0 +1,92 @@
+import mailbox
+import os
+import shutil
+import sys
+
+import pytest
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from conftest import make_raw_email
+from message_sources import EmlDirectorySource, LocalSource, MaildirSource, MboxSource, open_source
+
+
+def _messages():
+    return [
+        make_raw_email("MBNA <noreply@mbna.ca>", "Transaction Alert", "<p>purchase of $1.00</p>"),
+        make_raw_email("friend@example.com", "Hello", "<p>From the beach</p>"),
+        make_raw_email("info@neofinancial.com", "Neo", "<p>purchase</p>", date="Mon, 1 Jan 2024 10:00:00 -0500"),
+        make_raw_email("noreply@mbna.ca", "Transaction Alert", "<p>purchase of $2.00\n\nFrom here</p>"),
+    ]
+
+
+def _write_sources(tmp_path):
+    box = mailbox.mbox(str(tmp_path / "takeout.mbox"))
+    maildir = mailbox.Maildir(str(tmp_path / "Maildir"))
+    (tmp_path / "eml").mkdir()
+    for index, raw in enumerate(_messages()):
+        box.add(raw)
+        maildir.add(raw)
+        (tmp_path / "eml" / f"{index:02d}.eml").write_bytes(raw)
+    box.close()
+    return tmp_path / "takeout.mbox", tmp_path / "Maildir", tmp_path / "eml"
+
+
+def test_open_source_detects_layout(tmp_path):
+    mbox_path, maildir_path, eml_path = _write_sources(tmp_path)
+    assert isinstance(open_source(str(mbox_path)), MboxSource)
+    assert isinstance(open_source(str(maildir_path)), MaildirSource)
+    assert isinstance(open_source(str(eml_path)), EmlDirectorySource)
+
+
+def test_mbox_stream_restores_original_messages(tmp_path):
+    mbox_path, _, _ = _write_sources(tmp_path)
+    streamed = [raw for _, raw in MboxSource(str(mbox_path)).iter_raw()]
+    assert [raw.rstrip() for raw in streamed] == [raw.rstrip() for raw in _messages()]
+
+
+def test_local_sources_feed_fetch_emails(tmp_path):
+    from extracteur import fetch_emails
+
+    results = []
+    for path in _write_sources(tmp_path):
+        stats = {}
+        emails = fetch_emails("01-Feb-2025", "01-Mar-2025", source=open_source(str(path)), stats=stats)
+        assert stats["messages_read"] == 4
+        results.append(emails)
+
+    # mbox stores every message with a final newline
+    for emails in results:
+        for email in emails:
+            email["full_email_html"] = email["full_email_html"].rstrip()
+        # Maildir names (seconds, then unpadded microseconds) do not keep the order of delivery
+        emails.sort(key=lambda e: e["full_email_html"])
+    assert results[0] == results[1] == results[2]
+    assert [e["bank_config"] for e in results[0]] == ["mbna_credit", "mbna_credit"]
+    assert "From here" in results[0][1]["full_email_html"]
+
+
+def test_incomplete_sources_cannot_be_instantiated():
+    class NoRawMessages(LocalSource):
+        pass
+
+    with pytest.raises(TypeError):
+        NoRawMessages()
+
+
+def test_script_extractors_read_message_source(tmp_path, monkeypatch):
+    import emailextractor
+    import Realtransactions
+
+    mbox_path, _, _ = _write_sources(tmp_path)
+    monkeypatch.setattr(Realtransactions, "MESSAGE_SOURCE", str(mbox_path))
+    monkeypatch.setattr(Realtransactions, "OUTPUT_DIR", str(tmp_path / "TestEmails"))
+    monkeypatch.setattr(emailextractor, "MESSAGE_SOURCE", str(mbox_path))
+    monkeypatch.setattr(emailextractor, "OUTPUT_DIR", str(tmp_path / "TestEmails"))
+
+    for script in (Realtransactions, emailextractor):
+        emails = script.fetch_transaction_emails_only()
+        shutil.rmtree(tmp_path / "TestEmails")
+        assert [(e["bank_name"], e["subject"]) for e in emails] == [("mbna_credit", "Transaction Alert")] * 2
+        assert [e["filename"][:4] for e in emails] == ["0001", "0002"]
@@ -0,0 +1,51 @@
+import os
+import sys
+from email.message import EmailMessage
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from partial_fetch import find_text_part, parse_sexp
+
+MBNA = "noreply@mbna.ca"
+
+
+def _alert(html, cte="quoted-printable", with_image=True):
+    msg = EmailMessage()
+    msg["From"] = MBNA
+    msg["Subject"] = "MBNA - Transaction Alert"
+    msg["Date"] = "Mon, 10 Feb 2025 10:00:00 -0500"
+    msg.set_content("You made a purchase (plain part)")
+    msg.add_alternative(html, subtype="html", cte=cte)
+    if with_image:
+        msg.add_attachment(b"\x89PNG" * 5000, maintype="image", subtype="png", filename="logo.png")
+    return msg.as_bytes()
+
+
+def test_find_text_part_prefers_html():
+    structure, _ = parse_sexp(
+        b'((("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "7BIT" 11 1 NIL NIL)'
+        b'("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "BASE64" 15 1 NIL NIL) "ALTERNATIVE" NIL NIL NIL NIL)'
+        b'("IMAGE" "PNG" NIL NIL NIL "BASE64" 5407 NIL NIL) "MIXED" NIL NIL NIL NIL)'
+    )
+    assert find_text_part(structure) == ("1.2", "html", b"base64")
+    assert find_text_part(parse_sexp(b'("TEXT" "PLAIN" NIL NIL NIL "7BIT" 4 1)')[0]) == ("1", "plain", b"7bit")
+
+
+def test_partial_fetch_matches_full_fetch(fake_imap_server):
+    from extracteur import fetch_emails
+
+    messages = [
+        _alert("<p>You made a purchase of $9.99 from Café Olé</p>"),
+        _alert("<p>You made a purchase of $5.00 from STORE</p>", cte="base64"),
+        _alert("<p>You made a purchase of $1.00 from SHOP</p>", with_image=False),
+    ]
+    fake_imap_server(messages)
+    full = fetch_emails("01-Jan-2025", "01-Mar-2025")
+    stats = {}
+    partial = fetch_emails("01-Jan-2025", "01-Mar-2025", partial=True, stats=stats)
+    capped = fetch_emails("01-Jan-2025", "01-Mar-2025", partial=True, max_body_bytes=12)
+
+    assert partial == full
+    assert stats["bytes_fetched"] < stats["bytes_total"] / 5
+    assert all(len(e["full_email_html"].encode()) <= 12 for e in capped)
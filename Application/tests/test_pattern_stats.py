@@ -0,0 +1,48 @@
+import os
+import sys
+
+# Ensure Application modules and the project root can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import pattern_stats
+from bank_rules import BankRuleSet
+
+CONFIG = {
+    "banks": {
+        "shop_credit": {
+            "sender": "alerts@bank.example",
+            "keywords": ["Purchase"],
+            "regex": [
+                {"amount": r"Paid \$([0-9]+\.[0-9]{2}) at", "description": r"at ([A-Z ]+)"},
+                {"amount": r"Achat de ([0-9]+,[0-9]{2}) \$", "description": r"chez ([A-Z ]+)"},
+            ],
+        }
+    }
+}
+
+ENGLISH = "Paid $12.50 at CORNER STORE"
+FRENCH = "Achat de 12,50 $ chez DEPANNEUR"
+
+
+def test_frequent_variant_is_tried_first_across_runs(tmp_path):
+    db_path = str(tmp_path / "stats.db")
+    rules = pattern_stats.prime(BankRuleSet(CONFIG), db_path)
+    rule = rules.banks["shop_credit"]
+    assert rule.order == [0, 1]
+
+    for text in (FRENCH, FRENCH, ENGLISH):
+        amount, description = rule.match(text)
+        assert amount and description
+    # The French variant overtook the English one during the run
+    assert rule.order == [1, 0]
+    pattern_stats.save(rules, db_path)
+
+    # A new run starts from the persisted order and reports the counts
+    next_run = pattern_stats.prime(BankRuleSet(CONFIG), db_path)
+    assert next_run.banks["shop_credit"].order == [1, 0]
+    amount, description = next_run.banks["shop_credit"].match(ENGLISH)
+    assert (amount.group(1), description.group(1)) == ("12.50", "CORNER STORE")
+
+    rows = pattern_stats.report(next_run, db_path)
+    assert [(r["variant"], r["rank"], r["recent"], r["total"]) for r in rows] == [(1, 2, 1, 1), (2, 1, 2, 2)]
@@ -0,0 +1,34 @@
+import os
+import sys
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from conftest import make_raw_email
+from Realtransactions import load_config
+from sender_plan import downloads_saved, group_banks_by_sender
+
+CIBC = "mailbox.noreply@cibc.com"
+
+
+def test_shared_sender_is_grouped():
+    groups = group_banks_by_sender(load_config())
+    assert groups[CIBC] == ["cibc_debit", "cibc_credit"]
+    assert downloads_saved(groups, {CIBC: 10, "noreply@mbna.ca": 4}) == 10
+
+
+def test_fetch_emails_downloads_shared_sender_once(stub_imap, tmp_path):
+    from extracteur import fetch_emails
+
+    stub = stub_imap({
+        1: (CIBC, make_raw_email(CIBC, "Nouvel achat avec votre carte de credit", "<p>achat de 12,34$ MAXI avec votre</p>")),
+        2: (CIBC, make_raw_email(CIBC, "Achat en point de vente", "<p>Montant de l'achat : 5,00$</p>")),
+    })
+    stats = {}
+
+    emails = fetch_emails("01-Jan-2025", "01-Mar-2025", stats=stats)
+
+    searches = [c for c in stub.commands if c[0] == "SEARCH" and CIBC in c[-1]]
+    assert len(searches) == 1
+    assert [e["bank_config"] for e in emails] == ["cibc_credit", "cibc_debit"]
+    assert stats["downloads_saved"] == 2
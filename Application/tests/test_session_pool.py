@@ -0,0 +1,68 @@
+import imaplib
+import os
+import sys
+
+import pytest
+
+# Ensure Application modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from conftest import make_raw_email
+from imap_utils import IMAPSessionPool, fetch_messages_parallel
+
+
+def _mailbox():
+    senders = ["noreply@mbna.ca", "info@neofinancial.com", "noreply@mbna.ca"]
+    return [
+        make_raw_email(senders[i % 3], "Transaction Alert", f"<p>purchase of ${i}.00 from SHOP{i}</p>")
+        for i in range(30)
+    ]
+
+
+def test_parallel_fetch_matches_serial_order(fake_imap_server):
+    from extracteur import fetch_emails
+
+    fake_imap_server(_mailbox())
+    serial = fetch_emails("01-Jan-2025", "01-Mar-2025", chunk_size=4)
+    parallel = fetch_emails("01-Jan-2025", "01-Mar-2025", chunk_size=4, workers=4)
+
+    assert len(serial) == 30
+    assert parallel == serial
+
+
+def test_pool_reconnects_after_connection_error():
+    class FlakySession:
+        broken = True
+
+        def uid(self, command, uid_set, parts):
+            if FlakySession.broken:
+                FlakySession.broken = False
+                raise imaplib.IMAP4.abort("socket error: EOF")
+            return "OK", [(f"1 (UID {uid_set} RFC822 {{1}}".encode(), b"x"), b")"]
+
+        def logout(self):
+            pass
+
+    pool = IMAPSessionPool(FlakySession, size=2)
+    assert list(fetch_messages_parallel(pool, [b"7"])) == [(b"7", b"x")]
+    assert pool.reconnects == 1
+
+
+def test_imap_workers_come_from_the_environment_or_the_command_line(monkeypatch):
+    from imap_utils import IMAP_WORKERS, imap_workers
+    from main import parse_args
+
+    monkeypatch.delenv("IMAP_WORKERS", raising=False)
+    assert imap_workers() == IMAP_WORKERS
+    assert parse_args([]).imap_workers == IMAP_WORKERS
+
+    monkeypatch.setenv("IMAP_WORKERS", "8")
+    assert parse_args(["01-Jan-2025"]).imap_workers == 8
+    args = parse_args(["01-Jan-2025", "--imap-workers", "2", "--workers", "3"])
+    assert (args.imap_workers, args.workers) == (2, 3)
+
+    monkeypatch.setenv("IMAP_WORKERS", "0")
+    with pytest.raises(ValueError):
+        imap_workers()
+    with pytest.raises(SystemExit):
+        parse_args(["--imap-workers", "0"])
@@ -0,0 +1,58 @@
+import os
+import sys
+
+# Ensure the project root is importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from Database.SyncState import get_sync_state, update_sync_state
+
+
+def test_sync_state_round_trip(tmp_path):
+    db_path = str(tmp_path / "sync.db")
+    assert get_sync_state("me@example.com", "Inbox", "noreply@mbna.ca", db_path) is None
+
+    update_sync_state("me@example.com", "Inbox", "noreply@mbna.ca", 7, 120, db_path)
+    update_sync_state("me@example.com", "Inbox", "noreply@mbna.ca", 7, 135, db_path)
+
+    assert get_sync_state("me@example.com", "Inbox", "noreply@mbna.ca", db_path) == (7, 135)
+    assert get_sync_state("me@example.com", "Inbox", "info@neofinancial.com", db_path) is None
+
+
+def test_incremental_fetch_only_requests_new_uids(stub_imap, tmp_path):
+    from conftest import make_raw_email
+    from extracteur import fetch_emails
+
+    db_path = str(tmp_path / "sync.db")
+    sender = "noreply@mbna.ca"
+    messages = {
+        uid: (sender, make_raw_email(sender, "Transaction Alert", f"<p>{uid}</p>"))
+        for uid in (3, 5)
+    }
+    stub_imap(messages)
+
+    first = fetch_emails("01-Jan-2025", "01-Mar-2025", incremental=True, db_path=db_path)
+    assert len(first) == 2
+    assert get_sync_state("me@example.com", "Inbox", sender, db_path) == (1, 5)
+
+    assert fetch_emails("01-Jan-2025", "01-Mar-2025", incremental=True, db_path=db_path) == []
+
+    messages[9] = (sender, make_raw_email(sender, "Transaction Alert", "<p>9</p>"))
+    stub = stub_imap(messages)
+    third = fetch_emails("01-Jan-2025", "01-Mar-2025", incremental=True, db_path=db_path)
+    assert [e["full_email_html"] for e in third] == ["<p>9</p>"]
+    assert ("SEARCH", None, f'(UID 6:* FROM "{sender}")') in stub.commands
+
+
+def test_uidvalidity_change_triggers_full_resync(stub_imap, tmp_path):
+    from conftest import make_raw_email
+    from extracteur import fetch_emails
+
+    db_path = str(tmp_path / "sync.db")
+    sender = "noreply@mbna.ca"
+    update_sync_state("me@example.com", "Inbox", sender, 1, 50, db_path)
+
+    stub_imap({4: (sender, make_raw_email(sender, "Transaction Alert", "<p>4</p>"))}, uidvalidity=2)
+    emails = fetch_emails("01-Jan-2025", "01-Mar-2025", incremental=True, db_path=db_path)
+
+    assert len(emails) == 1
+    assert get_sync_state("me@example.com", "Inbox", sender, db_path) == (2, 4)
@@ -0,0 +1,94 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# Ensure the project root can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from conftest import make_transactions_db
+from Database.Insert import insert_transaction, insert_transactions
+from Database.TransactionStore import TransactionStore
+
+
+def transaction(amount="12.50", description="UBER CANADA", date="2025-02-10"):
+    return {
+        "amount": amount,
+        "description": description,
+        "card type": "credit card",
+        "date": date,
+        "time": "10:00:00",
+        "bank": "neo_credit",
+        "full_email": "",
+        "tags": ["Card"],
+    }
+
+
+def test_store_inserts_like_insert_transaction(transactions_db):
+    single = insert_transaction(transaction(), db_path=transactions_db)
+    with TransactionStore(transactions_db, pragmas={"synchronous": "NORMAL"}) as store:
+        first = store.insert(transaction(description="Uber Eats"))
+        second = store.insert(transaction(amount="3.00", description="Cafe"))
+        invalid = store.insert(transaction(amount="n/a"))
+        assert store.is_duplicate("12.5", "2025-02-11")
+        assert not store.is_duplicate("12.5", "2025-02-13")
+
+    assert single["category"] == first["category"] == "Transport"
+    assert sorted(single["tags"]) == sorted(first["tags"]) == ["Card", "Rides", "Uber"]
+    assert first["applied_rules"] == [{"keyword": "uber", "category": "Transport", "tags": ["Rides", "Uber"]}]
+    assert second == {"transaction_id": first["transaction_id"] + 1, "category": "Uncategorized",
+                      "tags": ["Card"], "applied_rules": []}
+    assert invalid == {"error": "Invalid amount: n/a"}
+
+    conn = sqlite3.connect(transactions_db)
+    assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 3
+    assert conn.execute("SELECT COUNT(*) FROM transaction_tags").fetchone()[0] == 7
+    conn.close()
+
+
+def test_store_rejects_malformed_pragmas(transactions_db):
+    with pytest.raises(ValueError):
+        TransactionStore(transactions_db, pragmas={"cache_size; DROP TABLE tags": 1})
+
+
+def test_bulk_insert_matches_single_inserts(transactions_db, tmp_path):
+    rows = [
+        transaction(description="Uber Eats"),
+        transaction(amount="n/a"),
+        transaction(amount="3.00", description="Cafe"),
+        transaction(amount=None, description="Pending"),
+        transaction(amount="8.20", description="UBER TRIP", date="2025-02-12"),
+    ]
+    with TransactionStore(transactions_db) as store:
+        expected = [store.insert(dict(row)) for row in rows]
+
+    bulk_db = str(tmp_path / "bulk.db")
+    make_transactions_db(bulk_db)
+    stats = {}
+    results = insert_transactions(rows, batch_size=2, db_path=bulk_db, stats=stats)
+
+    def normalized(results):
+        return [dict(r, tags=sorted(r["tags"])) if "tags" in r else r for r in results]
+
+    assert normalized(results) == normalized(expected)
+    assert stats["rows"] == 3 and stats["errors"] == 2 and stats["rows_per_second"] > 0
+    query = (
+        "SELECT t.id, amount, description, category, tag_name FROM transactions t "
+        "LEFT JOIN transaction_tags l ON l.transaction_id = t.id "
+        "LEFT JOIN tags ON tags.id = l.tag_id ORDER BY 1, 5"
+    )
+    assert sqlite3.connect(bulk_db).execute(query).fetchall() == sqlite3.connect(transactions_db).execute(query).fetchall()
+
+
+def test_statement_export_imports_in_one_pass(transactions_db):
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "Transactions")))
+    from import_json import insert_transactions_from_json
+
+    export = os.path.join(os.path.dirname(__file__), "..", "..", "Database", "Alltransactions.json")
+    stats = insert_transactions_from_json(export, db_path=transactions_db)
+
+    count = sqlite3.connect(transactions_db).execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+    assert count == stats["rows"] > 1000
+    assert stats["seconds"] < 1
+
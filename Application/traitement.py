@@ -1,34 +1,20 @@
 import os
-import re
-import yaml
 import email.utils
 import sqlite3
 import logging
 from datetime import datetime, timedelta
-from bs4 import BeautifulSoup
+
+from bank_rules import load_rules, rules_for
+from email_record import as_record
 
 # Setup basic logging if not already configured
 if not logging.getLogger().handlers:
     logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# ✅ Load configuration file
-CONFIG_FILE = os.path.join(os.path.dirname(__file__), "config.yml")
-with open(CONFIG_FILE, "r") as f:
-    config = yaml.safe_load(f)
-
 def identify_bank(email_sender, email_subject):
     """Identify the bank that sent the email based on sender and subject."""
-    logger.debug("Subject: %s", email_subject)
-    for bank, details in config["banks"].items():
-        logger.debug("Checking keywords for %s: %s", bank, details["keywords"])
-        if details["sender"] == email_sender:
-            if any(keyword in email_subject for keyword in details["keywords"]):
-                logger.info("Identified Bank: %s", bank)
-                return bank
-    logger.warning("Could not identify bank for sender: %s", email_sender)
-    logger.debug("Subject was: %s", email_subject)
-    return "Unknown"
+    return load_rules().identify_bank(email_sender, email_subject)
 
 
 def is_duplicate(amount: str, date: str) -> bool:
@@ -60,6 +46,8 @@ def extract_transaction_data(
     email_subject: str | None = None,
     email_datetime: str | None = None,
     cfg: dict | None = None,
+    check_duplicate: bool = True,
+    store=None,
 ):
     """Extract transaction details from an email.
 
@@ -67,20 +55,27 @@ def extract_transaction_data(
     ----------
     email_data : dict | str
         Either a dictionary returned by ``fetch_emails`` or the plain text body
-        of an email for backward compatibility.
+        of an email for backward compatibility. The text of an
+        ``EmailRecord`` is reused when it was already parsed.
     email_sender : str, optional
         Sender address if ``email_data`` is not a dictionary.
     email_subject : str, optional
         Email subject if ``email_data`` is not a dictionary.
     email_datetime : str, optional
         Date header value if ``email_data`` is not a dictionary.
-    cfg : dict, optional
-        Configuration dictionary. Defaults to ``config`` loaded from
-        ``config.yml``.
+    cfg : dict | BankRuleSet, optional
+        Configuration dictionary or compiled rules. Defaults to the rules
+        shared through ``bank_rules.load_rules``.
+    check_duplicate : bool, optional
+        Look for a similar transaction in the database. Disabled by the
+        ``extraction_pool`` workers, which leave that check to the process
+        writing the transactions.
+    store : TransactionStore, optional
+        Open ``Database.TransactionStore`` to run the duplicate check on,
+        instead of opening a connection to ``transactions.db`` for it.
     """
 
-    if cfg is None:
-        cfg = config
+    rules = rules_for(cfg)
 
     # Determine whether ``email_data`` is new-style dict or plain text
     bank_key = None
@@ -90,46 +85,30 @@ def extract_transaction_data(
         email_datetime = email_data.get("email_datetime", email_datetime)
         bank_key = email_data.get("bank_config")
         html = email_data.get("full_email_html", "")
-        soup = BeautifulSoup(html, "html.parser")
-        email_text = soup.get_text(separator="\n")
+        email_text = as_record(email_data).text
     else:
+        html = ""
         email_text = email_data
 
     parsed_date = email.utils.parsedate_to_datetime(email_datetime) if email_datetime else None
     formatted_date = parsed_date.strftime("%Y-%m-%d %H:%M:%S") if parsed_date else None
 
-    bank_name = bank_key or identify_bank(email_sender, email_subject)
+    bank_name = bank_key or rules.identify_bank(email_sender, email_subject)
     extracted_data = {"amount": None, "description": None, "card_type": None}
 
-    if bank_name != "Unknown" and bank_name in cfg.get("banks", {}):
-        try:
-            regex_patterns = cfg["banks"][bank_name]["regex"]
-
-            amount_match = description_match = None
-
-            if isinstance(regex_patterns, list):
-                for pat in regex_patterns:
-                    if not isinstance(pat, dict):
-                        continue
-                    a_match = re.search(pat.get("amount", ""), email_text)
-                    d_match = re.search(pat.get("description", ""), email_text)
-                    if a_match and d_match:
-                        amount_match = a_match
-                        description_match = d_match
-                        break
-            else:
-                amount_match = re.search(regex_patterns["amount"], email_text)
-                description_match = re.search(regex_patterns["description"], email_text)
-
+    rule = rules.banks.get(bank_name)
+    if rule is not None:
+        if rule.patterns is None:
+            logger.error("Regex patterns not found for %s in config.", bank_name)
+        else:
+            amount_match, description_match = rule.match(email_text)
             extracted_data["amount"] = (
                 amount_match.group(1).replace(",", ".") if amount_match else None
             )
             extracted_data["description"] = (
                 description_match.group(1).strip() if description_match else None
             )
-            extracted_data["card_type"] = "credit card" if "credit" in bank_name else "debit card"
-        except KeyError:
-            logger.error("Regex patterns not found for %s in config.", bank_name)
+            extracted_data["card_type"] = rule.card_type
 
     ordered_data = {
         "amount": extracted_data.get("amount"),
@@ -142,8 +121,9 @@ def extract_transaction_data(
     }
 
     dup = False
-    if ordered_data["amount"] and ordered_data["date"]:
-        dup = is_duplicate(ordered_data["amount"], ordered_data["date"])
+    if check_duplicate and ordered_data["amount"] and ordered_data["date"]:
+        check = store.is_duplicate if store is not None else is_duplicate
+        dup = check(ordered_data["amount"], ordered_data["date"])
 
     ordered_data["duplicate"] = dup
     return ordered_data
@@ -0,0 +1,239 @@
+import sqlite3
+import os
+from collections import deque
+from contextlib import contextmanager
+
+
+def _default_db_path():
+    base_dir = os.path.abspath(os.path.dirname(__file__))
+    return os.path.join(base_dir, "transactions.db")
+
+
+def ensure_backfill_tables(cursor):
+    """Create the tables recording the progress of date-range backfills."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account TEXT NOT NULL,
+            mailbox TEXT NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP DEFAULT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_progress (
+            run_id INTEGER NOT NULL,
+            sender TEXT NOT NULL,
+            uidvalidity INTEGER NOT NULL,
+            last_uid INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (run_id, sender),
+            FOREIGN KEY (run_id) REFERENCES backfill_runs(id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_inserted (
+            run_id INTEGER NOT NULL,
+            sender TEXT NOT NULL,
+            uid INTEGER NOT NULL,
+            transaction_id INTEGER NOT NULL,
+            FOREIGN KEY (run_id) REFERENCES backfill_runs(id)
+        )
+    """)
+
+
+class BackfillCheckpoint:
+    """Progress of one date-range backfill, persisted after every message.
+
+    ``iter_emails`` calls :meth:`begin` once connected, asks
+    :meth:`resume_uid` where each sender should restart and calls
+    :meth:`message_done` once the consumer is done with a message. The
+    consumer reports the transactions it stored with :meth:`add_inserted`;
+    they are saved together with the message's UID, in one commit.
+
+    A run interrupted before :meth:`finish` is resumed by the next
+    checkpoint opened for the same account, mailbox and date range. Only
+    the message being processed at the time of the interruption is
+    processed again.
+
+    Given the ``TransactionStore`` the transactions are inserted with, the
+    checkpoint writes on the store's connection instead of its own. The
+    consumer then inserts with ``commit=False``, and each message's
+    transactions are committed in the same SQLite transaction as the
+    message's progress: an interrupted message leaves nothing behind, so
+    processing it again on resume inserts nothing twice.
+
+    A consumer reading ahead of the records it has stored (such as the
+    ``extraction_pool`` stage) opens the checkpoint with ``deferred=True``
+    and calls :meth:`acknowledge` once each record is stored. A message is
+    then only recorded, and the run only finished, when every record
+    yielded before it was acknowledged.
+    """
+
+    def __init__(self, db_path=None, deferred=False, store=None):
+        self.store = store
+        self.db_path = store.db_path if store is not None else db_path or _default_db_path()
+        self.deferred = deferred
+        self.run_id = None
+        self.resumed = False
+        self._progress = {}
+        self._pending = []
+        self._yielded = 0
+        self._acknowledged = 0
+        self._marks = deque()
+        self._finish_requested = False
+
+    @contextmanager
+    def _transaction(self, commit=True):
+        """Yield a cursor, then commit what it wrote unless ``commit`` is false.
+
+        With a store, the commit also covers the transactions inserted
+        through it since the previous one.
+        """
+        if self.store is not None:
+            conn = self.store.conn
+            try:
+                ensure_backfill_tables(conn.cursor())
+                yield conn.cursor()
+                if commit:
+                    conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            return
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            ensure_backfill_tables(conn.cursor())
+            yield conn.cursor()
+            if commit:
+                conn.commit()
+        finally:
+            conn.close()
+
+    def begin(self, account, mailbox, start_date, end_date):
+        """Resume the unfinished run for this range, or start a new one."""
+        with self._transaction() as cursor:
+            cursor.execute(
+                """
+                SELECT id FROM backfill_runs
+                WHERE account = ? AND mailbox = ? AND start_date = ? AND end_date = ?
+                      AND status = 'running'
+                ORDER BY id DESC LIMIT 1
+                """,
+                (account, mailbox, start_date, end_date),
+            )
+            row = cursor.fetchone()
+            if row:
+                self.run_id, self.resumed = row[0], True
+                cursor.execute(
+                    "SELECT sender, uidvalidity, last_uid FROM backfill_progress WHERE run_id = ?",
+                    (self.run_id,),
+                )
+                self._progress = {sender: (validity, uid) for sender, validity, uid in cursor.fetchall()}
+            else:
+                cursor.execute(
+                    """
+                    INSERT INTO backfill_runs (account, mailbox, start_date, end_date)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    (account, mailbox, start_date, end_date),
+                )
+                self.run_id, self.resumed = cursor.lastrowid, False
+                self._progress = {}
+        return self.run_id
+
+    def resume_uid(self, sender, uidvalidity):
+        """First UID still to process for ``sender``, or ``None`` to start over.
+
+        Progress recorded under another UIDVALIDITY is ignored since those
+        UIDs no longer designate the same messages.
+        """
+        state = self._progress.get(sender)
+        if state and state[0] == uidvalidity:
+            return state[1] + 1
+        return None
+
+    def add_inserted(self, transaction_id):
+        """Remember a transaction stored for the message being processed."""
+        if transaction_id is not None:
+            self._pending.append(transaction_id)
+
+    def record_yielded(self):
+        """Count a record handed to the consumer (called by ``iter_emails``)."""
+        self._yielded += 1
+
+    def acknowledge(self):
+        """Report that the consumer stored a yielded record (deferred mode)."""
+        if not self.deferred:
+            return
+        self._acknowledged += 1
+        self._flush()
+
+    def _flush(self):
+        while self._marks and self._marks[0][0] <= self._acknowledged:
+            _, sender, uidvalidity, uid = self._marks.popleft()
+            self._save_progress(sender, uidvalidity, uid)
+        if self._finish_requested and not self._marks:
+            self._finish_requested = False
+            self._mark_finished()
+
+    def message_done(self, sender, uidvalidity, uid):
+        """Record ``uid`` as processed, with the transactions it produced."""
+        if self.deferred:
+            self._marks.append((self._yielded, sender, uidvalidity, uid))
+            self._flush()
+            return
+        self._save_progress(sender, uidvalidity, uid)
+
+    def _save_progress(self, sender, uidvalidity, uid):
+        with self._transaction() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO backfill_progress (run_id, sender, uidvalidity, last_uid)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (run_id, sender) DO UPDATE SET
+                    uidvalidity = excluded.uidvalidity,
+                    last_uid = excluded.last_uid,
+                    updated_at = CURRENT_TIMESTAMP
+                """,
+                (self.run_id, sender, int(uidvalidity), int(uid)),
+            )
+            cursor.executemany(
+                """
+                INSERT INTO backfill_inserted (run_id, sender, uid, transaction_id)
+                VALUES (?, ?, ?, ?)
+                """,
+                [(self.run_id, sender, int(uid), tid) for tid in self._pending],
+            )
+        self._progress[sender] = (int(uidvalidity), int(uid))
+        self._pending = []
+
+    def inserted_ids(self):
+        """Transaction ids stored by this run so far, resumed attempts included."""
+        with self._transaction(commit=False) as cursor:
+            cursor.execute(
+                "SELECT transaction_id FROM backfill_inserted WHERE run_id = ? ORDER BY rowid",
+                (self.run_id,),
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def finish(self):
+        """Mark the run complete so the same range starts afresh next time."""
+        if self.deferred and self._marks:
+            self._finish_requested = True
+            return
+        self._mark_finished()
+
+    def _mark_finished(self):
+        with self._transaction() as cursor:
+            cursor.execute(
+                """
+                UPDATE backfill_runs SET status = 'done', finished_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+                """,
+                (self.run_id,),
+            )
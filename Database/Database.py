@@ -82,6 +82,19 @@ def create_database():
         )
     """)
 
+    # ✅ Create imap_sync_state table to remember the last UID fetched per sender
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS imap_sync_state (
+            account TEXT NOT NULL,
+            mailbox TEXT NOT NULL,
+            sender TEXT NOT NULL,
+            uidvalidity INTEGER NOT NULL,
+            last_uid INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (account, mailbox, sender)
+        )
+    """)
+
     conn.commit()
     conn.close()
     print("✅ SQLite database and tables created successfully!")
@@ -1,115 +1,39 @@
-import sqlite3
 import os
+import sys
 import logging
 
+# ✅ Add the root folder to Python’s module search path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from Database.TransactionStore import (  # noqa: F401 (re-exported)
+    INSERT_BATCH_SIZE,
+    TransactionStore,
+    apply_keyword_rules,
+)
+
 # Configure logging if not already done
 if not logging.getLogger().handlers:
     logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-def apply_keyword_rules(cursor, description, category, tags):
-    """Apply keyword-based rules to set category and tags and return matched rules."""
-    cursor.execute(
-        """
-        SELECT keyword, category, tags FROM keyword_rules
-        WHERE ? LIKE '%' || keyword || '%' COLLATE NOCASE
-        """,
-        (description,),
-    )
-
-    tag_set = set(tags)
-    final_category = category
-    matched_rules = []
-
-    for keyword, rule_category, rule_tags in cursor.fetchall():
-        rule_info = {"keyword": keyword}
-        if rule_category:
-            final_category = rule_category
-            rule_info["category"] = rule_category
-        else:
-            rule_info["category"] = None
-        if rule_tags:
-            parsed_tags = [t.strip() for t in rule_tags.split(',') if t.strip()]
-            tag_set.update(parsed_tags)
-            rule_info["tags"] = parsed_tags
-        else:
-            rule_info["tags"] = []
-        matched_rules.append(rule_info)
-
-    return final_category, list(tag_set), matched_rules
 
-def insert_transaction(ordered_data):
+def insert_transaction(ordered_data, db_path=None):
     """
     Inserts a transaction into the database and associates it with relevant tags.
-    """
-    # ✅ Ensure correct database path
-    base_dir = os.path.abspath(os.path.dirname(__file__))
-    db_path = os.path.join(base_dir, "transactions.db")
-
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    try:
-        # ✅ Convert amount to float before inserting
-        amount = float(ordered_data["amount"])
-
-        # ✅ Assign a category (if not provided, default to 'Uncategorized')
-        category = ordered_data.get("category", "Uncategorized")
-
-        # ✅ Apply keyword rules for automatic category and tags
-        card_type = ordered_data.get("card type") or ordered_data.get("card_type")
-        tags = ordered_data.get("tags", [])
-        category, tags, matched_rules = apply_keyword_rules(
-            cursor, ordered_data["description"], category, tags
-        )
+    ``db_path`` defaults to ``Database/transactions.db``.
 
-        # ✅ Get or create transaction entry
-        cursor.execute("""
-            INSERT INTO transactions (amount, description, card_type, date, time, bank, full_email, category)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            amount,
-            ordered_data["description"],
-            card_type,
-            ordered_data["date"],
-            ordered_data.get("time", None),  # ✅ Allow NULL time
-            ordered_data["bank"],
-            ordered_data.get("full_email", "No email content"),
-            category
-        ))
-
-        # ✅ Get the inserted transaction ID
-        transaction_id = cursor.lastrowid
-
-        # ✅ Insert tags and associate them with the transaction
-        for tag in tags:
-            cursor.execute("INSERT OR IGNORE INTO tags (tag_name) VALUES (?)", (tag,))  # Ensure tag exists
-
-            # Retrieve tag ID
-            cursor.execute("SELECT id FROM tags WHERE tag_name = ?", (tag,))
-            tag_id = cursor.fetchone()[0]
-
-            # Link transaction to tag
-            cursor.execute("INSERT INTO transaction_tags (transaction_id, tag_id) VALUES (?, ?)", (transaction_id, tag_id))
-
-        conn.commit()
-        logger.info("Transaction saved: %s", ordered_data)
-
-        return {
-            "transaction_id": transaction_id,
-            "category": category,
-            "tags": tags,
-            "applied_rules": matched_rules,
-        }
-
-    except ValueError:
-        logger.error("Amount '%s' is not a valid number.", ordered_data['amount'])
-        return {
-            "error": f"Invalid amount: {ordered_data['amount']}"
-        }
+    Opens a connection for this transaction only; callers inserting many
+    transactions should keep a ``TransactionStore`` open instead.
+    """
+    with TransactionStore(db_path) as store:
+        return store.insert(ordered_data)
 
-    finally:
-        conn.close()
+def insert_transactions(transactions, batch_size=INSERT_BATCH_SIZE, db_path=None, stats=None):
+    """
+    Inserts many transactions, committing once per ``batch_size`` rows.
+    Returns one ``insert_transaction``-shaped result per transaction, in
+    order; ``stats`` receives ``rows`` and ``rows_per_second``.
+    """
+    with TransactionStore(db_path) as store:
+        return store.insert_many(transactions, batch_size, stats)
 
 # ✅ Example usage:
 if __name__ == "__main__":
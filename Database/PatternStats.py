@@ -0,0 +1,66 @@
+import sqlite3
+import os
+from datetime import date, timedelta
+
+
+def _default_db_path():
+    base_dir = os.path.abspath(os.path.dirname(__file__))
+    return os.path.join(base_dir, "transactions.db")
+
+
+def ensure_pattern_hits_table(cursor):
+    """Create the ``pattern_hits`` table (daily matches of each regex variant)."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS pattern_hits (
+            bank TEXT NOT NULL,
+            pattern TEXT NOT NULL,
+            day TEXT NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (bank, pattern, day)
+        )
+    """)
+
+
+def add_pattern_hits(hits, day=None, db_path=None):
+    """Add ``{(bank, pattern): count}`` to the counts of ``day`` (today by default)."""
+    if not hits:
+        return
+    day = (day or date.today()).isoformat()
+    conn = sqlite3.connect(db_path or _default_db_path(), timeout=30)
+    try:
+        cursor = conn.cursor()
+        ensure_pattern_hits_table(cursor)
+        cursor.executemany(
+            """
+            INSERT INTO pattern_hits (bank, pattern, day, hits) VALUES (?, ?, ?, ?)
+            ON CONFLICT (bank, pattern, day) DO UPDATE SET hits = hits + excluded.hits
+            """,
+            [(bank, pattern, day, int(count)) for (bank, pattern), count in hits.items()],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_pattern_hits(days=None, db_path=None):
+    """Return ``{(bank, pattern): count}`` over the last ``days`` days, or all time."""
+    conn = sqlite3.connect(db_path or _default_db_path(), timeout=30)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pattern_hits'")
+        if cursor.fetchone() is None:
+            return {}
+        if days is None:
+            cursor.execute("SELECT bank, pattern, SUM(hits) FROM pattern_hits GROUP BY bank, pattern")
+        else:
+            since = (date.today() - timedelta(days=days)).isoformat()
+            cursor.execute(
+                """
+                SELECT bank, pattern, SUM(hits) FROM pattern_hits
+                WHERE day > ? GROUP BY bank, pattern
+                """,
+                (since,),
+            )
+        return {(bank, pattern): count for bank, pattern, count in cursor.fetchall()}
+    finally:
+        conn.close()
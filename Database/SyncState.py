@@ -0,0 +1,63 @@
+import sqlite3
+import os
+
+
+def _default_db_path():
+    base_dir = os.path.abspath(os.path.dirname(__file__))
+    return os.path.join(base_dir, "transactions.db")
+
+
+def ensure_sync_state_table(cursor):
+    """Create the ``imap_sync_state`` table if it does not exist yet."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS imap_sync_state (
+            account TEXT NOT NULL,
+            mailbox TEXT NOT NULL,
+            sender TEXT NOT NULL,
+            uidvalidity INTEGER NOT NULL,
+            last_uid INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (account, mailbox, sender)
+        )
+    """)
+
+
+def get_sync_state(account, mailbox, sender, db_path=None):
+    """Return ``(uidvalidity, last_uid)`` for a sender, or ``None`` if never synced."""
+    conn = sqlite3.connect(db_path or _default_db_path())
+    try:
+        cursor = conn.cursor()
+        ensure_sync_state_table(cursor)
+        cursor.execute(
+            """
+            SELECT uidvalidity, last_uid FROM imap_sync_state
+            WHERE account = ? AND mailbox = ? AND sender = ?
+            """,
+            (account, mailbox, sender),
+        )
+        row = cursor.fetchone()
+        return (row[0], row[1]) if row else None
+    finally:
+        conn.close()
+
+
+def update_sync_state(account, mailbox, sender, uidvalidity, last_uid, db_path=None):
+    """Store the UID high-water mark reached for a sender."""
+    conn = sqlite3.connect(db_path or _default_db_path())
+    try:
+        cursor = conn.cursor()
+        ensure_sync_state_table(cursor)
+        cursor.execute(
+            """
+            INSERT INTO imap_sync_state (account, mailbox, sender, uidvalidity, last_uid)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (account, mailbox, sender) DO UPDATE SET
+                uidvalidity = excluded.uidvalidity,
+                last_uid = excluded.last_uid,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            (account, mailbox, sender, int(uidvalidity), int(last_uid)),
+        )
+        conn.commit()
+    finally:
+        conn.close()
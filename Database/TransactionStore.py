@@ -0,0 +1,312 @@
+import sqlite3
+import os
+import re
+import time
+import logging
+from datetime import datetime, timedelta
+from itertools import islice
+
+logger = logging.getLogger(__name__)
+
+# ✅ Applied to every connection; override or extend with ``pragmas=``
+# (e.g. {"journal_mode": "WAL", "synchronous": "NORMAL"} for large imports)
+DEFAULT_PRAGMAS = {
+    "cache_size": -16000,  # 16 MB of page cache, kept warm across inserts
+    "temp_store": "MEMORY",
+}
+# ✅ Prepared statements kept by the connection (sqlite3's statement cache)
+CACHED_STATEMENTS = 64
+# ✅ Rows written per transaction (one commit, so one fsync, per batch)
+INSERT_BATCH_SIZE = 1000
+# ✅ Parameters per "IN (...)" query, below SQLite's historical 999 limit
+MAX_SQL_PARAMS = 500
+
+KEYWORD_RULES_SQL = """
+    SELECT keyword, category, tags FROM keyword_rules
+    WHERE ? LIKE '%' || keyword || '%' COLLATE NOCASE
+"""
+INSERT_TRANSACTION_SQL = """
+    INSERT INTO transactions (amount, description, card_type, date, time, bank, full_email, category)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+INSERT_TAG_SQL = "INSERT OR IGNORE INTO tags (tag_name) VALUES (?)"
+SELECT_TAG_SQL = "SELECT id FROM tags WHERE tag_name = ?"
+LINK_TAG_SQL = "INSERT INTO transaction_tags (transaction_id, tag_id) VALUES (?, ?)"
+DUPLICATE_SQL = "SELECT COUNT(*) FROM transactions WHERE amount = ? AND date BETWEEN ? AND ?"
+# Keyword rules of a whole batch in one query, in the order a per-row lookup sees them
+BATCH_DESCRIPTIONS_SQL = "CREATE TEMP TABLE IF NOT EXISTS batch_descriptions (idx INTEGER PRIMARY KEY, description TEXT)"
+BATCH_KEYWORD_RULES_SQL = """
+    SELECT d.idx, k.keyword, k.category, k.tags
+    FROM temp.batch_descriptions AS d
+    JOIN keyword_rules AS k ON d.description LIKE '%' || k.keyword || '%' COLLATE NOCASE
+    ORDER BY d.idx, k.rowid
+"""
+
+_PRAGMA_RE = re.compile(r"^[A-Za-z_]+$")
+_PRAGMA_VALUE_RE = re.compile(r"^-?[\w.]+$")
+
+
+def _default_db_path():
+    base_dir = os.path.abspath(os.path.dirname(__file__))
+    return os.path.join(base_dir, "transactions.db")
+
+
+def apply_keyword_rules(cursor, description, category, tags):
+    """Apply keyword-based rules to set category and tags and return matched rules."""
+    cursor.execute(KEYWORD_RULES_SQL, (description,))
+    return _merge_rules(cursor.fetchall(), category, tags)
+
+
+def _merge_rules(rules, category, tags):
+    tag_set = set(tags)
+    final_category = category
+    matched_rules = []
+
+    for keyword, rule_category, rule_tags in rules:
+        rule_info = {"keyword": keyword}
+        if rule_category:
+            final_category = rule_category
+            rule_info["category"] = rule_category
+        else:
+            rule_info["category"] = None
+        if rule_tags:
+            parsed_tags = [t.strip() for t in rule_tags.split(',') if t.strip()]
+            tag_set.update(parsed_tags)
+            rule_info["tags"] = parsed_tags
+        else:
+            rule_info["tags"] = []
+        matched_rules.append(rule_info)
+
+    return final_category, list(tag_set), matched_rules
+
+
+def _amount(ordered_data):
+    # ✅ Convert amount to float before inserting
+    try:
+        return float(ordered_data["amount"])
+    except (TypeError, ValueError):
+        return None
+
+
+def _invalid_amount(ordered_data):
+    logger.error("Amount '%s' is not a valid number.", ordered_data['amount'])
+    return {
+        "error": f"Invalid amount: {ordered_data['amount']}"
+    }
+
+
+def _row(ordered_data, amount, card_type, category):
+    return (
+        amount,
+        ordered_data["description"],
+        card_type,
+        ordered_data["date"],
+        ordered_data.get("time", None),  # ✅ Allow NULL time
+        ordered_data["bank"],
+        ordered_data.get("full_email", "No email content"),
+        category,
+    )
+
+
+class TransactionStore:
+    """One long-lived connection to ``transactions.db`` for many inserts.
+
+    Opening a connection per transaction pays for the file open, the schema
+    parse and a cold page cache every time. A store keeps a single
+    connection with ``pragmas`` (``DEFAULT_PRAGMAS`` by default) applied
+    once, and runs the same SQL strings so sqlite3 reuses the prepared
+    statements. Use it as a context manager, or call :meth:`close`.
+    """
+
+    def __init__(self, db_path=None, pragmas=None, timeout=30):
+        self.db_path = db_path or _default_db_path()
+        self.pragmas = dict(DEFAULT_PRAGMAS, **(pragmas or {}))
+        self.conn = sqlite3.connect(self.db_path, timeout=timeout, cached_statements=CACHED_STATEMENTS)
+        for name, value in self.pragmas.items():
+            if not _PRAGMA_RE.match(name) or not _PRAGMA_VALUE_RE.match(str(value)):
+                self.conn.close()
+                raise ValueError(f"Invalid PRAGMA {name} = {value!r}")
+            self.conn.execute(f"PRAGMA {name} = {value}")
+
+    def insert(self, ordered_data, commit=True):
+        """Insert one transaction with its tags, like ``Insert.insert_transaction``.
+
+        Returns ``{"transaction_id", "category", "tags", "applied_rules"}``,
+        or ``{"error": ...}`` when the amount is not a number. With
+        ``commit=False`` the row is left in the open SQLite transaction, for
+        a ``BackfillCheckpoint`` to commit with its message's progress.
+        """
+        cursor = self.conn.cursor()
+        amount = _amount(ordered_data)
+        if amount is None:
+            return _invalid_amount(ordered_data)
+
+        try:
+            # ✅ Assign a category (if not provided, default to 'Uncategorized')
+            category = ordered_data.get("category", "Uncategorized")
+
+            # ✅ Apply keyword rules for automatic category and tags
+            card_type = ordered_data.get("card type") or ordered_data.get("card_type")
+            tags = ordered_data.get("tags", [])
+            category, tags, matched_rules = apply_keyword_rules(
+                cursor, ordered_data["description"], category, tags
+            )
+
+            cursor.execute(INSERT_TRANSACTION_SQL, _row(ordered_data, amount, card_type, category))
+            transaction_id = cursor.lastrowid
+
+            # ✅ Insert tags and associate them with the transaction
+            for tag_id in self._tag_ids(cursor, tags):
+                cursor.execute(LINK_TAG_SQL, (transaction_id, tag_id))
+
+            if commit:
+                self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        logger.info("Transaction saved: %s", ordered_data)
+
+        return {
+            "transaction_id": transaction_id,
+            "category": category,
+            "tags": tags,
+            "applied_rules": matched_rules,
+        }
+
+    def insert_many(self, transactions, batch_size=INSERT_BATCH_SIZE, stats=None):
+        """Insert ``transactions`` with one database transaction per batch.
+
+        Each batch looks up the keyword rules of all its descriptions in one
+        query, creates its tags and inserts its rows and tag links with
+        ``executemany``, then commits once. Returns one result per
+        transaction, in order, shaped like :meth:`insert`'s. A failing batch
+        is rolled back and the error raised; earlier batches stay committed.
+
+        ``stats`` is updated in place with ``rows``, ``errors``, ``seconds``
+        and ``rows_per_second``.
+        """
+        if batch_size < 1:
+            raise ValueError("batch size must be at least 1")
+        started = time.perf_counter()
+        results = []
+        iterator = iter(transactions)
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                break
+            try:
+                results.extend(self._insert_batch(batch))
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+
+        elapsed = time.perf_counter() - started
+        rows = sum(1 for result in results if "transaction_id" in result)
+        rate = rows / elapsed if elapsed else 0.0
+        logger.info("Saved %d transactions in %.2fs (%.0f rows/s)", rows, elapsed, rate)
+        if stats is not None:
+            stats["rows"] = stats.get("rows", 0) + rows
+            stats["errors"] = stats.get("errors", 0) + len(results) - rows
+            stats["seconds"] = stats.get("seconds", 0.0) + elapsed
+            stats["rows_per_second"] = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+        return results
+
+    def _insert_batch(self, batch):
+        cursor = self.conn.cursor()
+        results = [None] * len(batch)
+        valid = []
+        for index, ordered_data in enumerate(batch):
+            amount = _amount(ordered_data)
+            if amount is None:
+                results[index] = _invalid_amount(ordered_data)
+            else:
+                valid.append((index, ordered_data, amount))
+        if not valid:
+            return results
+
+        # ✅ Take the write lock first, so no other writer can take ids in between
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(BATCH_DESCRIPTIONS_SQL)
+        cursor.execute("DELETE FROM temp.batch_descriptions")
+        cursor.executemany(
+            "INSERT INTO temp.batch_descriptions (idx, description) VALUES (?, ?)",
+            [(index, ordered_data["description"]) for index, ordered_data, _ in valid],
+        )
+        rules = {}
+        for index, keyword, category, tags in cursor.execute(BATCH_KEYWORD_RULES_SQL):
+            rules.setdefault(index, []).append((keyword, category, tags))
+
+        rows = []
+        applied = []
+        for index, ordered_data, amount in valid:
+            category, tags, matched_rules = _merge_rules(
+                rules.get(index, ()), ordered_data.get("category", "Uncategorized"), ordered_data.get("tags", [])
+            )
+            card_type = ordered_data.get("card type") or ordered_data.get("card_type")
+            rows.append(_row(ordered_data, amount, card_type, category))
+            applied.append((index, category, tags, matched_rules))
+
+        # ✅ AUTOINCREMENT ids only grow, so the new rows are the ones above the old maximum
+        last_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+        cursor.executemany(INSERT_TRANSACTION_SQL, rows)
+        ids = [row_id for (row_id,) in cursor.execute(
+            "SELECT id FROM transactions WHERE id > ? ORDER BY id", (last_id,)
+        )]
+        if len(ids) != len(rows):
+            raise sqlite3.DatabaseError(f"expected {len(rows)} new transactions, found {len(ids)}")
+
+        tag_ids = self._resolve_tags(cursor, {tag for _, _, tags, _ in applied for tag in tags})
+        cursor.executemany(LINK_TAG_SQL, [
+            (transaction_id, tag_ids[tag])
+            for transaction_id, (_, _, tags, _) in zip(ids, applied)
+            for tag in tags
+        ])
+
+        for transaction_id, (index, category, tags, matched_rules) in zip(ids, applied):
+            results[index] = {
+                "transaction_id": transaction_id,
+                "category": category,
+                "tags": tags,
+                "applied_rules": matched_rules,
+            }
+        return results
+
+    def _resolve_tags(self, cursor, tags):
+        """Create missing ``tags`` and return ``{tag_name: id}``."""
+        tags = sorted(tags)
+        cursor.executemany(INSERT_TAG_SQL, [(tag,) for tag in tags])
+        tag_ids = {}
+        for start in range(0, len(tags), MAX_SQL_PARAMS):
+            chunk = tags[start:start + MAX_SQL_PARAMS]
+            cursor.execute(
+                f"SELECT tag_name, id FROM tags WHERE tag_name IN ({', '.join('?' * len(chunk))})", chunk
+            )
+            tag_ids.update(cursor.fetchall())
+        return tag_ids
+
+    def _tag_ids(self, cursor, tags):
+        for tag in tags:
+            cursor.execute(INSERT_TAG_SQL, (tag,))  # Ensure tag exists
+            cursor.execute(SELECT_TAG_SQL, (tag,))
+            yield cursor.fetchone()[0]
+
+    def is_duplicate(self, amount, date):
+        """Check if a similar transaction already exists within +/- 1 day."""
+        try:
+            dt = datetime.strptime(date, "%Y-%m-%d")
+            start = (dt - timedelta(days=1)).strftime("%Y-%m-%d")
+            end = (dt + timedelta(days=1)).strftime("%Y-%m-%d")
+            count = self.conn.execute(DUPLICATE_SQL, (float(amount), start, end)).fetchone()[0]
+        except (ValueError, TypeError, sqlite3.Error):
+            return False
+        return count > 0
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -4,21 +4,36 @@ import json
 
 # Ensure the Database module is importable
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from Database.Insert import insert_transaction
+from Database.TransactionStore import TransactionStore
 
 
-def insert_transactions_from_json(json_file):
-    """Load transactions from a JSON file and insert them using shared logic."""
+def insert_transactions_from_json(json_file, db_path=None):
+    """Load transactions from a JSON file and insert them using shared logic.
+
+    The file maps months to lists of transactions, or is a single list such
+    as the ``Database/Alltransactions.json`` export. Each month (or the
+    whole list) is written in batches with ``TransactionStore.insert_many``.
+    """
     with open(json_file, "r", encoding="utf-8") as file:
         data = json.load(file)
+    if isinstance(data, list):
+        data = {os.path.basename(json_file): data}
 
-    for month, transactions in data.items():
-        print(f"📅 Processing {month}: {len(transactions)} transactions")
-        for transaction in transactions:
-            insert_transaction(transaction)
+    stats = {}
+    with TransactionStore(db_path) as store:
+        for month, transactions in data.items():
+            print(f"📅 Processing {month}: {len(transactions)} transactions")
+            results = store.insert_many(transactions, stats=stats)
+            for transaction, result in zip(transactions, results):
+                if "error" in result:
+                    print(f"⚠️ Skipped {transaction.get('description')}: {result['error']}")
 
-    print("✅ All transactions and tags imported successfully!")
+    print(
+        f"✅ {stats.get('rows', 0)} transactions and tags imported successfully "
+        f"in {stats.get('seconds', 0.0):.2f}s ({stats.get('rows_per_second', 0.0):.0f} rows/s)!"
+    )
+    return stats
 
 
 if __name__ == "__main__":
-    insert_transactions_from_json("juildec.json")
+    insert_transactions_from_json(sys.argv[1] if len(sys.argv) > 1 else "juildec.json")